@@ -0,0 +1,59 @@
+from discord import app_commands
+import time
+import asyncio
+import logging
+import db.async_db as async_db
+import db.iidxme_title_trie as title_trie
+
+
+# maximum length of the name and value of an autocomplete choice allowed by Discord
+MAX_CHOICE_LENGTH = 100
+# minimum interval between the checks of whether the title trie has to be built again for a changed catalog DB file
+TRIE_CHECK_INTERVAL_SEC = 1.0
+
+# check of the title trie running in a reader thread, and when the last check was started
+_trie_check_state = {'task': None, 'started_at': None}
+
+
+async def song_title_autocomplete(interaction, current: str) -> list[app_commands.Choice[str]]:
+    # autocomplete callback of the song title keywords option of slash commands
+    # the interaction is not used, so that the callback can be called with any object in place of a discord.Interaction
+    logger = logging.getLogger(__name__)
+
+    # the callback only reads the last built trie, which is built again (if needed) off the event loop
+    _check_trie()
+
+    try:
+        title_list = title_trie.complete_titles(current)
+    except Exception as e:
+        logger.error(repr(e))
+        return []
+
+    return [app_commands.Choice(name=title[:MAX_CHOICE_LENGTH], value=_to_keywords(title)) for title in title_list]
+
+
+def _check_trie() -> None:
+    # build the title trie again in a reader thread if the catalog DB file has changed, at most once per interval
+    task = _trie_check_state['task']
+    started_at = _trie_check_state['started_at']
+    if (task is not None and not task.done()) or \
+            (started_at is not None and time.monotonic() - started_at < TRIE_CHECK_INTERVAL_SEC):
+        return
+
+    _trie_check_state['task'] = asyncio.get_running_loop().create_task(async_db.run_in_reader(title_trie.get_trie))
+    _trie_check_state['task'].add_done_callback(_log_trie_check_error)
+    _trie_check_state['started_at'] = time.monotonic()
+
+
+def _log_trie_check_error(task: asyncio.Task) -> None:
+    logger = logging.getLogger(__name__)
+
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(repr(task.exception()))
+
+
+def _to_keywords(title: str) -> str:
+    # a chosen title is searched by exact match, unless it is too long to be enclosed by double quotes
+    if len(title) + 2 <= MAX_CHOICE_LENGTH:
+        return f'"{title}"'
+    return title[:MAX_CHOICE_LENGTH]
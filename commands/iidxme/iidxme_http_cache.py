@@ -0,0 +1,100 @@
+import time
+import threading
+from dataclasses import replace
+import requests
+from commands.iidxme.models.CachedResponse import CachedResponse
+import config.config_reader as config
+from utils.lru_cache import LRUCache
+
+
+'''
+    response cache of iidx.me pages, keyed by URL and query string
+
+    a cached page is served as is for http_cache_ttl_sec seconds after it was fetched.
+    after that, it is revalidated with a conditional GET (If-None-Match / If-Modified-Since) if the page had an
+    ETag or Last-Modified header, and a 304 Not Modified response renews the cached page without downloading it again.
+    only 200 OK responses are cached, and the least recently used page is evicted when the cache is full.
+'''
+
+_cache_state = {'cache': None}
+_stats = {'fresh_hits': 0, 'revalidated_hits': 0, 'misses': 0}
+_lock = threading.Lock()
+
+
+def get_base_url() -> str:
+    # base URL of iidx.me, which can be pointed to a local server for testing
+    return str(config.get('IIDX', 'iidxme_base_url')).rstrip("/")
+
+
+def get(request_session: requests.Session, url: str, params=None, timeout=None, ttl: float | None = None) -> CachedResponse:
+    # ttl overrides http_cache_ttl_sec in config file
+    if ttl is None:
+        ttl = float(config.get('IIDX', 'http_cache_ttl_sec'))
+
+    cache = _get_cache()
+    cache_key = (url, str(params))
+    cached_response = cache.get(cache_key)
+
+    # 1) serve the cached page if it is still fresh
+    if cached_response is not None and time.monotonic() - cached_response.fetched_at < ttl:
+        _count('fresh_hits')
+        return cached_response
+
+    # 2) revalidate the stale page with its validators, if any
+    headers = {}
+    if cached_response is not None:
+        if cached_response.etag:
+            headers['If-None-Match'] = cached_response.etag
+        if cached_response.last_modified:
+            headers['If-Modified-Since'] = cached_response.last_modified
+
+    response = request_session.get(url, params=params, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and cached_response is not None:
+        _count('revalidated_hits')
+        cached_response = replace(cached_response, fetched_at=time.monotonic())
+        cache.put(cache_key, cached_response)
+        return cached_response
+
+    # 3) cache the new page
+    _count('misses')
+    new_response = CachedResponse(status_code=response.status_code,
+                                  content=response.content,
+                                  etag=response.headers.get('ETag', ""),
+                                  last_modified=response.headers.get('Last-Modified', ""),
+                                  fetched_at=time.monotonic())
+    if response.status_code == 200:
+        cache.put(cache_key, new_response)
+    else:
+        cache.pop(cache_key)
+
+    return new_response
+
+
+def invalidate(url: str, params=None) -> None:
+    _get_cache().pop((url, str(params)))
+
+
+def get_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    num_of_requests = sum(stats.values())
+    stats['hit_rate'] = ((stats['fresh_hits'] + stats['revalidated_hits']) / num_of_requests) if num_of_requests else 0.0
+    stats.update({f"cache_{key}": value for key, value in _get_cache().get_stats().items()
+                  if key in ('size', 'max_size', 'evictions')})
+
+    return stats
+
+
+def _get_cache() -> LRUCache:
+    if _cache_state['cache'] is None:
+        with _lock:
+            if _cache_state['cache'] is None:
+                _cache_state['cache'] = LRUCache(int(config.get('IIDX', 'http_cache_size')))
+
+    return _cache_state['cache']
+
+
+def _count(stat_name: str) -> None:
+    with _lock:
+        _stats[stat_name] += 1
@@ -1,6 +1,10 @@
 import re
 import logging
+from commands.iidxme.models.PbInfo import PbInfo
+import db.iidxme_suggester as suggester
 import config.config_reader as config
+import utils.normalize_util as normalize_util
+import utils.string_util as string_util
 
 
 def parse_arguments(num_of_usernames: int, arg_str: str) -> tuple[list[str], str, str, str, str, bool, bool]:
@@ -86,6 +90,49 @@ def parse_arguments(num_of_usernames: int, arg_str: str) -> tuple[list[str], str
     return username_list, mode, difficulty, level, keywords, flag_exact_keyword_match, flag_display_score_percentage
 
 
+def get_result_not_found_msg(keywords: str, flag_exact_keyword_match: bool) -> str:
+    logger = logging.getLogger(__name__)
+
+    msg = config.get('IIDX', 'msg_result_not_found')
+
+    # suggest the song titles closest to the keywords, if any
+    try:
+        title_list = suggester.suggest_titles(keywords if not flag_exact_keyword_match else keywords.replace("%", "\\%"),
+                                              int(config.get('IIDX', 'num_of_suggestions')))
+    except Exception as e:
+        logger.error(repr(e))
+        title_list = []
+
+    if title_list:
+        msg += "\n\n" + config.get('IIDX', 'msg_did_you_mean') + "\n"
+        msg += "\n".join(f"• {string_util.escape_special_formatting_characters(title)}" for title in title_list)
+
+    return msg
+
+
+def get_pb_str(pb: PbInfo, flag_display_score_percentage: bool, flag_display_score_attained_version: bool) -> str:
+    # PB info of a chart for display
+    '''
+        sample:
+        FC／__32__ [AAA] 2123 _(MAX-109)_／BP 0
+    '''
+    rank_and_score_str = "--"
+    if pb.score != -1:
+        rank_and_score_str = f"[{pb.rank}] {pb.score}"
+        if flag_display_score_attained_version:
+            rank_and_score_str = f"__{pb.score_attained_version}__ " + rank_and_score_str
+        if flag_display_score_percentage and pb.rate:
+            rank_and_score_str += f" _({pb.rate})_"
+        elif (not flag_display_score_percentage) and pb.rank_diff:
+            rank_and_score_str += f" _({pb.rank_diff})_"
+
+    misscount_str = "--"
+    if pb.misscount != 9999:
+        misscount_str = f"BP {pb.misscount}"
+
+    return f"{pb.lamp}／{rank_and_score_str}／{misscount_str}"
+
+
 def _is_valid_username_format(string: str) -> bool:
     is_valid_format = False
     
@@ -143,8 +190,12 @@ def _construct_keywords_query_string(keywords: str, flag_exact_match: bool) -> s
     # if using exact match mode, remove the first and the last double quotes from keyword string
     if flag_exact_match:
         keywords = keywords[1:-1]
-    # else add wildcard characters to keyword string
-    else:
+
+    # normalize the keywords in the same way as the search keys of song titles in DB (width, case, kana, punctuation)
+    keywords = normalize_util.normalize_search_key(keywords)
+
+    # if not using exact match mode, add wildcard characters to keyword string
+    if not flag_exact_match:
         keywords = keywords.replace("%", "\%")
         keywords = re.sub("\s+", "%", keywords)
     
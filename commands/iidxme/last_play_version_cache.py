@@ -0,0 +1,84 @@
+import time
+import threading
+import logging
+import db.bot_db as bot_db
+import config.config_reader as config
+
+
+'''
+    cache of the IIDX release version each iidx.me user last played, which changes at most once per game release
+
+    the resolved versions are kept in memory and persisted in the bot DB (iidxme_last_play_version), so they survive restarts.
+    a cached version is discarded when
+        a) it is older than last_play_version_ttl_sec seconds
+        b) the current version (iidxme_current_version in config file) has changed since it was resolved
+        c) invalidate() is called, e.g. a song page of the version is not found
+'''
+
+_version_state = {'loaded': False, 'versions': {}}
+_version_lock = threading.Lock()
+
+
+def get(username: str) -> str | None:
+    with _version_lock:
+        _load_versions()
+        cached_version = _version_state['versions'].get(username)
+
+    if cached_version is None:
+        return None
+
+    version, current_version, fetched_at = cached_version
+    if (current_version != _get_current_version()) \
+        or (time.time() - fetched_at >= float(config.get('IIDX', 'last_play_version_ttl_sec'))):
+        invalidate(username)
+        return None
+
+    return version
+
+
+def put(username: str, version: str) -> None:
+    logger = logging.getLogger(__name__)
+
+    cached_version = (version, _get_current_version(), time.time())
+    with _version_lock:
+        _load_versions()
+        _version_state['versions'][username] = cached_version
+
+    try:
+        bot_db.update_last_play_version(username, *cached_version)
+    except Exception as e:
+        # the version is still cached in memory
+        logger.error(repr(e))
+
+
+def invalidate(username: str) -> None:
+    logger = logging.getLogger(__name__)
+
+    with _version_lock:
+        _load_versions()
+        if _version_state['versions'].pop(username, None) is None:
+            return
+
+    try:
+        bot_db.delete_last_play_version(username)
+    except Exception as e:
+        logger.error(repr(e))
+
+
+def _load_versions() -> None:
+    # called with _version_lock held
+    logger = logging.getLogger(__name__)
+
+    if _version_state['loaded']:
+        return
+
+    try:
+        _version_state['versions'] = bot_db.fetch_last_play_versions()
+    except Exception as e:
+        logger.error(repr(e))
+        _version_state['versions'] = {}
+    _version_state['loaded'] = True
+
+
+def _get_current_version() -> str:
+    return str(config.get('IIDX', 'iidxme_current_version'))
@@ -0,0 +1,67 @@
+from discord import Embed
+import asyncio
+import threading
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import config.config_reader as config
+import utils.display_util as display_util
+
+
+'''
+    runs the iidx.me lookups of commands ($iidxpb, $iidxvs) in thread pools, so that other commands and events are handled
+    while iidx.me is being fetched
+
+    each command has its own pool, sized by max_concurrent_lookups in its config section (section below).
+    a lookup not completed within timeout_sec of the section is cancelled before fetching the next song page
+'''
+
+# {section: thread pool}, and {section: cancel events of lookups in progress}
+_executor_state = {}
+_executor_lock = threading.Lock()
+_active_cancel_events = {}
+
+
+async def run_async(section: str, lookup_func: Callable[[str, threading.Event], Embed], arg_str: str) -> Embed:
+    # return the embed of lookup_func(arg_str, cancel_event), or the timeout message if it does not complete in time
+    logger = logging.getLogger(__name__)
+
+    cancel_event = threading.Event()
+    cancel_event_set = _active_cancel_events.setdefault(section, set())
+    cancel_event_set.add(cancel_event)
+
+    try:
+        future = asyncio.get_running_loop().run_in_executor(_get_executor(section), lookup_func, arg_str, cancel_event)
+        return await asyncio.wait_for(future, timeout=float(config.get(section, 'timeout_sec')))
+
+    except asyncio.TimeoutError:
+        logger.warning(f"{section} lookup timed out: {arg_str}")
+        cancel_event.set()
+        return display_util.construct_embed(title=config.get(section, 'title'), desc=config.get('IIDXME_PB', 'msg_timeout'),
+                                            colour=config.get('COMMAND_ERROR', 'colour_error'), footer="", image_url="")
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+    finally:
+        cancel_event_set.discard(cancel_event)
+
+
+def shutdown(section: str) -> None:
+    # cancel all lookups of the section in progress and stop its thread pool
+    for cancel_event in list(_active_cancel_events.get(section, ())):
+        cancel_event.set()
+
+    with _executor_lock:
+        executor = _executor_state.pop(section, None)
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _get_executor(section: str) -> ThreadPoolExecutor:
+    if section not in _executor_state:
+        with _executor_lock:
+            if section not in _executor_state:
+                _executor_state[section] = ThreadPoolExecutor(max_workers=int(config.get(section, 'max_concurrent_lookups')),
+                                                              thread_name_prefix=section.lower())
+
+    return _executor_state[section]
@@ -0,0 +1,10 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class CachedResponse:
+    status_code: int
+    content: bytes
+    etag: str
+    last_modified: str
+    fetched_at: float
\ No newline at end of file
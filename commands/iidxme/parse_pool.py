@@ -0,0 +1,90 @@
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+from commands.iidxme.models.PbInfo import PbInfo
+import commands.iidxme.song_page_parser as song_page_parser
+import config.config_reader as config
+
+
+'''
+    pool of worker processes parsing iidx.me song pages, so that parsing runs on all cores without holding the GIL of the bot
+
+    workers receive the raw page content and return the PB info of each chart as a plain tuple.
+    each worker is warmed up when it starts, by loading the config file and parsing a sample page.
+    the pool size is parse_pool_size in config file; with 0, or if the pool is broken, pages are parsed in-process.
+'''
+
+_WARM_UP_PAGE = b"<html><body><div name='tabview_0'><div class='table_scrollcol music'></div></div></body></html>"
+
+_pool_state = {'executor': None}
+_pool_lock = threading.Lock()
+
+
+def parse_song_page(page_content: bytes, chart_id_list: list[str]) -> dict[str, PbInfo]:
+    # return the PB info of the given charts, {chart_id: PbInfo}, parsed in a worker process if the pool is enabled
+    logger = logging.getLogger(__name__)
+
+    executor = _get_executor()
+    if executor is None:
+        return song_page_parser.parse_song_page(page_content, chart_id_list)
+
+    try:
+        pb_tuple_dict = executor.submit(_parse_in_worker, page_content, chart_id_list).result()
+    except (BrokenProcessPool, OSError, RuntimeError) as e:
+        # the pool is discarded and created again on next use. parse this page in-process
+        logger.error(f"Parse pool failed, parsing in-process: {repr(e)}")
+        _discard_executor(executor)
+        return song_page_parser.parse_song_page(page_content, chart_id_list)
+
+    return {chart_id: PbInfo(*pb_tuple) for chart_id, pb_tuple in pb_tuple_dict.items()}
+
+
+def shutdown() -> None:
+    with _pool_lock:
+        if _pool_state['executor'] is not None:
+            _pool_state['executor'].shutdown(wait=True, cancel_futures=True)
+            _pool_state['executor'] = None
+
+
+def _get_executor() -> ProcessPoolExecutor | None:
+    logger = logging.getLogger(__name__)
+
+    pool_size = int(config.get('IIDXME_PB', 'parse_pool_size'))
+    if pool_size <= 0:
+        return None
+
+    if _pool_state['executor'] is None:
+        with _pool_lock:
+            if _pool_state['executor'] is None:
+                try:
+                    # spawn fresh workers rather than forking the bot, which runs several threads
+                    _pool_state['executor'] = ProcessPoolExecutor(max_workers=pool_size,
+                                                                  mp_context=multiprocessing.get_context('spawn'),
+                                                                  initializer=_init_worker)
+                    logger.info(f"Started parse pool of {pool_size} workers")
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to start parse pool, parsing in-process: {repr(e)}")
+                    return None
+
+    return _pool_state['executor']
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    with _pool_lock:
+        if _pool_state['executor'] is executor:
+            _pool_state['executor'] = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _init_worker() -> None:
+    # load the config file and the parser (bs4 + lxml) before the first page arrives
+    config.get('IIDX', 'msg_parse_page_error')
+    song_page_parser.parse_song_page(_WARM_UP_PAGE, ["0"])
+
+
+def _parse_in_worker(page_content: bytes, chart_id_list: list[str]) -> dict[str, tuple]:
+    pb_dict = song_page_parser.parse_song_page(page_content, chart_id_list)
+    return {chart_id: (pb.lamp, pb.score, pb.score_attained_version, pb.rank, pb.rank_diff, pb.rate, pb.misscount)
+            for chart_id, pb in pb_dict.items()}
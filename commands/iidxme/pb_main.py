@@ -1,17 +1,36 @@
 from discord import Embed
-import requests
+import threading
+from datetime import datetime
 import logging
 from db.models.Song import Song
 from commands.iidxme.models.PbInfo import PbInfo
 import commands.iidxme.iidxme_util as iidx_util
+import commands.iidxme.lookup_runner as lookup_runner
 import commands.iidxme.pb_scraper as scraper
+import commands.iidxme.parse_pool as parse_pool
+import commands.iidxme.pb_store as pb_store
 import db.iidxme_db as db
 import config.config_reader as config
 import utils.display_util as display_util
+import utils.http_client as http_client
 import utils.string_util as string_util
 
 
-def get_result_embed(p_arg_str: str) -> Embed:
+async def get_result_embed_async(p_arg_str: str) -> Embed:
+    # run the PB lookup in the thread pool of $iidxpb, so that the event loop is not blocked while iidx.me is being fetched
+    return await lookup_runner.run_async('IIDXME_PB', get_result_embed, p_arg_str)
+
+
+def shutdown() -> None:
+    # cancel all lookups in progress and stop the thread pool, the background refresh of PB store,
+    # the song page fetches and the parse pool
+    lookup_runner.shutdown('IIDXME_PB')
+    pb_store.shutdown()
+    scraper.shutdown()
+    parse_pool.shutdown()
+
+
+def get_result_embed(p_arg_str: str, cancel_event: threading.Event | None = None) -> Embed:
     logger = logging.getLogger(__name__)
 
     logger.debug(p_arg_str)
@@ -32,14 +51,11 @@ def get_result_embed(p_arg_str: str) -> Embed:
         # display iidx.me username and play mode
         embed_desc = f"Player: {string_util.escape_special_formatting_characters(username)} ({mode.upper()})\n\n"
 
-        # 2) fetch the IIDX release version the user last played from iidx.me
-        request_session = requests.Session()
-        last_play_ver = scraper.fetch_last_play_version(request_session, username)
-
-        # 3) fetch charts from DB with the search criteria
-        # 3.1) limit the result set to the number of songs specified in config file
+        # 2) fetch charts from DB with the search criteria
+        # 2.1) limit the result set to the number of songs specified in config file
         result_limit = int(config.get('IIDXME_PB', 'result_limit'))
-        num_of_matches = db.get_num_of_matched_songs(mode, difficulty, level, keywords, flag_exact_keyword_match)
+        # 2.2) fetch the number of matched songs and song & chart info (song_id, chart_id, title, difficulty, level) from DB
+        num_of_matches, song_list = db.search_charts(mode, difficulty, level, keywords, flag_exact_keyword_match, result_limit)
         
         # display message if number of results exceeds limit
         if num_of_matches > result_limit:
@@ -47,18 +63,25 @@ def get_result_embed(p_arg_str: str) -> Embed:
         
         # display message if no charts are found
         if num_of_matches == 0:
-            embed_desc += config.get('IIDX', 'msg_result_not_found')
+            embed_desc += iidx_util.get_result_not_found_msg(keywords, flag_exact_keyword_match)
         else:
-            # 3.2) fetch song & chart info (song_id, chart_id, title, difficulty, level) from DB
-            song_list = db.fetch_charts(mode, difficulty, level, keywords, flag_exact_keyword_match, result_limit)
-
-            # 4) fetch personal best records from iidx.me
-            pb_dict = scraper.fetch_pb_records(request_session, username, last_play_ver, song_list)
+            # 3) get the IIDX release version the user last played, from cache or from iidx.me
+            # only after any song is found, so that a search with no result does not wait for iidx.me
+            # requests are sent with the shared HTTP session, which reuses kept-alive connections to iidx.me
+            request_session = http_client.get_session()
+            last_play_ver = scraper.resolve_last_play_version(request_session, username)
+
+            # 4) fetch personal best records from the local PB store, or from iidx.me if not stored
+            # stale records are fetched again, and displayed as stored if iidx.me does not respond in time
+            # songs failed to fetch are displayed with the error message, without aborting the others
+            pb_dict, song_error_dict, cached_as_of = pb_store.fetch_pb_records(request_session, username, last_play_ver,
+                                                                               song_list, cancel_event)
 
             # 5) construct the embed object desc for display
             # show song level url if both chart difficulty and level are not specified, else show chart level url
             show_song_level_url = ((difficulty == "ALL") and (level == "ALL"))
-            embed_desc += _build_embed_desc_for_PB(username, last_play_ver, song_list, pb_dict, flag_display_score_percentage, show_song_level_url)
+            embed_desc += _build_embed_desc_for_PB(username, last_play_ver, song_list, pb_dict, song_error_dict,
+                                                   flag_display_score_percentage, show_song_level_url)
 
             # 6) display footer message if
             # - user achieved MAX in any of searched charts
@@ -70,6 +93,10 @@ def get_result_embed(p_arg_str: str) -> Embed:
             is_all_AAA = True
             is_all_no_play = True
 
+            # the footer messages about all searched charts are not displayed if any song failed to fetch
+            if song_error_dict:
+                is_all_FC = is_all_AAA = is_all_no_play = False
+
             for pb in pb_dict.values():
                 if pb.rank == "MAX":
                     has_MAX = True
@@ -97,6 +124,12 @@ def get_result_embed(p_arg_str: str) -> Embed:
             elif is_all_no_play:
                 embed_footer = config.get('IIDXME_PB', 'msg_all_no_play')
 
+            # 7) display the time of the records from the PB store, if any are displayed
+            if cached_as_of is not None:
+                if embed_footer:
+                    embed_footer += "\n"
+                embed_footer += config.get('IIDXME_PB', 'msg_cached_as_of') + datetime.fromtimestamp(cached_as_of).strftime("%Y-%m-%d %H:%M")
+
     except ValueError as ve:
         logger.debug(repr(ve))
         embed_desc = str(ve)
@@ -113,8 +146,8 @@ def get_result_embed(p_arg_str: str) -> Embed:
 
 
 def _build_embed_desc_for_PB(username: str, last_play_ver: str,
-                             song_list: list[Song], pb_dict: dict[str, PbInfo], flag_display_score_percentage: bool,
-                             show_song_level_url: bool) -> str:
+                             song_list: list[Song], pb_dict: dict[str, PbInfo], song_error_dict: dict[str, str],
+                             flag_display_score_percentage: bool, show_song_level_url: bool) -> str:
     embed_desc = ""
 
     for song in song_list:
@@ -127,6 +160,11 @@ def _build_embed_desc_for_PB(username: str, last_play_ver: str,
         elif len(song.charts) > 0:
             embed_desc += f"https://iidx.me/{last_play_ver}/{username}/music/{song.song_id}#{song.charts[0].chart_id}\n"
 
+        # display the error message if the song page failed to fetch
+        if song.song_id in song_error_dict:
+            embed_desc += f"{song_error_dict[song.song_id]}\n\n"
+            continue
+
         for chart in song.charts:
             pb = pb_dict[chart.chart_id]
             
@@ -138,20 +176,8 @@ def _build_embed_desc_for_PB(username: str, last_play_ver: str,
             difficulty_emoji = config.get('IIDX', f"emoji_{chart.difficulty}")
 
             level_str = "?" if chart.level == -1 else str(chart.level)
-            
-            rank_and_score_str = "--"
-            if pb.score != -1:
-                rank_and_score_str = f"__{pb.score_attained_version}__ [{pb.rank}] {pb.score}"
-                if flag_display_score_percentage and pb.rate:
-                    rank_and_score_str += f" _({pb.rate})_"
-                elif (not flag_display_score_percentage) and pb.rank_diff:
-                    rank_and_score_str += f" _({pb.rank_diff})_"
-
-            misscount_str = "--"
-            if pb.misscount != 9999:
-                misscount_str = f"BP {pb.misscount}"
-
-            embed_desc += f"{difficulty_emoji}{level_str.rjust(2)}：{pb.lamp}／{rank_and_score_str}／{misscount_str}\n"
+
+            embed_desc += f"{difficulty_emoji}{level_str.rjust(2)}：{iidx_util.get_pb_str(pb, flag_display_score_percentage, True)}\n"
 
         embed_desc += "\n"
         
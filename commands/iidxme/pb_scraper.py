@@ -1,12 +1,39 @@
 from bs4 import BeautifulSoup
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import logging
+import commands.iidxme.iidxme_http_cache as http_cache
+import commands.iidxme.last_play_version_cache as version_cache
+import commands.iidxme.parse_pool as parse_pool
 import config.config_reader as config
+import utils.http_client as http_client
+import utils.single_flight as single_flight
 from db.models.Song import Song
 from commands.iidxme.models.PbInfo import PbInfo
 
 
+# requests to iidx.me in progress are limited to max_concurrent_requests in total,
+# shared by all lookups of all players running at the same time
+_request_semaphore_state = {'semaphore': None}
+_request_semaphore_lock = threading.Lock()
+
+# thread pool fetching song pages, shared by all lookups, up to max_concurrent_fetches pages at a time
+_fetch_executor_state = {'executor': None}
+_fetch_executor_lock = threading.Lock()
+
+
+def resolve_last_play_version(request_session: requests.Session, username: str) -> str:
+    # return the cached last play version of the user, or fetch it from iidx.me if not cached
+    last_play_version = version_cache.get(username)
+    if last_play_version is None:
+        last_play_version = fetch_last_play_version(request_session, username)
+        version_cache.put(username, last_play_version)
+
+    return last_play_version
+
+
 def fetch_last_play_version(request_session: requests.Session, username: str) -> str:
     logger = logging.getLogger(__name__)
     
@@ -15,8 +42,9 @@ def fetch_last_play_version(request_session: requests.Session, username: str) ->
     
     try:
         # send a GET request and parse the response content
-        url = f"https://iidx.me/c/{username}"
-        response = request_session.get(url, params='content')
+        url = _get_version_page_url(username)
+        with _get_request_semaphore():
+            response = http_cache.get(request_session, url, params='content', timeout=http_client.get_default_timeout())
 
         status_code = response.status_code
         # case 1: 200 OK
@@ -48,33 +76,88 @@ def fetch_last_play_version(request_session: requests.Session, username: str) ->
         raise Exception(config.get('IIDX', 'msg_parse_page_error'))
 
 
-def fetch_pb_records(request_session: requests.Session, username:str, last_play_ver: str, song_list: list[Song]) -> dict[str, PbInfo]:
+def fetch_pb_records(request_session: requests.Session, username:str, last_play_ver: str, song_list: list[Song],
+                     cancel_event: threading.Event | None = None) -> tuple[dict[str, PbInfo], dict[str, str]]:
+    # return (1) the PB info of each chart, {chart_id: PbInfo} and (2) the error message of each song failed to fetch, {song_id: message}
+    # song pages are fetched concurrently in the fetch thread pool
     logger = logging.getLogger(__name__)
 
     chart_pb_dict = {}
+    song_error_dict = {}
 
-    try:
-        for song in song_list:
-            # fetch the song page content: send a GET request and parse the response content
-            url = f"https://iidx.me/{last_play_ver}/{username}/music/{song.song_id}"
-            response = request_session.get(url, params='content')
+    if not song_list:
+        return chart_pb_dict, song_error_dict
+
+    executor = _get_fetch_executor()
+    future_list = [executor.submit(_fetch_pb_records_of_song, request_session, username, last_play_ver, song, cancel_event)
+                   for song in song_list]
+
+    # collect the results in the order of songs and charts
+    for song, future in zip(song_list, future_list):
+        try:
+            chart_pb_dict.update(future.result())
+        except Exception as e:
+            logger.debug(f"-- song id: {song.song_id} / {repr(e)}")
+            song_error_dict[song.song_id] = str(e)
+
+    logger.debug(f"http cache stats: {http_cache.get_stats()}")
+    logger.debug(f"http connection stats: {http_client.get_stats()}")
+    logger.debug(f"single flight stats: {single_flight.get_stats()}")
+
+    # stop here if the lookup has been cancelled, e.g. timed out
+    check_cancelled(cancel_event)
 
-            if response.status_code == 200:
-                logger.debug(f"fetching {url}")
-                logger.debug(f"-- song id: {song.song_id} / {song.title}")
+    return chart_pb_dict, song_error_dict
 
-                song_page_content = BeautifulSoup(response.content, 'lxml', from_encoding='utf-8')
 
-                for chart in song.charts:
-                    logger.debug(f"-- chart id: {chart.chart_id} / {chart.difficulty}")
+def _fetch_pb_records_of_song(request_session: requests.Session, username:str, last_play_ver: str, song: Song,
+                              cancel_event: threading.Event | None) -> dict[str, PbInfo]:
+    # skip fetching if the lookup has been cancelled, e.g. timed out
+    check_cancelled(cancel_event)
 
-                    # extract personal best info of current chart from song page content and add to the result dictionary
-                    chart_pb_dict[chart.chart_id] = _extract_pb_info_of_chart(chart.chart_id, song_page_content)
-            else:
-                raise Exception(config.get('IIDX', 'msg_iidxme_conn_failed'))
+    chart_id_list = [chart.chart_id for chart in song.charts]
+
+    # lookups of the same song page of the same user at the same time share one fetch and parse
+    chart_pb_dict, is_shared = single_flight.do(("iidxme_song_page", username, last_play_ver, song.song_id),
+                                                _fetch_song_page, request_session, username, last_play_ver, song, chart_id_list)
+
+    # the shared result covers the charts of the lookup in flight, which may be filtered differently.
+    # fetch again for missing charts, usually from the HTTP cache as the page has just been fetched
+    if is_shared and not set(chart_id_list) <= chart_pb_dict.keys():
+        chart_pb_dict = _fetch_song_page(request_session, username, last_play_ver, song, chart_id_list)
+
+    return {chart_id: chart_pb_dict[chart_id] for chart_id in chart_id_list}
+
+
+def _fetch_song_page(request_session: requests.Session, username:str, last_play_ver: str, song: Song,
+                     chart_id_list: list[str]) -> dict[str, PbInfo]:
+    logger = logging.getLogger(__name__)
+
+    chart_pb_dict = {}
+
+    try:
+        # fetch the song page content: send a GET request and parse the response content
+        url = f"{http_cache.get_base_url()}/{last_play_ver}/{username}/music/{song.song_id}"
+        with _get_request_semaphore():
+            response = http_cache.get(request_session, url, params='content', timeout=http_client.get_default_timeout())
+
+        if response.status_code == 200:
+            logger.debug(f"fetching {url}")
+            logger.debug(f"-- song id: {song.song_id} / {song.title}")
+
+            # extract personal best info of all charts of the song from song page content in one pass,
+            # in a worker process of the parse pool if enabled
+            chart_pb_dict = parse_pool.parse_song_page(response.content, chart_id_list)
+        elif response.status_code == 404:
+            # the cached last play version of the user may be outdated, resolve it again from a fresh version page on next lookup
+            version_cache.invalidate(username)
+            http_cache.invalidate(_get_version_page_url(username), params='content')
+            raise Exception(config.get('IIDX', 'msg_song_page_not_found'))
+        else:
+            raise Exception(config.get('IIDX', 'msg_iidxme_conn_failed'))
 
         return chart_pb_dict
-        
+
     except requests.exceptions.RequestException as e:
         logger.error(repr(e))
         raise Exception(config.get('IIDX', 'msg_iidxme_conn_failed'))
@@ -82,71 +165,38 @@ def fetch_pb_records(request_session: requests.Session, username:str, last_play_
         raise
 
 
-def _extract_pb_info_of_chart(chart_id: str, page_content: BeautifulSoup) -> PbInfo:
-    logger = logging.getLogger(__name__)
+def shutdown() -> None:
+    with _fetch_executor_lock:
+        if _fetch_executor_state['executor'] is not None:
+            _fetch_executor_state['executor'].shutdown(wait=True, cancel_futures=True)
+            _fetch_executor_state['executor'] = None
 
-    # PB info to be returned
-    pb_lamp = "--"
-    pb_score = -1
-    pb_score_attained_version = ""
-    pb_rank = "?"
-    pb_rank_diff = ""
-    pb_rate = "?"
-    pb_misscount = 9999
 
-    try:
-        # get the div object of the chart and extract PB info
-        div_chart_data = page_content.find('div', attrs={'name': f"tabview_{chart_id}"})
-
-        # 1) find all div objects containing the clear lamp info
-        div_td_clear = div_chart_data.find_all('div', class_="div_td clear")
-        for td in div_td_clear:
-            # get the best clear lamp, which can be found in the most recent record
-            if td.get_text() != "":
-                pb_lamp = config.get('IIDX', f"abbr_{td.get_text()}")
-                break
-
-        # 2) find all div objects containing the score info
-        # loop through the table containing score history
-        div_tr_hist = div_chart_data.find('div', class_="table_scrollcol music").find_all('div', class_="div_tr")
-        pb_row = -1
-        for idx, div_row in enumerate(div_tr_hist):
-            p_score = div_row.find('p', class_="score")
-            
-            if p_score and re.search("^[0-9]+$", p_score.get_text()):
-                # get the best score, rank and score rate
-                if int(p_score.get_text()) > pb_score:
-                    pb_row = idx
-                    pb_score = int(p_score.get_text())
-                    pb_rank = p_score.find_previous('p', class_="rank").get_text()
-                    span_rank_diff = p_score.find_next("span", "pri_border")
-                    if span_rank_diff:
-                        pb_rank_diff = f"{span_rank_diff.get_text().lstrip()}"
-                    pb_rate = p_score.find_next('div', class_="rate_wrapper").get_text()
-                # if there is a tie for best score, update pb_row index to display earlier release version title
-                elif int(p_score.get_text()) == pb_score:
-                    pb_row = idx
-
-        if pb_row != -1:
-            # from the table containing release version titles,
-            div_tr_ver = div_chart_data.find('div', class_="table_fixcol music").find_all('div', class_="div_tr")
-            # get the version in which the best score was attained
-            span_ver = div_tr_ver[pb_row].find('span', class_="short")
-            if span_ver and span_ver.get_text():
-                pb_score_attained_version = span_ver.get_text().split(" ")[-1]
-            
-        # 3) find all div objects containing the miss count
-        span_miss = div_chart_data.find_all('span', class_="miss")
-        for span in span_miss:
-            # get the lowest miss count
-            if re.search("^[0-9]+$", span.get_text()) and (int(span.get_text()) < pb_misscount):
-                pb_misscount = int(span.get_text())
-
-        return PbInfo(pb_lamp, pb_score, pb_score_attained_version, pb_rank, pb_rank_diff, pb_rate, pb_misscount)
-    
-    except (KeyError, AttributeError) as e:
-        logger.error(repr(e))
-        raise Exception(config.get('IIDX', 'msg_parse_page_error'))
-    except Exception as e:
-        logger.error(repr(e))
-        raise Exception(config.get('IIDX', 'msg_generic_error'))
\ No newline at end of file
+def check_cancelled(cancel_event: threading.Event | None) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise Exception(config.get('IIDXME_PB', 'msg_timeout'))
+
+
+def _get_request_semaphore() -> threading.BoundedSemaphore:
+    if _request_semaphore_state['semaphore'] is None:
+        with _request_semaphore_lock:
+            if _request_semaphore_state['semaphore'] is None:
+                _request_semaphore_state['semaphore'] = threading.BoundedSemaphore(int(config.get('IIDX', 'max_concurrent_requests')))
+
+    return _request_semaphore_state['semaphore']
+
+
+def _get_fetch_executor() -> ThreadPoolExecutor:
+    if _fetch_executor_state['executor'] is None:
+        with _fetch_executor_lock:
+            if _fetch_executor_state['executor'] is None:
+                _fetch_executor_state['executor'] = ThreadPoolExecutor(max_workers=int(config.get('IIDXME_PB', 'max_concurrent_fetches')),
+                                                                       thread_name_prefix="iidxpb_fetch")
+
+    return _fetch_executor_state['executor']
+
+
+def _get_version_page_url(username: str) -> str:
+    # page of the current version of the user, which tells the last play version
+    return f"{http_cache.get_base_url()}/c/{username}"
+
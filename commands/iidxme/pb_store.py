@@ -0,0 +1,177 @@
+import time
+import threading
+from dataclasses import astuple
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+import requests
+import logging
+from db.models.Song import Song
+from commands.iidxme.models.PbInfo import PbInfo
+import commands.iidxme.pb_scraper as scraper
+import db.bot_db as bot_db
+import config.config_reader as config
+
+
+'''
+    local store of the PB records fetched from iidx.me, keyed by (username, version, chart_id), in the bot DB (iidxme_pb_record)
+    records of the current version ('c') are stored under its version number (iidxme_current_version in config file)
+
+    a lookup reads the store first:
+        a) songs with all charts stored within pb_store_ttl_sec seconds are served from the store
+        b) songs with any record stored earlier are fetched again from iidx.me in background, along with c).
+           the fetched records are used if the fetch completes within pb_store_live_timeout_sec seconds from its start,
+           otherwise (iidx.me is slow or down) the stored records are served
+        c) other songs are fetched from iidx.me
+    fetched records are stored, and the reply shows when the oldest record served from the store was fetched
+'''
+
+# background fetches of stored songs, {(username, version, song_id): future of the fetch}
+_refresh_state = {'executor': None, 'in_progress': {}}
+_refresh_lock = threading.Lock()
+
+
+def fetch_pb_records(request_session: requests.Session, username: str, last_play_ver: str, song_list: list[Song],
+                     cancel_event: threading.Event | None = None) -> tuple[dict[str, PbInfo], dict[str, str], float | None]:
+    # return (1) the PB info of each chart, {chart_id: PbInfo}, (2) the error message of each song failed to fetch, {song_id: message}
+    # and (3) the time when the oldest record served from the store was fetched, or None if all records are fetched from iidx.me
+    logger = logging.getLogger(__name__)
+
+    store_ver = _get_store_version(last_play_ver)
+
+    # 1) read the stored records of all charts
+    try:
+        pb_record_dict = bot_db.fetch_pb_records(username, store_ver,
+                                                 [chart.chart_id for song in song_list for chart in song.charts])
+    except Exception as e:
+        logger.error(repr(e))
+        pb_record_dict = {}
+
+    # 2) sort the songs by whether all their charts are stored, and whether any stored record is older than the TTL
+    stored_song_list = []
+    stale_song_list = []
+    fetch_song_list = []
+    ttl = float(config.get('IIDXME_PB', 'pb_store_ttl_sec'))
+
+    for song in song_list:
+        if song.charts and all(chart.chart_id in pb_record_dict for chart in song.charts):
+            fetched_at = min(pb_record_dict[chart.chart_id][-1] for chart in song.charts)
+            if time.time() - fetched_at >= ttl:
+                stale_song_list.append(song)
+            else:
+                stored_song_list.append(song)
+        else:
+            fetch_song_list.append(song)
+
+    # 3) start fetching the stale songs again in background, so that they are fetched while the songs not stored are
+    refresh_future_list = []
+    refresh_deadline = None
+    if stale_song_list:
+        refresh_future_list = _refresh_in_background(request_session, username, last_play_ver, stale_song_list)
+        refresh_deadline = time.monotonic() + float(config.get('IIDXME_PB', 'pb_store_live_timeout_sec'))
+
+    # 4) fetch the songs not stored from iidx.me
+    chart_pb_dict = {}
+    song_error_dict = {}
+    if fetch_song_list:
+        fetched_pb_dict, song_error_dict = scraper.fetch_pb_records(request_session, username, last_play_ver, fetch_song_list, cancel_event)
+        chart_pb_dict.update(fetched_pb_dict)
+        _save_pb_records(username, store_ver, fetched_pb_dict)
+
+    # 5) wait for the stale songs until the live timeout from the start of their fetch,
+    #    and serve the songs not fetched in time from the store
+    if stale_song_list:
+        refreshed_pb_dict = _wait_for_refresh(refresh_future_list, max(0.0, refresh_deadline - time.monotonic()))
+        for song in stale_song_list:
+            if all(chart.chart_id in refreshed_pb_dict for chart in song.charts):
+                chart_pb_dict.update({chart.chart_id: refreshed_pb_dict[chart.chart_id] for chart in song.charts})
+            else:
+                stored_song_list.append(song)
+
+    # 6) serve the stored records, and return when the oldest of them was fetched
+    cached_as_of = None
+    for song in stored_song_list:
+        for chart in song.charts:
+            chart_pb_dict[chart.chart_id] = PbInfo(*pb_record_dict[chart.chart_id][:-1])
+            fetched_at = pb_record_dict[chart.chart_id][-1]
+            cached_as_of = fetched_at if cached_as_of is None else min(cached_as_of, fetched_at)
+
+    return chart_pb_dict, song_error_dict, cached_as_of
+
+
+def shutdown() -> None:
+    with _refresh_lock:
+        if _refresh_state['executor'] is not None:
+            _refresh_state['executor'].shutdown(wait=False, cancel_futures=True)
+            _refresh_state['executor'] = None
+
+
+def _get_store_version(last_play_ver: str) -> str:
+    # 'c' = current version
+    return str(config.get('IIDX', 'iidxme_current_version')) if last_play_ver == 'c' else last_play_ver
+
+
+def _save_pb_records(username: str, store_ver: str, chart_pb_dict: dict[str, PbInfo]) -> None:
+    logger = logging.getLogger(__name__)
+
+    if not chart_pb_dict:
+        return
+
+    fetched_at = time.time()
+    try:
+        bot_db.update_pb_records(username, store_ver,
+                                 {chart_id: astuple(pb) + (fetched_at, ) for chart_id, pb in chart_pb_dict.items()})
+    except Exception as e:
+        logger.error(repr(e))
+
+
+def _wait_for_refresh(future_list: list[Future], timeout: float) -> dict[str, PbInfo]:
+    # return the PB info of the charts fetched in background within the timeout
+    # fetches not completed in time keep running, and store the records when they complete
+    done_set, _ = wait(future_list, timeout=timeout)
+
+    chart_pb_dict = {}
+    for future in done_set:
+        if not future.cancelled():
+            chart_pb_dict.update(future.result())
+
+    return chart_pb_dict
+
+
+def _refresh_in_background(request_session: requests.Session, username: str, last_play_ver: str, song_list: list[Song]) -> list[Future]:
+    # return the futures of the fetches covering the songs
+    # songs already being fetched share the fetch in progress
+    store_ver = _get_store_version(last_play_ver)
+
+    with _refresh_lock:
+        future_list = [_refresh_state['in_progress'][(username, store_ver, song.song_id)] for song in song_list
+                       if (username, store_ver, song.song_id) in _refresh_state['in_progress']]
+        song_list = [song for song in song_list if (username, store_ver, song.song_id) not in _refresh_state['in_progress']]
+        if not song_list:
+            return list(set(future_list))
+
+        if _refresh_state['executor'] is None:
+            _refresh_state['executor'] = ThreadPoolExecutor(max_workers=int(config.get('IIDXME_PB', 'pb_store_refresh_threads')),
+                                                            thread_name_prefix="iidxpb_refresh")
+        future = _refresh_state['executor'].submit(_refresh, request_session, username, last_play_ver, song_list)
+        _refresh_state['in_progress'].update({(username, store_ver, song.song_id): future for song in song_list})
+
+    return list(set(future_list)) + [future]
+
+
+def _refresh(request_session: requests.Session, username: str, last_play_ver: str, song_list: list[Song]) -> dict[str, PbInfo]:
+    logger = logging.getLogger(__name__)
+
+    store_ver = _get_store_version(last_play_ver)
+    chart_pb_dict = {}
+
+    try:
+        chart_pb_dict, song_error_dict = scraper.fetch_pb_records(request_session, username, last_play_ver, song_list)
+        _save_pb_records(username, store_ver, chart_pb_dict)
+        logger.debug(f"Refreshed PB records of {username}: {len(chart_pb_dict)} charts, errors: {song_error_dict}")
+    except Exception as e:
+        logger.error(f"Failed to refresh PB records of {username}: {repr(e)}")
+    finally:
+        with _refresh_lock:
+            for song in song_list:
+                _refresh_state['in_progress'].pop((username, store_ver, song.song_id), None)
+
+    return chart_pb_dict
@@ -0,0 +1,146 @@
+import sys
+import re
+import time
+from pathlib import Path
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+import logging
+from commands.iidxme.models.PbInfo import PbInfo
+import config.config_reader as config
+
+
+'''
+    parser of iidx.me song pages, extracting the PB info of all charts of a song in one pass
+
+    only the tabview_<chart_id> divs of the page are built into a tree (SoupStrainer), and the elements of each tabview
+    are visited once to pick up the clear lamps, the score tables and the miss counts.
+    the extracted PB info is verified against the per-chart extraction it replaced, in tests/test_song_page_parser.py.
+
+    benchmark of the parse time, with song pages saved as <song_id>.html in a directory, e.g. tests/fixtures/song_pages:
+        python -m commands.iidxme.song_page_parser <directory> [number of rounds]
+'''
+
+_TABVIEW_PATTERN = re.compile("^tabview_")
+_NUMBER_PATTERN = re.compile("^[0-9]+$")
+
+
+def parse_song_page(page_content: bytes, chart_id_list: list[str]) -> dict[str, PbInfo]:
+    # return the PB info of the given charts, {chart_id: PbInfo}
+    logger = logging.getLogger(__name__)
+
+    chart_pb_dict = {}
+    # clear lamp -> abbreviation in config file, looked up once per lamp
+    lamp_abbr_dict = {}
+
+    try:
+        soup = BeautifulSoup(page_content, 'lxml', from_encoding='utf-8',
+                             parse_only=SoupStrainer('div', attrs={'name': _TABVIEW_PATTERN}))
+
+        chart_id_set = set(chart_id_list)
+        for div_chart_data in soup.find_all('div', attrs={'name': _TABVIEW_PATTERN}):
+            chart_id = div_chart_data['name'][len("tabview_"):]
+            # the first tabview of each chart is used
+            if chart_id in chart_id_set and chart_id not in chart_pb_dict:
+                chart_pb_dict[chart_id] = _extract_pb_info(div_chart_data, lamp_abbr_dict)
+
+        # every chart should be found in the page
+        if chart_id_set - chart_pb_dict.keys():
+            raise AttributeError(f"tabview not found: {sorted(chart_id_set - chart_pb_dict.keys())}")
+
+        return {chart_id: chart_pb_dict[chart_id] for chart_id in chart_id_list}
+
+    except (KeyError, AttributeError, IndexError) as e:
+        logger.error(repr(e))
+        raise Exception(config.get('IIDX', 'msg_parse_page_error'))
+    except Exception as e:
+        logger.error(repr(e))
+        raise Exception(config.get('IIDX', 'msg_generic_error'))
+
+
+def _extract_pb_info(div_chart_data: Tag, lamp_abbr_dict: dict[str, str]) -> PbInfo:
+    # PB info to be returned
+    pb_lamp = "--"
+    pb_score = -1
+    pb_score_attained_version = ""
+    pb_rank = "?"
+    pb_rank_diff = ""
+    pb_rate = "?"
+    pb_misscount = 9999
+
+    # 1) visit all elements of the chart once, and pick up
+    #   a) the first non-empty clear lamp, which is the best clear lamp found in the most recent record
+    #   b) the lowest miss count
+    #   c) the table containing score history, and the table containing release version titles
+    div_table_hist = None
+    div_table_ver = None
+
+    for element in div_chart_data.find_all(['div', 'span']):
+        if element.name == 'div':
+            if pb_lamp == "--" and _has_class(element, "div_td clear"):
+                lamp = element.get_text()
+                if lamp != "":
+                    if lamp not in lamp_abbr_dict:
+                        lamp_abbr_dict[lamp] = config.get('IIDX', f"abbr_{lamp}")
+                    pb_lamp = lamp_abbr_dict[lamp]
+            elif div_table_hist is None and _has_class(element, "table_scrollcol music"):
+                div_table_hist = element
+            elif div_table_ver is None and _has_class(element, "table_fixcol music"):
+                div_table_ver = element
+        elif _has_class(element, "miss"):
+            miss = element.get_text()
+            if _NUMBER_PATTERN.search(miss) and (int(miss) < pb_misscount):
+                pb_misscount = int(miss)
+
+    # 2) loop through the table containing score history for the best score, rank and score rate
+    pb_row = -1
+    for idx, div_row in enumerate(div_table_hist.find_all('div', class_="div_tr")):
+        p_score = div_row.find('p', class_="score")
+
+        if p_score and _NUMBER_PATTERN.search(p_score.get_text()):
+            score = int(p_score.get_text())
+            if score > pb_score:
+                pb_row = idx
+                pb_score = score
+                pb_rank = p_score.find_previous('p', class_="rank").get_text()
+                span_rank_diff = p_score.find_next("span", "pri_border")
+                if span_rank_diff:
+                    pb_rank_diff = f"{span_rank_diff.get_text().lstrip()}"
+                pb_rate = p_score.find_next('div', class_="rate_wrapper").get_text()
+            # if there is a tie for best score, update pb_row index to display earlier release version title
+            elif score == pb_score:
+                pb_row = idx
+
+    # 3) get the version in which the best score was attained
+    if pb_row != -1:
+        span_ver = div_table_ver.find_all('div', class_="div_tr")[pb_row].find('span', class_="short")
+        if span_ver and span_ver.get_text():
+            pb_score_attained_version = span_ver.get_text().split(" ")[-1]
+
+    return PbInfo(pb_lamp, pb_score, pb_score_attained_version, pb_rank, pb_rank_diff, pb_rate, pb_misscount)
+
+
+def _has_class(element: Tag, class_name: str) -> bool:
+    # same as class_=class_name of BeautifulSoup: any one of the classes, or the whole class attribute, equals class_name
+    class_list = element.get('class') or []
+    return class_name in class_list or " ".join(class_list) == class_name
+
+
+def _benchmark(page_dir: Path, num_of_rounds: int) -> None:
+    page_list = [page_file.read_bytes() for page_file in sorted(page_dir.glob("*.html"))]
+    # all charts in each page
+    chart_id_lists = [list(dict.fromkeys(re.findall(r"name=[\"']tabview_([^\"']+)", page.decode('utf-8')))) for page in page_list]
+
+    start_time = time.perf_counter()
+    for _ in range(num_of_rounds):
+        for page_content, chart_id_list in zip(page_list, chart_id_lists):
+            parse_song_page(page_content, chart_id_list)
+    elapsed = time.perf_counter() - start_time
+
+    num_of_pages = len(page_list) * num_of_rounds
+    print(f"{len(page_list)} pages x {num_of_rounds} rounds, {sum(map(len, chart_id_lists)) * num_of_rounds} charts")
+    if num_of_pages:
+        print(f"parse time: {elapsed * 1000 / num_of_pages:.2f} ms/page")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    _benchmark(Path(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -30,7 +30,8 @@ def get_result_embed(p_arg_str: str) -> Embed:
         # 2) fetch charts from DB with the search criteria
         # 2.1) limit the result set to the number of songs specified in config file
         result_limit = int(config.get('IIDXME_SR', 'result_limit'))
-        num_of_matches = db.get_num_of_matched_songs(mode, difficulty, level, keywords, flag_exact_keyword_match)
+        # 2.2) fetch the number of matched songs and song & chart info (song_id, chart_id, title, difficulty, level) from DB
+        num_of_matches, song_list = db.search_charts(mode, difficulty, level, keywords, flag_exact_keyword_match, result_limit)
 
         # display message if number of results exceeds limit
         if num_of_matches > result_limit:
@@ -38,11 +39,8 @@ def get_result_embed(p_arg_str: str) -> Embed:
 
         # display message if no charts are found
         if num_of_matches == 0:
-            embed_desc += config.get('IIDX', 'msg_result_not_found')
+            embed_desc += iidx_util.get_result_not_found_msg(keywords, flag_exact_keyword_match)
         else:
-            # 2.2) fetch song & chart info (song_id, chart_id, title, difficulty, level) from DB
-            song_list = db.fetch_charts(mode, difficulty, level, keywords, flag_exact_keyword_match, result_limit)
-            
             # 3) calculate scores needed for each rank and construct the embed object desc for display
             embed_desc += _cal_score_and_build_embed_desc(song_list)
 
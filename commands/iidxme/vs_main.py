@@ -0,0 +1,232 @@
+from discord import Embed
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import logging
+from db.models.Song import Song
+from commands.iidxme.models.PbInfo import PbInfo
+import commands.iidxme.iidxme_util as iidx_util
+import commands.iidxme.lookup_runner as lookup_runner
+import commands.iidxme.pb_scraper as scraper
+import commands.iidxme.pb_store as pb_store
+import db.iidxme_db as db
+import config.config_reader as config
+import utils.display_util as display_util
+import utils.http_client as http_client
+import utils.string_util as string_util
+
+
+# thread pool fetching the records of the players of all comparisons, sized by max_concurrent_lookups x max_players,
+# so that every player of the comparisons running at the same time is fetched at the same time
+_player_executor_state = {'executor': None}
+_player_executor_lock = threading.Lock()
+
+
+async def get_result_embed_async(p_arg_str: str) -> Embed:
+    # run the comparison in the thread pool of $iidxvs, so that the event loop is not blocked while iidx.me is being fetched
+    return await lookup_runner.run_async('IIDXME_VS', get_result_embed, p_arg_str)
+
+
+def shutdown() -> None:
+    # cancel all comparisons in progress and stop the thread pools
+    lookup_runner.shutdown('IIDXME_VS')
+
+    with _player_executor_lock:
+        executor = _player_executor_state['executor']
+        _player_executor_state['executor'] = None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def get_result_embed(p_arg_str: str, cancel_event: threading.Event | None = None) -> Embed:
+    logger = logging.getLogger(__name__)
+
+    logger.debug(p_arg_str)
+
+    # elements of Discord embed object to be displayed
+    embed_title = config.get('IIDXME_VS', 'title')
+    embed_desc = ""
+    embed_colour = config.get('IIDXME_VS', 'colour_embed_border')
+    embed_footer = ""
+
+    try:
+        # 1) parse the command arguments
+        # usernames are separated by commas, e.g. userA,userB,userC spa12 "exact song title"
+        max_players = int(config.get('IIDXME_VS', 'max_players'))
+        num_of_usernames, arg_str = _split_usernames(p_arg_str, max_players)
+        if num_of_usernames == 0:
+            raise ValueError(config.get('IIDX', 'msg_missing_args'))
+        if num_of_usernames < 2 or num_of_usernames > max_players:
+            raise ValueError(config.get('IIDXME_VS', 'msg_invalid_num_of_players') + str(max_players))
+
+        username_list, mode, difficulty, level, keywords, flag_exact_keyword_match, flag_display_score_percentage \
+            = iidx_util.parse_arguments(num_of_usernames=num_of_usernames, arg_str=arg_str)
+
+        # display play mode
+        embed_title += f" ({mode.upper()})"
+
+        # 2) fetch charts from DB with the search criteria
+        # 2.1) limit the result set to the number of songs specified in config file
+        result_limit = int(config.get('IIDXME_VS', 'result_limit'))
+        # 2.2) fetch the number of matched songs and song & chart info (song_id, chart_id, title, difficulty, level) from DB
+        num_of_matches, song_list = db.search_charts(mode, difficulty, level, keywords, flag_exact_keyword_match, result_limit)
+
+        # display message if number of results exceeds limit
+        if num_of_matches > result_limit:
+            embed_desc += config.get('IIDX', 'msg_too_many_results') + "\n\n"
+
+        # display message if no charts are found
+        if num_of_matches == 0:
+            embed_desc += iidx_util.get_result_not_found_msg(keywords, flag_exact_keyword_match)
+        else:
+            # 3) get the last play version and personal best records of all players at the same time
+            # requests to iidx.me of all players share the limit of concurrent requests (max_concurrent_requests)
+            request_session = http_client.get_session()
+            executor = _get_player_executor()
+            future_list = [executor.submit(_fetch_player_records, request_session, username, song_list, cancel_event)
+                           for username in username_list]
+
+            # collect the results in the order of players
+            # players failed to look up are displayed with the error message, without aborting the others
+            player_record_dict = {}
+            player_error_dict = {}
+            for username, future in zip(username_list, future_list):
+                try:
+                    player_record_dict[username] = future.result()
+                except Exception as e:
+                    logger.debug(f"-- username: {username} / {repr(e)}")
+                    player_error_dict[username] = str(e)
+
+            # stop here if the comparison has been cancelled, e.g. timed out
+            scraper.check_cancelled(cancel_event)
+
+            # 4) construct the embed object desc for display
+            embed_desc += _build_embed_desc_for_VS(username_list, song_list, player_record_dict, player_error_dict,
+                                                   flag_display_score_percentage)
+
+            # 5) display the time of the records from the PB store, if any are displayed
+            cached_as_of_list = [cached_as_of for _, _, _, cached_as_of in player_record_dict.values() if cached_as_of is not None]
+            if cached_as_of_list:
+                embed_footer = config.get('IIDXME_PB', 'msg_cached_as_of') + datetime.fromtimestamp(min(cached_as_of_list)).strftime("%Y-%m-%d %H:%M")
+
+    except ValueError as ve:
+        logger.debug(repr(ve))
+        embed_desc = str(ve)
+        embed_colour = config.get('COMMAND_ERROR', 'colour_error')
+        embed_footer = ""
+    except Exception as e:
+        logger.error(repr(e))
+        embed_desc = str(e)
+        embed_colour = config.get('COMMAND_ERROR', 'colour_error')
+        embed_footer = ""
+    finally:
+        return display_util.construct_embed(title=embed_title, desc=embed_desc, colour=embed_colour,
+                                    footer=embed_footer, image_url="")
+
+
+def _get_player_executor() -> ThreadPoolExecutor:
+    if _player_executor_state['executor'] is None:
+        with _player_executor_lock:
+            if _player_executor_state['executor'] is None:
+                max_workers = int(config.get('IIDXME_VS', 'max_concurrent_lookups')) * int(config.get('IIDXME_VS', 'max_players'))
+                _player_executor_state['executor'] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="iidxvs_player")
+
+    return _player_executor_state['executor']
+
+
+def _split_usernames(arg_str: str, max_players: int) -> tuple[int, str]:
+    # return the number of usernames, and the argument string with the comma-separated usernames separated by spaces,
+    # which is the format of usernames accepted by iidx_util.parse_arguments
+    # usernames are collected up to one more than max_players, which is enough to reject too many players
+    arg_list = arg_str.split()
+
+    # skip the optional flag
+    idx = 1 if (len(arg_list) > 1) and (arg_list[0] == "-%") else 0
+    if idx >= len(arg_list):
+        return 0, arg_str
+
+    # the same player is compared once, and counted once towards the number of players
+    username_list = []
+    for username in arg_list[idx].split(","):
+        if username and username not in username_list:
+            username_list.append(username)
+            if len(username_list) > max_players:
+                break
+
+    return len(username_list), " ".join(arg_list[:idx] + username_list + arg_list[idx+1:])
+
+
+def _fetch_player_records(request_session: requests.Session, username: str, song_list: list[Song], cancel_event: threading.Event | None) \
+        -> tuple[str, dict[str, PbInfo], dict[str, str], float | None]:
+    # return the last play version, the PB info of each chart, the error message of each song failed to fetch,
+    # and the time of the oldest record displayed from the PB store, of the player
+    last_play_ver = scraper.resolve_last_play_version(request_session, username)
+    pb_dict, song_error_dict, cached_as_of = pb_store.fetch_pb_records(request_session, username, last_play_ver,
+                                                                       song_list, cancel_event)
+
+    return last_play_ver, pb_dict, song_error_dict, cached_as_of
+
+
+def _build_embed_desc_for_VS(username_list: list[str], song_list: list[Song],
+                             player_record_dict: dict[str, tuple], player_error_dict: dict[str, str],
+                             flag_display_score_percentage: bool) -> str:
+    embed_desc = ""
+
+    # display players, and the error message of players failed to look up
+    '''
+        sample:
+        Players: userA / userB / userC
+        userC: iidx.me冇呢個user喎🈚
+    '''
+    embed_desc += "Players: " + " / ".join(string_util.escape_special_formatting_characters(username)
+                                           for username in username_list) + "\n"
+    for username, error_msg in player_error_dict.items():
+        embed_desc += f"{string_util.escape_special_formatting_characters(username)}: {error_msg}\n"
+    embed_desc += "\n"
+
+    for song in song_list:
+        # display song title
+        embed_desc += f"**{string_util.escape_special_formatting_characters(song.title)}**\n"
+
+        for chart in song.charts:
+            # display chart difficulty and level, then PB info of each player, with the best score marked
+            '''
+                sample:
+                🟥12
+                　👑 userA：FC／[AAA] 2123／BP 0
+                　userB：HC／[AA] 1900／BP 12
+            '''
+            difficulty_emoji = config.get('IIDX', f"emoji_{chart.difficulty}")
+            level_str = "?" if chart.level == -1 else str(chart.level)
+            embed_desc += f"{difficulty_emoji}{level_str.rjust(2)}\n"
+
+            best_score = max((pb_dict[chart.chart_id].score for _, pb_dict, _, _ in player_record_dict.values()
+                              if chart.chart_id in pb_dict), default=-1)
+
+            for username, (last_play_ver, pb_dict, song_error_dict, _) in player_record_dict.items():
+                player_str = string_util.escape_special_formatting_characters(username)
+
+                # display the error message if the song page of the player failed to fetch
+                if song.song_id in song_error_dict:
+                    embed_desc += f"　{player_str}：{song_error_dict[song.song_id]}\n"
+                    continue
+
+                pb = pb_dict[chart.chart_id]
+
+                best_mark = config.get('IIDXME_VS', 'emoji_best') + " " if (pb.score != -1 and pb.score == best_score) else ""
+
+                embed_desc += f"　{best_mark}{player_str}：{iidx_util.get_pb_str(pb, flag_display_score_percentage, False)}\n"
+
+        embed_desc += "\n"
+
+    return embed_desc
+
+
+def prompt_loading_message() -> Embed:
+    embed_title = config.get('IIDXME_VS', 'title')
+    embed_desc = config.get('IIDXME_PB', 'msg_loading')
+    embed_colour = config.get('IIDXME_VS', 'colour_embed_border')
+    embed_footer = ""
+    return display_util.construct_embed(title=embed_title, desc=embed_desc, colour=embed_colour,
+                                footer=embed_footer, image_url="")
@@ -3,7 +3,6 @@ import jieba
 import emoji
 from PIL import Image
 from imojify import imojify
-import requests
 from io import BytesIO
 from pathlib import Path
 import re
@@ -11,6 +10,7 @@ import datetime
 import logging
 import commands.wordcloud.wc_generator as generator
 import config.config_reader as config
+import utils.http_client as http_client
 import utils.display_util as display_util
 
 
@@ -61,7 +61,7 @@ def get_result_embed(p_args: list, msg_list: list) -> Embed:
                 emoji_img = Image.open(imojify.get_img_path(unicode_emoji))
             elif custom_emoji_id != -1:
                 # b) discord server custom emoji: fetch emoji image from discord
-                response = requests.get(f"https://cdn.discordapp.com/emojis/{custom_emoji_id}.webp?quality=lossless")
+                response = http_client.get(f"https://cdn.discordapp.com/emojis/{custom_emoji_id}.webp?quality=lossless")
                 emoji_img = Image.open(BytesIO(response.content))
 
             # 4.2) generate the word cloud output image filename wth timestamp
@@ -1,30 +1,103 @@
 import os
+import time
 from pathlib import Path
+from types import MappingProxyType
 from dotenv import load_dotenv
+import threading
 import yaml
 import logging
 
 
+CONFIG_FILE = Path("config/config.yaml")
+DOTENV_FILE = Path("config/.env")
+
+# the mtime of a config file is checked at most once per interval, as config is read on every message and keystroke
+# $reloadconfig (reload()) parses the files again immediately
+MTIME_CHECK_INTERVAL_SEC = 1.0
+
+# parsed config snapshots, keyed by file path
+# each entry = (mtime of the file when it was parsed, immutable snapshot of the parsed content, time of the last mtime check)
+_snapshot_dict = {}
+_snapshot_lock = threading.Lock()
+
+
 def get(section: str, key: str):
     logger = logging.getLogger(__name__)
 
     try:
         if section == 'ENV':
-            # load config in .env
-            dotenv_path = Path("config/.env")
-            load_dotenv(dotenv_path=dotenv_path)
+            # load config in .env (only when the file has changed since it was last loaded)
+            _get_snapshot(DOTENV_FILE, _load_dotenv)
             value = os.getenv(key.upper())
         else:
-            # load config in config.yaml
-            with open(Path("config/config.yaml"), 'r', encoding='utf8') as file:
-                config = yaml.safe_load(file)
-                value = config[section][key]
-                
+            # read config in config.yaml from the parsed snapshot
+            config = _get_snapshot(CONFIG_FILE, _load_yaml)
+            value = config[section][key]
+
         return value
-    
+
     except yaml.YAMLError as e:
         logger.error(repr(e))
         raise
     except Exception as e:
         logger.error(repr(e))
-        raise
\ No newline at end of file
+        raise
+
+
+def reload() -> None:
+    # mark all parsed snapshots as outdated and parse the config files again
+    logger = logging.getLogger(__name__)
+
+    with _snapshot_lock:
+        for file_path, snapshot in _snapshot_dict.items():
+            _snapshot_dict[file_path] = (-1, snapshot[1], None)
+
+    _get_snapshot(DOTENV_FILE, _load_dotenv)
+    _get_snapshot(CONFIG_FILE, _load_yaml)
+    logger.info("Config reloaded")
+
+
+def _get_snapshot(file_path: Path, loader):
+    # return the cached snapshot of the file, parse the file again only if its mtime has changed
+    snapshot = _snapshot_dict.get(file_path)
+    now = time.monotonic()
+    if snapshot and snapshot[2] is not None and now - snapshot[2] < MTIME_CHECK_INTERVAL_SEC:
+        return snapshot[1]
+
+    try:
+        mtime = os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    if snapshot and snapshot[0] == mtime:
+        _snapshot_dict[file_path] = (mtime, snapshot[1], now)
+        return snapshot[1]
+
+    with _snapshot_lock:
+        # another thread may have parsed the file while waiting for the lock
+        snapshot = _snapshot_dict.get(file_path)
+        if snapshot and snapshot[0] == mtime:
+            return snapshot[1]
+
+        content = loader(file_path) if mtime is not None else None
+        _snapshot_dict[file_path] = (mtime, content, now)
+        return content
+
+
+def _load_yaml(file_path: Path):
+    with open(file_path, 'r', encoding='utf8') as file:
+        return _freeze(yaml.safe_load(file))
+
+
+def _load_dotenv(file_path: Path) -> None:
+    # values in .env only override the environment variables when the file is loaded again after a change
+    load_dotenv(dotenv_path=file_path, override=(file_path in _snapshot_dict))
+
+
+def _freeze(value):
+    # convert the parsed yaml content into read-only containers, so that callers cannot modify the shared snapshot
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
@@ -0,0 +1,60 @@
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import db.bot_db as bot_db
+import config.config_reader as config
+
+
+'''
+    awaitable access to the DBs for coroutines, so that the event loop is never blocked by SQLite
+
+    bot DB      : coroutines access bot_db in a single writer thread, so their reads and writes run in order.
+                  bot_db also writes from other threads: its flusher thread writes bot_param changes in batches, and
+                  the iidx.me lookup threads store the last play versions and PB records. all of them share the
+                  connection of bot_db, which serializes its use
+    catalog DB  : a pool of reader threads, each with its own read-only connection (see iidxme_conn),
+                  sized by iidxme_db_reader_threads in config file
+'''
+
+_executor_state = {'writer': None, 'reader': None}
+_executor_lock = threading.Lock()
+
+
+async def get_bot_param(module: str, key: str) -> str:
+    return await run_in_writer(bot_db.get_bot_param, module, key)
+
+
+async def run_in_writer(func, *args):
+    # run a function accessing the bot DB in the writer thread
+    return await asyncio.get_running_loop().run_in_executor(_get_executor('writer'), partial(func, *args))
+
+
+async def run_in_reader(func, *args):
+    # run a function reading the catalog DB in a reader thread
+    return await asyncio.get_running_loop().run_in_executor(_get_executor('reader'), partial(func, *args))
+
+
+def shutdown() -> None:
+    # wait for pending DB access to complete and stop all threads
+    with _executor_lock:
+        for name, executor in _executor_state.items():
+            if executor is not None:
+                executor.shutdown(wait=True)
+                _executor_state[name] = None
+
+
+def _get_executor(name: str) -> ThreadPoolExecutor:
+    executor = _executor_state[name]
+    if executor is None:
+        with _executor_lock:
+            executor = _executor_state[name]
+            if executor is None:
+                if name == 'writer':
+                    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bot_db_writer")
+                else:
+                    executor = ThreadPoolExecutor(max_workers=int(config.get('BOT', 'iidxme_db_reader_threads')),
+                                                  thread_name_prefix="iidxme_db_reader")
+                _executor_state[name] = executor
+
+    return executor
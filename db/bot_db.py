@@ -1,23 +1,37 @@
 import sqlite3
+import atexit
+import threading
 from pathlib import Path
 from contextlib import closing
 import logging
 import config.config_reader as config
 
 
+# in-memory copy of bot_param, {(module, key): value, ...}
+# reads are served from memory, and updates are written to the bot DB in batches by a background flusher thread
+# every bot_db_flush_interval_sec seconds, and once more when the bot exits
+_param_state = {'loaded': False, 'values': {}, 'dirty': set()}
+_param_lock = threading.RLock()
+
+_flusher_state = {'thread': None, 'atexit_registered': False}
+_flusher_stop_event = threading.Event()
+
+# the connection to the bot DB shared by the flusher thread, the writer thread of async_db and the PB lookup threads
+# it is opened once in WAL mode, and the lock serializes its use
+_conn_state = {'dbconn': None}
+_conn_lock = threading.RLock()
+
+
 def get_bot_param(module: str, key: str) -> str:
     logger = logging.getLogger(__name__)
 
     try:
-        with closing(sqlite3.connect(Path(config.get('BOT', 'bot_db_file')))) as dbconn:
-            with closing(dbconn.cursor()) as cursor:
-                row = cursor.execute(
-                            "SELECT value FROM bot_param WHERE module = ? AND key = ?",
-                            (module, key)
-                        ).fetchone()
-        
-        return row[0] if row else ""
-    
+        with _param_lock:
+            if not _param_state['loaded']:
+                _load_bot_params()
+
+            return _param_state['values'].get((module, key), "")
+
     except sqlite3.DatabaseError as e:
         logger.error(repr(e))
         raise
@@ -30,17 +44,230 @@ def update_bot_param(module: str, key: str, value: str):
     logger = logging.getLogger(__name__)
 
     try:
-        with closing(sqlite3.connect(Path(config.get('BOT', 'bot_db_file')))) as dbconn:
+        with _param_lock:
+            if not _param_state['loaded']:
+                _load_bot_params()
+
+            # only changed values are written to the bot DB on next flush
+            if _param_state['values'].get((module, key)) != value:
+                _param_state['values'][(module, key)] = value
+                _param_state['dirty'].add((module, key))
+
+        _start_flusher()
+
+    except sqlite3.DatabaseError as e:
+        logger.error(repr(e))
+        raise
+    except Exception as e:
+        logger.error(repr(e))
+        raise
+
+
+def flush() -> int:
+    # write all changed values to the bot DB in a single transaction, and return the number of values written
+    logger = logging.getLogger(__name__)
+
+    with _param_lock:
+        dirty_list = [(module, key, _param_state['values'][(module, key)]) for module, key in _param_state['dirty']]
+        _param_state['dirty'].clear()
+
+    if not dirty_list:
+        return 0
+
+    try:
+        with _conn_lock:
+            dbconn = _get_connection()
+            with dbconn:
+                with closing(dbconn.cursor()) as cursor:
+                    for module, key, value in dirty_list:
+                        cursor.execute(
+                            "UPDATE bot_param SET value = ? WHERE module = ? AND key = ?",
+                            (value, module, key)
+                        )
+                        if cursor.rowcount == 0:
+                            cursor.execute(
+                                "INSERT INTO bot_param (module, key, value) VALUES (?, ?, ?)",
+                                (module, key, value)
+                            )
+
+        logger.debug(f"Flushed {len(dirty_list)} bot params")
+        return len(dirty_list)
+
+    except sqlite3.DatabaseError as e:
+        logger.error(repr(e))
+        # keep the values as changed, unless they have been changed again since, to retry on next flush
+        with _param_lock:
+            _param_state['dirty'].update((module, key) for module, key, _ in dirty_list)
+        raise
+
+
+def close() -> None:
+    # stop the flusher thread, write all pending changes and close the connection
+    logger = logging.getLogger(__name__)
+
+    _flusher_stop_event.set()
+    thread = _flusher_state['thread']
+    if thread is not None and thread is not threading.current_thread():
+        thread.join()
+    _flusher_state['thread'] = None
+
+    try:
+        flush()
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Failed to flush bot params on exit: {repr(e)}")
+
+    with _conn_lock:
+        if _conn_state['dbconn'] is not None:
+            _conn_state['dbconn'].close()
+            _conn_state['dbconn'] = None
+
+
+def fetch_last_play_versions() -> dict[str, tuple[str, str, float]]:
+    # return the resolved last play version of iidx.me users, {username: (version, current_version, fetched_at), ...}
+    logger = logging.getLogger(__name__)
+
+    try:
+        with _conn_lock:
+            dbconn = _get_connection()
             with closing(dbconn.cursor()) as cursor:
-                cursor.execute(
-                    "UPDATE bot_param SET value = ? WHERE module = ? AND key = ?",
-                    (value, module, key)
+                rows = cursor.execute(
+                            "SELECT username, version, current_version, fetched_at FROM iidxme_last_play_version"
+                        ).fetchall()
+
+        return {username: (version, current_version, fetched_at) for username, version, current_version, fetched_at in rows}
+
+    except sqlite3.DatabaseError as e:
+        logger.error(repr(e))
+        raise
+
+
+def update_last_play_version(username: str, version: str, current_version: str, fetched_at: float) -> None:
+    logger = logging.getLogger(__name__)
+
+    try:
+        with _conn_lock:
+            dbconn = _get_connection()
+            with dbconn:
+                dbconn.execute(
+                    "INSERT OR REPLACE INTO iidxme_last_play_version (username, version, current_version, fetched_at) " +
+                    "VALUES (?, ?, ?, ?)",
+                    (username, version, current_version, fetched_at)
                 )
-            dbconn.commit()
-            
+
     except sqlite3.DatabaseError as e:
         logger.error(repr(e))
         raise
-    except Exception as e:
+
+
+def delete_last_play_version(username: str) -> None:
+    logger = logging.getLogger(__name__)
+
+    try:
+        with _conn_lock:
+            dbconn = _get_connection()
+            with dbconn:
+                dbconn.execute("DELETE FROM iidxme_last_play_version WHERE username = ?", (username, ))
+
+    except sqlite3.DatabaseError as e:
+        logger.error(repr(e))
+        raise
+
+
+def fetch_pb_records(username: str, version: str, chart_id_list: list[str]) -> dict[str, tuple]:
+    # return the stored PB records of the charts,
+    # {chart_id: (lamp, score, score_attained_version, rank, rank_diff, rate, misscount, fetched_at), ...}
+    logger = logging.getLogger(__name__)
+
+    pb_record_dict = {}
+
+    try:
+        with _conn_lock:
+            dbconn = _get_connection()
+            with closing(dbconn.cursor()) as cursor:
+                for i in range(0, len(chart_id_list), 500):
+                    chart_id_batch = chart_id_list[i:i+500]
+                    rows = cursor.execute(
+                                "SELECT chart_id, lamp, score, score_attained_version, rank, rank_diff, rate, misscount, fetched_at " +
+                                "FROM iidxme_pb_record " +
+                                f"WHERE username = ? AND version = ? AND chart_id IN ({', '.join('?' * len(chart_id_batch))})",
+                                [username, version] + chart_id_batch
+                            ).fetchall()
+                    pb_record_dict.update({row[0]: tuple(row[1:]) for row in rows})
+
+        return pb_record_dict
+
+    except sqlite3.DatabaseError as e:
+        logger.error(repr(e))
+        raise
+
+
+def update_pb_records(username: str, version: str, pb_record_dict: dict[str, tuple]) -> None:
+    # pb_record_dict = {chart_id: (lamp, score, score_attained_version, rank, rank_diff, rate, misscount, fetched_at), ...}
+    logger = logging.getLogger(__name__)
+
+    try:
+        with _conn_lock:
+            dbconn = _get_connection()
+            with dbconn:
+                dbconn.executemany(
+                    "INSERT OR REPLACE INTO iidxme_pb_record " +
+                    "   (username, version, chart_id, lamp, score, score_attained_version, rank, rank_diff, rate, misscount, fetched_at) " +
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(username, version, chart_id) + tuple(pb_record) for chart_id, pb_record in pb_record_dict.items()]
+                )
+
+    except sqlite3.DatabaseError as e:
         logger.error(repr(e))
-        raise
\ No newline at end of file
+        raise
+
+
+def _load_bot_params() -> None:
+    with _conn_lock:
+        dbconn = _get_connection()
+        with closing(dbconn.cursor()) as cursor:
+            rows = cursor.execute("SELECT module, key, value FROM bot_param").fetchall()
+
+    _param_state['values'] = {(module, key): value or "" for module, key, value in rows}
+    _param_state['dirty'].clear()
+    _param_state['loaded'] = True
+
+
+def _start_flusher() -> None:
+    if _flusher_state['thread'] is not None:
+        return
+
+    with _param_lock:
+        if _flusher_state['thread'] is None:
+            _flusher_stop_event.clear()
+            thread = threading.Thread(target=_run_flusher, name="bot_db_flusher", daemon=True)
+            _flusher_state['thread'] = thread
+            thread.start()
+            # the flusher is started again after close(), but close() is registered only once
+            if not _flusher_state['atexit_registered']:
+                atexit.register(close)
+                _flusher_state['atexit_registered'] = True
+
+
+def _run_flusher() -> None:
+    logger = logging.getLogger(__name__)
+
+    interval = float(config.get('BOT', 'bot_db_flush_interval_sec'))
+
+    while not _flusher_stop_event.wait(interval):
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Failed to flush bot params: {repr(e)}")
+
+
+def _get_connection() -> sqlite3.Connection:
+    # called with _conn_lock held
+    if _conn_state['dbconn'] is None:
+        # the connection is used by several threads, one at a time under _conn_lock
+        dbconn = sqlite3.connect(Path(config.get('BOT', 'bot_db_file')), check_same_thread=False)
+        # WAL lets the writes not block readers, and NORMAL sync is durable enough for bot params and cached records
+        dbconn.execute("PRAGMA journal_mode = WAL")
+        dbconn.execute("PRAGMA synchronous = NORMAL")
+        _conn_state['dbconn'] = dbconn
+
+    return _conn_state['dbconn']
@@ -0,0 +1,207 @@
+import sys
+import re
+import time
+import random
+import threading
+from functools import lru_cache
+from contextlib import closing
+import logging
+import numpy
+from db.models.Song import Song
+from db.models.Chart import Chart
+import db.iidxme_conn as iidxme_conn
+import utils.string_util as string_util
+import utils.normalize_util as normalize_util
+
+
+'''
+    in-memory search engine of the iidx.me catalog, used by iidxme_db.search_charts
+    when iidxme_search_engine = "memory" in config file
+
+    the whole catalog is loaded once per catalog DB generation into a column-oriented structure:
+        songs   : sorted in the order of search results (length of title, title, song_id),
+                  so that the index of a song is also its rank in search results
+        charts  : sorted by (song index, mode, difficulty order), with NumPy arrays for
+                  song index, mode, difficulty order, level and notes
+
+    a search filters the charts with vectorized comparisons, then matches the song title keywords only for
+    the songs having any matched chart, with the same matching rules as the SQL query in iidxme_db
+
+    benchmark against the SQLite query:
+        python -m db.iidxme_catalog_engine [number of queries]
+'''
+
+MODE_LIST = ('SP', 'DP')
+DIFFICULTY_LIST = ('B', 'N', 'H', 'A', 'L')
+
+
+class _Catalog:
+    __slots__ = ('generation',
+                 'song_ids', 'titles', 'title_keys', 'search_keys', 'romaji_keys',
+                 'chart_ids', 'chart_song_idx', 'chart_mode', 'chart_difficulty', 'chart_level', 'chart_notes')
+
+    def __init__(self, generation: int):
+        self.generation = generation
+
+
+_catalog_state = {'catalog': None}
+_catalog_lock = threading.Lock()
+
+
+def search_charts(mode: str, difficulty: str, level: str, keywords: str, flag_exact_match: bool, result_limit: int) -> tuple[int, list[Song]]:
+    catalog = get_catalog()
+
+    # 1) filter charts by mode, difficulty and level
+    chart_mask = catalog.chart_mode == _get_code(MODE_LIST, mode)
+    if difficulty != "ALL":
+        chart_mask &= catalog.chart_difficulty == _get_code(DIFFICULTY_LIST, difficulty)
+    if level != "ALL":
+        chart_mask &= catalog.chart_level == int(level)
+
+    # 2) match the song title keywords for songs with any matched chart, in the order of search results
+    candidate_song_idx_list = numpy.unique(catalog.chart_song_idx[chart_mask])
+    song_matcher = _get_song_matcher(keywords, flag_exact_match)
+
+    matched_song_idx_list = [song_idx for song_idx in candidate_song_idx_list.tolist() if song_matcher(catalog, song_idx)]
+
+    # 3) build the result of the first N songs with their matched charts
+    song_list = []
+    for song_idx in matched_song_idx_list[:result_limit]:
+        chart_idx_list = numpy.flatnonzero(chart_mask & (catalog.chart_song_idx == song_idx))
+        song_list.append(Song(song_id=catalog.song_ids[song_idx],
+                              title=catalog.titles[song_idx],
+                              charts=tuple(_build_chart(catalog, chart_idx) for chart_idx in chart_idx_list.tolist())))
+
+    return len(matched_song_idx_list), song_list
+
+
+def get_catalog() -> _Catalog:
+    # return the loaded catalog, or load it again if the catalog DB file has changed
+    generation = iidxme_conn.get_generation()
+    catalog = _catalog_state['catalog']
+    if catalog is None or catalog.generation != generation:
+        with _catalog_lock:
+            catalog = _catalog_state['catalog']
+            if catalog is None or catalog.generation != generation:
+                catalog = _load_catalog(generation)
+                _catalog_state['catalog'] = catalog
+
+    return catalog
+
+
+def _load_catalog(generation: int) -> _Catalog:
+    logger = logging.getLogger(__name__)
+
+    start_time = time.perf_counter()
+
+    dbconn = iidxme_conn.get_connection()
+    with closing(dbconn.cursor()) as cursor:
+        # songs, sorted in the order of search results, with the search keys stored in the catalog DB (see migrations),
+        # so that both engines match the keywords with the same keys
+        song_rows = cursor.execute(
+                        "SELECT song_id, title, title_key, search_key, romaji_key FROM iidxme_song " +
+                        "ORDER BY title_length, title, song_id"
+                    ).fetchall()
+        chart_rows = cursor.execute("SELECT chart_id, song_id, mode, difficulty, level, notes FROM iidxme_chart").fetchall()
+
+    catalog = _Catalog(generation)
+    catalog.song_ids = [sys.intern(row[0]) for row in song_rows]
+    catalog.titles = [sys.intern(row[1]) for row in song_rows]
+    catalog.title_keys = [row[2] or "" for row in song_rows]
+    catalog.search_keys = [row[3] or "" for row in song_rows]
+    catalog.romaji_keys = [row[4] or "" for row in song_rows]
+
+    # charts, sorted by song, mode and difficulty. charts of unknown songs/modes/difficulties are skipped
+    song_idx_dict = {song_id: idx for idx, song_id in enumerate(catalog.song_ids)}
+    chart_rows = [(song_idx_dict[row[1]], MODE_LIST.index(row[2]), DIFFICULTY_LIST.index(row[3]), row)
+                  for row in chart_rows
+                  if row[1] in song_idx_dict and row[2] in MODE_LIST and row[3] in DIFFICULTY_LIST]
+    chart_rows.sort(key=lambda chart: chart[:3])
+
+    catalog.chart_ids = [sys.intern(chart[3][0]) for chart in chart_rows]
+    catalog.chart_song_idx = numpy.array([chart[0] for chart in chart_rows], dtype=numpy.int32)
+    catalog.chart_mode = numpy.array([chart[1] for chart in chart_rows], dtype=numpy.int8)
+    catalog.chart_difficulty = numpy.array([chart[2] for chart in chart_rows], dtype=numpy.int8)
+    catalog.chart_level = numpy.array([_to_int(chart[3][4]) for chart in chart_rows], dtype=numpy.int16)
+    catalog.chart_notes = numpy.array([_to_int(chart[3][5]) for chart in chart_rows], dtype=numpy.int32)
+
+    logger.info(f"Loaded {len(catalog.song_ids)} songs and {len(catalog.chart_ids)} charts into memory "
+                f"in {time.perf_counter() - start_time:.3f}s")
+
+    return catalog
+
+
+def _get_song_matcher(keywords: str, flag_exact_match: bool):
+    # same matching rules as the song conditions in iidxme_db._get_chart_conditions_pstmt
+    converted_keywords = normalize_util.normalize_search_key(string_util.convert_chi_to_kanji(keywords))
+
+    if flag_exact_match:
+        exact_key_set = {keywords, converted_keywords}
+        return lambda catalog, song_idx: catalog.title_keys[song_idx] in exact_key_set
+
+    title_pattern_list = [_like_to_regex('%'+keywords+'%'), _like_to_regex('%'+converted_keywords+'%')]
+    romaji_pattern_list = [_like_to_regex(keywords), _like_to_regex(keywords+' %'),
+                           _like_to_regex('% '+keywords), _like_to_regex('% '+keywords+' %')]
+
+    def match(catalog: _Catalog, song_idx: int) -> bool:
+        search_key = catalog.search_keys[song_idx]
+        romaji_key = catalog.romaji_keys[song_idx]
+        return any(pattern.fullmatch(search_key) for pattern in title_pattern_list) \
+            or any(pattern.fullmatch(romaji_key) for pattern in romaji_pattern_list)
+
+    return match
+
+
+@lru_cache(maxsize=1024)
+def _like_to_regex(like_pattern: str) -> re.Pattern:
+    # translate an SQL LIKE pattern (without ESCAPE clause) into a regular expression
+    regex = "".join(".*" if char == '%' else "." if char == '_' else re.escape(char) for char in like_pattern)
+    return re.compile(regex, re.IGNORECASE | re.DOTALL)
+
+
+def _build_chart(catalog: _Catalog, chart_idx: int) -> Chart:
+    return Chart(chart_id=catalog.chart_ids[chart_idx],
+                 difficulty=DIFFICULTY_LIST[catalog.chart_difficulty[chart_idx]],
+                 level=int(catalog.chart_level[chart_idx]),
+                 notes=int(catalog.chart_notes[chart_idx]))
+
+
+def _get_code(value_list: tuple[str, ...], value: str) -> int:
+    return value_list.index(value) if value in value_list else -1
+
+
+def _to_int(value) -> int:
+    return -1 if value is None else int(value)
+
+
+def _benchmark(num_of_queries: int) -> None:
+    import db.iidxme_db as iidxme_db
+
+    # sample search criteria from the catalog
+    catalog = get_catalog()
+    rand = random.Random(0)
+    query_list = []
+    for _ in range(num_of_queries):
+        words = catalog.search_keys[rand.randrange(len(catalog.search_keys))].split()
+        keywords = rand.choice(words)[:rand.randint(1, 6)] if words else "a"
+        query_list.append((rand.choice(MODE_LIST), rand.choice(DIFFICULTY_LIST + ("ALL", "ALL")),
+                           rand.choice(("ALL", "ALL", str(rand.randint(1, 12)))),
+                           keywords.replace("%", "\\%"), False, 5))
+
+    timing_dict = {}
+    result_dict = {}
+    for engine_name, search_func in (('sqlite', iidxme_db._search_charts_in_db), ('memory', search_charts)):
+        start_time = time.perf_counter()
+        result_dict[engine_name] = [search_func(*query) for query in query_list]
+        timing_dict[engine_name] = time.perf_counter() - start_time
+
+    num_of_mismatches = sum(1 for a, b in zip(result_dict['sqlite'], result_dict['memory']) if a != b)
+
+    for engine_name, elapsed in timing_dict.items():
+        print(f"{engine_name:>6}: {elapsed * 1000 / num_of_queries:.3f} ms/query ({num_of_queries} queries)")
+    print(f"mismatched results: {num_of_mismatches}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,74 @@
+import sqlite3
+import os
+import threading
+from pathlib import Path
+import logging
+import config.config_reader as config
+
+
+# read-only connections to the iidx.me catalog DB, one per thread
+# the catalog is static while the bot is running, so connections are opened once and reused by every query.
+# when the DB file is replaced or modified (detected by its mtime), the generation number is increased and
+# each thread reopens its connection on next use
+_thread_local = threading.local()
+_generation_lock = threading.Lock()
+_generation = 0
+_db_file_mtime = None
+
+
+def get_connection() -> sqlite3.Connection:
+    generation = get_generation()
+
+    dbconn = getattr(_thread_local, 'dbconn', None)
+    if dbconn is None or _thread_local.generation != generation:
+        if dbconn is not None:
+            dbconn.close()
+        dbconn = _open_connection()
+        _thread_local.dbconn = dbconn
+        _thread_local.generation = generation
+
+    return dbconn
+
+
+def get_generation() -> int:
+    # return the current generation number of the catalog DB, which changes whenever the DB file is modified.
+    # caches built from the catalog DB can compare this number to decide whether to rebuild
+    global _generation, _db_file_mtime
+
+    try:
+        mtime = os.stat(_get_db_file()).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    if mtime != _db_file_mtime:
+        with _generation_lock:
+            if mtime != _db_file_mtime:
+                _db_file_mtime = mtime
+                _generation += 1
+
+    return _generation
+
+
+def _open_connection() -> sqlite3.Connection:
+    logger = logging.getLogger(__name__)
+
+    db_file = _get_db_file()
+
+    # open the catalog DB in read-only mode.
+    # immutable=1 skips file locking and change detection, which is only safe if the DB file is never modified while
+    # the bot is running. keep it off unless the catalog is only ever replaced with a new file while the bot is stopped
+    uri = f"{db_file.resolve().as_uri()}?mode=ro"
+    if config.get('BOT', 'iidxme_db_immutable'):
+        uri += "&immutable=1"
+
+    dbconn = sqlite3.connect(uri, uri=True, cached_statements=config.get('BOT', 'iidxme_db_cached_statements'))
+    dbconn.execute(f"PRAGMA mmap_size = {int(config.get('BOT', 'iidxme_db_mmap_size'))}")
+    dbconn.execute("PRAGMA query_only = ON")
+
+    logger.debug(f"Opened connection to {db_file} (thread {threading.get_ident()})")
+
+    return dbconn
+
+
+def _get_db_file() -> Path:
+    return Path(config.get('BOT', 'iidxme_db_file'))
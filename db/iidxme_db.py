@@ -1,26 +1,43 @@
 import sqlite3
-from pathlib import Path
+import re
+import threading
 from contextlib import closing
 import logging
 from db.models.Song import Song
 from db.models.Chart import Chart
+import db.iidxme_conn as iidxme_conn
+import db.iidxme_catalog_engine as iidxme_catalog_engine
+import db.iidxme_fts as iidxme_fts
+import db.iidxme_suggester as iidxme_suggester
+import db.iidxme_title_trie as iidxme_title_trie
+import db.migrations as migrations
 import config.config_reader as config
 import utils.string_util as string_util
+import utils.normalize_util as normalize_util
+from utils.lru_cache import LRUCache
 
 
-def get_kanji_by_char(char: str) -> str:
+# optional indexes available in the catalog DB, checked once per DB generation
+_catalog_features_state = {'generation': -1, 'features': {}}
+
+# LRU cache of search results, cleared whenever the catalog DB generation changes
+_search_cache_state = {'generation': -1, 'cache': None}
+_search_cache_lock = threading.Lock()
+
+
+def fetch_kanji_mapping() -> dict[str, str]:
+    # return the whole mapping table of traditional chinese characters to kanji, {zh_hk: jp, ...}
     logger = logging.getLogger(__name__)
 
     try:
-        with closing(sqlite3.connect(Path(config.get('BOT', 'iidxme_db_file')))) as dbconn:
-            with closing(dbconn.cursor()) as cursor:
-                row = cursor.execute(
-                            "SELECT jp FROM mapping_kanji WHERE zh_hk = ? ",
-                            (char, )
-                        ).fetchone()
-        
-        return row[0] if row else ""
-    
+        dbconn = iidxme_conn.get_connection()
+        with closing(dbconn.cursor()) as cursor:
+            rows = cursor.execute(
+                        "SELECT zh_hk, jp FROM mapping_kanji "
+                    ).fetchall()
+
+        return {zh_hk: jp for zh_hk, jp in rows}
+
     except sqlite3.DatabaseError as e:
         logger.error(repr(e))
         raise
@@ -29,24 +46,74 @@ def get_kanji_by_char(char: str) -> str:
         raise
 
 
-def get_num_of_matched_songs(mode: str, difficulty: str, level: str, keywords: str, flag_exact_match: bool) -> int:
+def search_charts(mode: str, difficulty: str, level: str, keywords: str, flag_exact_match: bool, result_limit: int) -> tuple[int, list[Song]]:
+    # return (1) the number of matched songs and (2) the first N matched songs with their matched charts
+    # results are served from the search cache if the same search was done since the catalog DB last changed
+    logger = logging.getLogger(__name__)
+
+    search_cache = _get_search_cache()
+    cache_key = (mode.upper(), difficulty.upper(), str(level).upper(), keywords.strip(), bool(flag_exact_match), int(result_limit))
+
+    result = search_cache.get(cache_key)
+    if result is None:
+        num_of_songs, song_list = _get_search_func()(*cache_key)
+        # store the song list as a tuple. Song and Chart are frozen, so the cached result cannot be modified by callers
+        result = (num_of_songs, tuple(song_list))
+        search_cache.put(cache_key, result)
+        logger.debug(f"search cache stats: {search_cache.get_stats()}")
+
+    return result[0], list(result[1])
+
+
+def preload() -> None:
+    # open the catalog DB connection of the calling thread, build the suggestion index and the title trie,
+    # and load the catalog into memory if the in-memory engine is used
+    iidxme_conn.get_connection()
+    iidxme_suggester.get_index()
+    iidxme_title_trie.get_trie()
+    if _get_search_func() is _search_charts_in_memory:
+        iidxme_catalog_engine.get_catalog()
+
+
+def _get_search_func():
+    # search engine defined in config file: "sqlite" (default) or "memory" (see db/iidxme_catalog_engine)
+    if str(config.get('BOT', 'iidxme_search_engine')).lower() == "memory":
+        return _search_charts_in_memory
+    return _search_charts_in_db
+
+
+def _get_search_cache() -> LRUCache:
+    # discard all cached results when the catalog DB file has changed
+    generation = iidxme_conn.get_generation()
+    if _search_cache_state['generation'] != generation:
+        with _search_cache_lock:
+            if _search_cache_state['generation'] != generation:
+                if _search_cache_state['cache'] is None:
+                    _search_cache_state['cache'] = LRUCache(int(config.get('BOT', 'iidxme_search_cache_size')))
+                else:
+                    _search_cache_state['cache'].clear()
+                _search_cache_state['generation'] = generation
+
+    return _search_cache_state['cache']
+
+
+def _search_charts_in_db(mode: str, difficulty: str, level: str, keywords: str, flag_exact_match: bool, result_limit: int) -> tuple[int, list[Song]]:
     logger = logging.getLogger(__name__)
 
+    rows = []
+
     try:
-        pstmt_dict = _get_chart_conditions_pstmt(mode, difficulty, level, keywords, flag_exact_match)
-
-        with closing(sqlite3.connect(Path(config.get('BOT', 'iidxme_db_file')))) as dbconn:
-            with closing(dbconn.cursor()) as cursor:
-                # count and return the number of matched songs in DB
-                rows = cursor.execute(
-                            " SELECT DISTINCT s.song_id " +
-                            " FROM iidxme_song s, iidxme_chart c " +
-                            f"WHERE s.song_id = c.song_id AND {pstmt_dict['conditions']} ",
-                            pstmt_dict['values']
-                        ).fetchall()
-        
-        return len(rows)
-    
+        dbconn = iidxme_conn.get_connection()
+        catalog_features = _get_catalog_features(dbconn)
+        pstmt_dict = _get_chart_conditions_pstmt(mode, difficulty, level, keywords, flag_exact_match, catalog_features['fts'])
+
+        with closing(dbconn.cursor()) as cursor:
+            rows = cursor.execute(*_get_search_charts_query(pstmt_dict, result_limit)).fetchall()
+
+        num_of_songs = rows[0][0] if rows else 0
+
+        return num_of_songs, _build_song_chart_list([row[1:] for row in rows])
+
     except sqlite3.DatabaseError as e:
         logger.error(repr(e))
         raise Exception(config.get('IIDX', 'msg_db_error'))
@@ -55,49 +122,63 @@ def get_num_of_matched_songs(mode: str, difficulty: str, level: str, keywords: s
         raise Exception(config.get('IIDX', 'msg_generic_error'))
 
 
-def fetch_charts(mode: str, difficulty: str, level: str, keywords: str, flag_exact_match: bool, result_limit: int) -> list[Song]:
-    logger = logging.getLogger(__name__)
+def _get_search_charts_query(pstmt_dict: dict, result_limit: int) -> tuple[str, list]:
+    # return the SQL and the parameter values of the chart search
+    # the song title criteria are evaluated once in the CTE "matched_song", which
+    # (1) takes the songs matching the keywords, keeping songs which have any chart matching the chart criteria.
+    #     with the trigram index, the songs are looked up by the song_id of the index hits, instead of scanning all songs
+    # (2) counts the matched songs with a window function over the same order, which is evaluated before LIMIT
+    # (3) limits the result set to the number of songs specified in config file
+    # sort the result by (1) length of song title, (2) song title (3) chart difficulty
+    '''
+    sample:
+        WITH matched_song AS (
+            SELECT s.song_id, s.title, s.title_length,
+                   COUNT(*) OVER (ORDER BY s.title_length, s.title, s.song_id
+                                  ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS num_of_songs
+            FROM iidxme_song s
+            WHERE EXISTS (SELECT 1 FROM iidxme_chart c WHERE c.song_id = s.song_id AND c.mode = 'SP')
+                AND s.search_key LIKE '%mirror%'
+            ORDER BY s.title_length, s.title, s.song_id
+            LIMIT 5
+        )
+        SELECT ms.num_of_songs, ms.song_id, ms.title, c.chart_id, c.mode, c.difficulty, c.level, c.notes
+        FROM matched_song ms CROSS JOIN iidxme_chart c
+        WHERE c.song_id = ms.song_id AND c.mode = 'SP'
+        ORDER BY ms.title_length, ms.title, ms.song_id, c.difficulty_order;
+
+    sample of the songs matching the keywords with the trigram index, in place of "FROM iidxme_song s" and the title criteria:
+            FROM (SELECT song_id FROM iidxme_song_fts WHERE title_full LIKE '%mirror%'
+                  UNION SELECT song_id FROM iidxme_song_fts WHERE title_romaji LIKE '%mirror%' ...) fts_hit
+                CROSS JOIN iidxme_song s
+            WHERE EXISTS (...) AND s.song_id = fts_hit.song_id
+    '''
+    return (
+        " WITH matched_song AS ( " +
+            "SELECT s.song_id, s.title, s.title_length, " +
+            "       COUNT(*) OVER (ORDER BY s.title_length, s.title, s.song_id " +
+            "                      ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS num_of_songs " +
+            f" FROM {pstmt_dict['song_source']} " +
+            f"WHERE EXISTS (SELECT 1 FROM iidxme_chart c WHERE c.song_id = s.song_id AND {pstmt_dict['chart_conditions']}) " +
+            f"    AND {pstmt_dict['song_conditions']} " +
+            "ORDER BY s.title_length, s.title, s.song_id " +
+            " LIMIT ? " +
+        " ) " +
+        " SELECT ms.num_of_songs, ms.song_id, ms.title, c.chart_id, c.mode, c.difficulty, c.level, c.notes " +
+        " FROM matched_song ms CROSS JOIN iidxme_chart c " +
+        f"WHERE c.song_id = ms.song_id AND {pstmt_dict['chart_conditions']} " +
+        "ORDER BY ms.title_length, ms.title, ms.song_id, c.difficulty_order ",
+        pstmt_dict['song_source_values'] + pstmt_dict['chart_values'] + pstmt_dict['song_values'] + [result_limit] +
+        pstmt_dict['chart_values']
+    )
 
-    rows = []
+
+def _search_charts_in_memory(mode: str, difficulty: str, level: str, keywords: str, flag_exact_match: bool, result_limit: int) -> tuple[int, list[Song]]:
+    logger = logging.getLogger(__name__)
 
     try:
-        pstmt_dict = _get_chart_conditions_pstmt(mode, difficulty, level, keywords, flag_exact_match)
-
-        with closing(sqlite3.connect(Path(config.get('BOT', 'iidxme_db_file')))) as dbconn:
-            with closing(dbconn.cursor()) as cursor:
-                # limit the result set to the number of songs specified in config file
-                # sort the result by (1) length of song title, (2) song title (3) chart difficulty 
-                '''
-                sample:
-                    SELECT s.song_id, s.title, c.chart_id, c.mode, c.difficulty, c.level, c.notes
-                    FROM iidxme_song s, iidxme_chart c,
-                    (
-                        SELECT DISTINCT s.song_id
-                        FROM iidxme_song s, iidxme_chart c
-                        WHERE s.song_id = c.song_id AND mode = 'SP'
-                        ORDER BY LENGTH(s.title)
-                        LIMIT 5
-                    ) resid
-                    WHERE s.song_id = c.song_id AND s.song_id = resid.song_id AND mode = 'SP'
-                    ORDER BY LENGTH(s.title), s.title, CASE c.difficulty WHEN 'B' THEN 0 WHEN 'N' THEN 1 WHEN 'H' THEN 2 WHEN 'A' THEN 3 WHEN 'L' THEN 4 END;
-                '''
-                rows = cursor.execute(
-                            " SELECT s.song_id, s.title, c.chart_id, c.mode, c.difficulty, c.level, c.notes " +
-                            " FROM iidxme_song s, iidxme_chart c, " +
-                            " ( " +
-                                " SELECT DISTINCT s.song_id " +
-                                " FROM iidxme_song s, iidxme_chart c " +
-                                f"WHERE s.song_id = c.song_id AND {pstmt_dict['conditions']} " +
-                                " ORDER BY LENGTH(s.title) " +
-                                f"LIMIT {result_limit} " +
-                            " ) resid " +
-                            f"WHERE s.song_id = c.song_id AND s.song_id = resid.song_id AND {pstmt_dict['conditions']} " + 
-                            " ORDER BY LENGTH(s.title), s.title, CASE c.difficulty WHEN 'B' THEN 0 WHEN 'N' THEN 1 WHEN 'H' THEN 2 WHEN 'A' THEN 3 WHEN 'L' THEN 4 END ",
-                            pstmt_dict['values'] + pstmt_dict['values']
-                        ).fetchall()
-                
-        return _build_song_chart_list(rows)
-    
+        return iidxme_catalog_engine.search_charts(mode, difficulty, level, keywords, flag_exact_match, result_limit)
+
     except sqlite3.DatabaseError as e:
         logger.error(repr(e))
         raise Exception(config.get('IIDX', 'msg_db_error'))
@@ -106,38 +187,81 @@ def fetch_charts(mode: str, difficulty: str, level: str, keywords: str, flag_exa
         raise Exception(config.get('IIDX', 'msg_generic_error'))
 
 
-def _get_chart_conditions_pstmt(mode: str, difficulty: str, level: str, keywords: str, exact_match: bool) -> dict:
+def _get_catalog_features(dbconn: sqlite3.Connection) -> dict:
+    # check which optional indexes exist in the catalog DB, once per DB generation.
+    # searches compare the normalized keywords with the precomputed search keys and sort keys,
+    # so the catalog DB must have been migrated to the search keys version (done by migrations.migrate_all on startup)
+    generation = iidxme_conn.get_generation()
+    if _catalog_features_state['generation'] != generation:
+        schema_version = migrations.get_schema_version(dbconn)
+        if schema_version < migrations.IIDXME_SEARCH_KEYS_VERSION:
+            raise sqlite3.DatabaseError(f"Catalog DB schema version {schema_version} is older than "
+                                        f"{migrations.IIDXME_SEARCH_KEYS_VERSION}, run python -m db.migrations")
+        _catalog_features_state['features'] = {
+            'fts': iidxme_fts.has_song_fts(dbconn)
+        }
+        _catalog_features_state['generation'] = generation
+
+    return _catalog_features_state['features']
+
+
+def _get_chart_conditions_pstmt(mode: str, difficulty: str, level: str, keywords: str, exact_match: bool,
+                                use_fts: bool = False) -> dict:
+    # chart conditions apply to iidxme_chart (alias c), song conditions apply to iidxme_song (alias s),
+    # which is selected from the song source
+    # keywords are normalized by iidx_util (see utils/normalize_util), and compared with the normalized search keys
+    # of the catalog DB directly without any function call per row
+
     # mode
-    pstmt_conditions = " mode = ? "
-    pstmt_values = [mode]
+    chart_conditions = " c.mode = ? "
+    chart_values = [mode]
 
     # difficulty
     if difficulty != "ALL":
-        pstmt_conditions += " AND difficulty = ? "
-        pstmt_values.append(difficulty)
+        chart_conditions += " AND c.difficulty = ? "
+        chart_values.append(difficulty)
 
     # level
     if level != "ALL":
-        pstmt_conditions += " AND level = ? "
-        pstmt_values.append(level)
+        chart_conditions += " AND c.level = ? "
+        chart_values.append(level)
 
     # song title keywords
+    song_source = " iidxme_song s "
+    song_source_values = []
     if exact_match:
-        pstmt_conditions += " AND ( "
-        pstmt_conditions += "  lower(title) = ? "
-        pstmt_conditions += "  OR lower(title) = ? "
-        pstmt_conditions += " ) "
-        pstmt_values.extend([keywords.lower(), string_util.convert_chi_to_kanji(keywords.lower())])
+        song_conditions = " s.title_key IN (?, ?) "
+        song_values = [keywords, normalize_util.normalize_search_key(string_util.convert_chi_to_kanji(keywords))]
+    elif use_fts and _has_trigram(keywords):
+        # match the keywords with the trigram index. each LIKE is a separate subquery so that all of them use the index,
+        # and the matched songs are looked up by primary key (CROSS JOIN keeps the index hits as the outer loop)
+        fts_select = f" SELECT song_id FROM {iidxme_fts.FTS_TABLE} WHERE "
+        song_source = " ( "
+        song_source += fts_select + "title_full LIKE ? UNION " + fts_select + "title_full LIKE ? "
+        song_source += "  UNION " + fts_select + "title_romaji LIKE ? UNION " + fts_select + "title_romaji LIKE ? "
+        song_source += "  UNION " + fts_select + "title_romaji LIKE ? UNION " + fts_select + "title_romaji LIKE ? "
+        song_source += " ) fts_hit CROSS JOIN iidxme_song s "
+        song_source_values = ['%'+keywords+'%', '%'+normalize_util.normalize_search_key(string_util.convert_chi_to_kanji(keywords))+'%',
+                              keywords, keywords+' %', '% '+keywords, '% '+keywords+' %']
+        song_conditions = " s.song_id = fts_hit.song_id "
+        song_values = []
     else:
-        pstmt_conditions += " AND ( "
-        pstmt_conditions += "  title || ' ' || IFNULL(title_alias, '') LIKE ? "
-        pstmt_conditions += "  OR title || ' ' || IFNULL(title_alias, '') LIKE ? "
-        pstmt_conditions += "  OR lower(title_romaji) = ? OR lower(title_romaji) LIKE ? OR lower(title_romaji) LIKE ? OR lower(title_romaji) LIKE ? "
-        pstmt_conditions += " ) "
-        pstmt_values.extend(['%'+keywords+'%', '%'+string_util.convert_chi_to_kanji(keywords).replace("\％", "％")+'%',
-                            keywords, keywords+' %', '% '+keywords, '% '+keywords+' %'])
-    
-    return {'conditions': pstmt_conditions, 'values': pstmt_values}
+        song_conditions = " ( "
+        song_conditions += "  s.search_key LIKE ? "
+        song_conditions += "  OR s.search_key LIKE ? "
+        song_conditions += "  OR s.romaji_key = ? OR s.romaji_key LIKE ? OR s.romaji_key LIKE ? OR s.romaji_key LIKE ? "
+        song_conditions += " ) "
+        song_values = ['%'+keywords+'%', '%'+normalize_util.normalize_search_key(string_util.convert_chi_to_kanji(keywords))+'%',
+                       keywords, keywords+' %', '% '+keywords, '% '+keywords+' %']
+
+    return {'chart_conditions': chart_conditions, 'chart_values': chart_values,
+            'song_source': song_source, 'song_source_values': song_source_values,
+            'song_conditions': song_conditions, 'song_values': song_values}
+
+
+def _has_trigram(keywords: str) -> bool:
+    # the trigram index only works for LIKE patterns containing at least 3 consecutive non-wildcard characters
+    return any(len(segment) >= 3 for segment in re.split("[%_]", keywords))
 
 
 def _build_song_chart_list(db_chart_list: list[str, str, str, str, str, int, int]) -> list[Song]:
@@ -161,20 +285,30 @@ def _build_song_chart_list(db_chart_list: list[str, str, str, str, str, int, int
         if (song_id != last_song_id):
             # add the Song dataclass instance storing details of previous song to the result list
             if last_song_id != "":
-                song_chart_list.append(song_chart)
-                logger.debug(song_chart)
-            
-            # create a new Song dataclass instance for the current song
-            song_chart = Song(song_id=song_id, title=title, charts=[])
+                song_chart_list.append(_build_song(last_song_id, last_title, chart_list))
+
+            # start collecting the charts of the current song
+            chart_list = []
 
-        # add the details of current chart in Song dataclass instance
-        song_chart.charts.append(Chart(chart_id=chart_id, difficulty=difficulty, level=level, notes=notes))
+        # add the details of current chart to the chart list of the song
+        chart_list.append(Chart(chart_id=chart_id, difficulty=difficulty, level=level, notes=notes))
 
-        # update last_song_id before proceed to next chart
+        # update last_song_id and last_title before proceed to next chart
         last_song_id = song_id
+        last_title = title
 
     # add the Song dataclass instance storing details of the last song to the result list
-    song_chart_list.append(song_chart)
-    logger.debug(song_chart)
+    if last_song_id != "":
+        song_chart_list.append(_build_song(last_song_id, last_title, chart_list))
+
+    return song_chart_list
+
+
+def _build_song(song_id: str, title: str, chart_list: list[Chart]) -> Song:
+    logger = logging.getLogger(__name__)
+
+    # Song and Chart are immutable so that they can be shared by cached search results
+    song = Song(song_id=song_id, title=title, charts=tuple(chart_list))
+    logger.debug(song)
 
-    return song_chart_list
\ No newline at end of file
+    return song
@@ -0,0 +1,106 @@
+import sqlite3
+import sys
+from pathlib import Path
+from contextlib import closing
+import logging
+import config.config_reader as config
+
+
+'''
+    FTS5 full-text index over song titles in the iidx.me catalog DB
+
+    iidxme_song_fts
+        song_id         = iidxme_song.song_id (not indexed, used to join with iidxme_song)
+        title_full      = search_key (normalized title + ' ' + title_alias)
+        title_romaji    = romaji_key (normalized title_romaji)
+    before the search key columns are added to the catalog DB (schema version 4), the raw titles are indexed instead.
+
+    the trigram tokenizer lets FTS5 serve LIKE '%keyword%' queries from the index instead of scanning every song.
+    the index is kept in sync with iidxme_song by triggers, so any later insert/update/delete of songs is reflected.
+    rows are linked by song_id rather than rowid, as the implicit rowids of iidxme_song may be renumbered by VACUUM.
+    chinese keywords are converted to kanji at query time (string_util.convert_chi_to_kanji),
+    so the converted keyword is matched against title_full as well.
+'''
+
+FTS_TABLE = "iidxme_song_fts"
+
+
+def create_song_fts(dbconn: sqlite3.Connection) -> None:
+    # create the index, or recreate it with its triggers if the source columns have changed
+    logger = logging.getLogger(__name__)
+
+    title_full, title_romaji, source_columns = _get_source_columns(dbconn)
+
+    with closing(dbconn.cursor()) as cursor:
+        # one statement at a time, so that the index is created in the transaction of the caller (e.g. a migration)
+        for statement in (
+            f"DROP TABLE IF EXISTS {FTS_TABLE}",
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(song_id UNINDEXED, title_full, title_romaji, tokenize = 'trigram')",
+
+            f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON iidxme_song BEGIN " +
+            f"  INSERT INTO {FTS_TABLE} (song_id, title_full, title_romaji) " +
+            f"  VALUES (new.song_id, {title_full.format('new.')}, {title_romaji.format('new.')}); " +
+            " END",
+
+            f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON iidxme_song BEGIN " +
+            f"  DELETE FROM {FTS_TABLE} WHERE song_id = old.song_id; " +
+            " END",
+
+            f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF song_id, {source_columns} ON iidxme_song BEGIN " +
+            f"  UPDATE {FTS_TABLE} SET song_id = new.song_id, " +
+            f"                       title_full = {title_full.format('new.')}, " +
+            f"                       title_romaji = {title_romaji.format('new.')} " +
+            "   WHERE song_id = old.song_id; " +
+            " END"
+        ):
+            cursor.execute(statement)
+
+    rebuild_song_fts(dbconn)
+    logger.info(f"Created {FTS_TABLE} on {source_columns}")
+
+
+def rebuild_song_fts(dbconn: sqlite3.Connection) -> None:
+    # repopulate the index from iidxme_song, e.g. after a bulk import with triggers bypassed. the caller commits the changes
+    title_full, title_romaji, _ = _get_source_columns(dbconn)
+
+    with closing(dbconn.cursor()) as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (song_id, title_full, title_romaji) " +
+            f"SELECT song_id, {title_full.format('')}, {title_romaji.format('')} FROM iidxme_song "
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+def has_song_fts(dbconn: sqlite3.Connection) -> bool:
+    # the index built before schema version 5 is linked by rowid, and is not used until it is recreated
+    with closing(dbconn.cursor()) as cursor:
+        column_list = [row[1] for row in cursor.execute(f"PRAGMA table_info({FTS_TABLE})").fetchall()]
+
+    return 'song_id' in column_list
+
+
+def _get_source_columns(dbconn: sqlite3.Connection) -> tuple[str, str, str]:
+    # return the expressions of title_full and title_romaji (with {0} as the placeholder of the row prefix, e.g. "new."),
+    # and the columns of iidxme_song they depend on
+    with closing(dbconn.cursor()) as cursor:
+        column_list = [row[1] for row in cursor.execute("PRAGMA table_info(iidxme_song)").fetchall()]
+
+    if 'search_key' in column_list:
+        return "IFNULL({0}search_key, '')", "IFNULL({0}romaji_key, '')", "search_key, romaji_key"
+    else:
+        return "{0}title || ' ' || IFNULL({0}title_alias, '')", "IFNULL({0}title_romaji, '')", "title, title_alias, title_romaji"
+
+
+if __name__ == '__main__':
+    # build the index on the catalog DB file defined in config file:
+    #   python -m db.iidxme_fts
+    logging.basicConfig(level=logging.INFO)
+
+    db_file = Path(sys.argv[1] if len(sys.argv) > 1 else config.get('BOT', 'iidxme_db_file'))
+    with closing(sqlite3.connect(db_file)) as dbconn:
+        create_song_fts(dbconn)
+        dbconn.commit()
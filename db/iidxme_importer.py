@@ -0,0 +1,208 @@
+import sqlite3
+import os
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+from contextlib import closing
+from typing import Iterator
+import logging
+import db.iidxme_fts as iidxme_fts
+import db.migrations as migrations
+import config.config_reader as config
+
+
+'''
+    bulk importer of songs and charts into the iidx.me catalog DB
+
+    usage:
+        python -m db.iidxme_importer <dump file> [--db <catalog DB file>] [--prune]
+
+    the dump file contains one record per chart, in either of below formats:
+        a) CSV with header row
+        b) JSON lines (.jsonl / .ndjson), one JSON object per line
+        c) JSON (.json), an array of JSON objects
+    CSV and JSON lines dumps are streamed record by record. a JSON dump is loaded into memory as a whole,
+    so large dumps should be in either of the other formats
+    fields of each record:
+        song_id, title, title_alias, title_romaji, chart_id, mode, difficulty, level, notes
+    level/notes can be empty if unknown, which are stored as -1
+
+    only new or changed songs/charts are written. with --prune, songs/charts not in the dump are deleted
+
+    the import is built into a copy of the catalog DB (<catalog DB file>.importing), which then replaces the catalog DB
+    file in one step (os.replace). the bot keeps reading the old file until it sees the new file, and never sees
+    a catalog with songs changed but search keys or FTS index not yet updated
+'''
+
+SONG_FIELDS = ('title', 'title_alias', 'title_romaji')
+
+
+def import_catalog(dump_file: Path, db_file: Path, prune: bool = False) -> dict:
+    logger = logging.getLogger(__name__)
+
+    start_time = time.perf_counter()
+
+    # 1) copy the catalog DB into a temp file in the same directory, so that it can replace the catalog DB atomically
+    temp_db_file = db_file.with_name(db_file.name + ".importing")
+    temp_db_file.unlink(missing_ok=True)
+    if db_file.exists():
+        with closing(sqlite3.connect(db_file)) as src_dbconn, closing(sqlite3.connect(temp_db_file)) as dst_dbconn:
+            src_dbconn.backup(dst_dbconn)
+
+    try:
+        with closing(sqlite3.connect(temp_db_file)) as dbconn:
+            # the temp file is discarded if the import fails, so it is not synced to disk until the import completes
+            dbconn.execute("PRAGMA journal_mode = MEMORY")
+            dbconn.execute("PRAGMA synchronous = OFF")
+            # create the tables and indexes if the catalog DB is new or not migrated yet
+            schema_version = migrations.get_schema_version(dbconn)
+            num_of_migrations = migrations.migrate_db(dbconn, 'iidxme') - schema_version
+
+            # 2) load the current catalog to find out which songs/charts have changed
+            db_song_dict = {row[0]: tuple(row[1:]) for row in dbconn.execute(
+                                "SELECT song_id, title, title_alias, title_romaji FROM iidxme_song")}
+            db_chart_dict = {row[0]: tuple(row[1:]) for row in dbconn.execute(
+                                "SELECT chart_id, song_id, mode, difficulty, level, notes FROM iidxme_chart")}
+
+            # 3) read the dump file record by record (see _read_dump_file) and diff against the current catalog
+            dump_song_id_set = set()
+            dump_chart_id_set = set()
+            song_insert_list, song_update_list = [], []
+            chart_insert_list, chart_update_list = [], []
+
+            for record in _read_dump_file(dump_file):
+                song_id, song_values, chart_id, chart_values = _parse_record(record)
+
+                if song_id not in dump_song_id_set:
+                    dump_song_id_set.add(song_id)
+                    if song_id not in db_song_dict:
+                        song_insert_list.append((song_id, ) + song_values)
+                    elif db_song_dict[song_id] != song_values:
+                        song_update_list.append(song_values + (song_id, ))
+
+                if chart_id not in dump_chart_id_set:
+                    dump_chart_id_set.add(chart_id)
+                    if chart_id not in db_chart_dict:
+                        chart_insert_list.append((chart_id, ) + chart_values)
+                    elif db_chart_dict[chart_id] != chart_values:
+                        chart_update_list.append(chart_values + (chart_id, ))
+
+            song_delete_list = [(song_id, ) for song_id in db_song_dict.keys() - dump_song_id_set] if prune else []
+            chart_delete_list = [(chart_id, ) for chart_id in db_chart_dict.keys() - dump_chart_id_set] if prune else []
+
+            num_of_changes = len(song_insert_list) + len(song_update_list) + len(song_delete_list) \
+                            + len(chart_insert_list) + len(chart_update_list) + len(chart_delete_list)
+
+            # 4) write all changes, the normalized search keys of new/changed songs and the rebuilt FTS index
+            # in a single transaction
+            if num_of_changes > 0:
+                with dbconn:
+                    dbconn.executemany(
+                        "INSERT INTO iidxme_song (song_id, title, title_alias, title_romaji) VALUES (?, ?, ?, ?)",
+                        song_insert_list)
+                    dbconn.executemany(
+                        "UPDATE iidxme_song SET title = ?, title_alias = ?, title_romaji = ? WHERE song_id = ?",
+                        song_update_list)
+                    dbconn.executemany(
+                        "INSERT INTO iidxme_chart (chart_id, song_id, mode, difficulty, level, notes) VALUES (?, ?, ?, ?, ?, ?)",
+                        chart_insert_list)
+                    dbconn.executemany(
+                        "UPDATE iidxme_chart SET song_id = ?, mode = ?, difficulty = ?, level = ?, notes = ? WHERE chart_id = ?",
+                        chart_update_list)
+                    dbconn.executemany("DELETE FROM iidxme_chart WHERE chart_id = ?", chart_delete_list)
+                    dbconn.executemany("DELETE FROM iidxme_song WHERE song_id = ?", song_delete_list)
+
+                    if song_insert_list or song_update_list:
+                        migrations.refresh_search_keys(dbconn, [row[0] for row in song_insert_list] + [row[-1] for row in song_update_list])
+
+                    if iidxme_fts.has_song_fts(dbconn):
+                        iidxme_fts.rebuild_song_fts(dbconn)
+
+                # refresh the statistics for the query planner
+                dbconn.execute("ANALYZE")
+                dbconn.commit()
+
+        # 5) replace the catalog DB with the temp file if anything has changed
+        if num_of_changes > 0 or num_of_migrations > 0:
+            with open(temp_db_file, 'rb+') as file:
+                os.fsync(file.fileno())
+            os.replace(temp_db_file, db_file)
+        else:
+            temp_db_file.unlink()
+
+    except BaseException:
+        temp_db_file.unlink(missing_ok=True)
+        raise
+
+    result = {
+        'songs_inserted': len(song_insert_list),
+        'songs_updated': len(song_update_list),
+        'songs_deleted': len(song_delete_list),
+        'charts_inserted': len(chart_insert_list),
+        'charts_updated': len(chart_update_list),
+        'charts_deleted': len(chart_delete_list),
+        'elapsed_sec': round(time.perf_counter() - start_time, 3)
+    }
+    logger.info(f"Imported {dump_file} into {db_file}: {result}")
+
+    return result
+
+
+def _read_dump_file(dump_file: Path) -> Iterator[dict]:
+    suffix = dump_file.suffix.lower()
+
+    with open(dump_file, 'r', encoding='utf8', newline='') as file:
+        if suffix == '.csv':
+            yield from csv.DictReader(file)
+        elif suffix in ('.jsonl', '.ndjson'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        elif suffix == '.json':
+            # not streamed: the whole array is parsed at once
+            yield from json.load(file)
+        else:
+            raise ValueError(f"Unsupported dump file format: {dump_file}")
+
+
+def _parse_record(record: dict) -> tuple[str, tuple, str, tuple]:
+    song_id = str(record['song_id']).strip()
+    chart_id = str(record['chart_id']).strip()
+
+    song_values = tuple(_to_optional_str(record.get(field)) for field in SONG_FIELDS)
+    # title is required (iidxme_song.title NOT NULL)
+    if song_values[0] is None:
+        raise ValueError(f"Missing title of song {song_id} (chart {chart_id})")
+    chart_values = (song_id,
+                    str(record['mode']).strip().upper(),
+                    str(record['difficulty']).strip().upper(),
+                    _to_int(record.get('level')),
+                    _to_int(record.get('notes')))
+
+    return song_id, song_values, chart_id, chart_values
+
+
+def _to_optional_str(value) -> str | None:
+    if value is None or str(value).strip() == "":
+        return None
+    return str(value).strip()
+
+
+def _to_int(value) -> int:
+    if value is None or str(value).strip() == "":
+        return -1
+    return int(value)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Import songs and charts into the iidx.me catalog DB")
+    parser.add_argument('dump_file', type=Path)
+    parser.add_argument('--db', type=Path, default=None, help="catalog DB file (default: iidxme_db_file in config file)")
+    parser.add_argument('--prune', action='store_true', help="delete songs/charts which are not in the dump file")
+    args = parser.parse_args()
+
+    import_catalog(args.dump_file, args.db or Path(config.get('BOT', 'iidxme_db_file')), args.prune)
@@ -0,0 +1,142 @@
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import closing
+import logging
+import db.iidxme_conn as iidxme_conn
+import utils.string_util as string_util
+import utils.normalize_util as normalize_util
+
+
+'''
+    "did you mean" suggestions of song titles, for searches which match no song
+
+    a trigram index over the normalized titles, aliases and romaji of all songs is built once per catalog DB generation.
+    on a miss,
+        1) songs sharing the most trigrams with the keywords are picked as candidates from the index
+        2) candidates are ranked by edit distance between the keywords and the closest part of the title/alias/romaji
+'''
+
+# number of candidates picked from the trigram index to be ranked by edit distance
+NUM_OF_CANDIDATES = 30
+
+
+class _SuggestionIndex:
+    __slots__ = ('generation', 'titles', 'entry_keys', 'entry_song_idx', 'trigram_dict')
+
+    def __init__(self, generation: int):
+        self.generation = generation
+
+
+_index_state = {'index': None}
+_index_lock = threading.Lock()
+
+
+def suggest_titles(keywords: str, num_of_suggestions: int) -> list[str]:
+    # return the titles of the songs closest to the keywords (as constructed by iidxme_util), closest first
+    index = get_index()
+
+    # 1) turn the LIKE pattern of the keywords back to plain words
+    query_list = [_to_plain_words(keywords)]
+    converted_query = normalize_util.normalize_search_key(string_util.convert_chi_to_kanji(query_list[0]))
+    if converted_query != query_list[0]:
+        query_list.append(converted_query)
+    query_list = [query for query in query_list if query]
+    if not query_list:
+        return []
+
+    # 2) pick the entries sharing the most trigrams with the keywords
+    trigram_counter = Counter()
+    for query in query_list:
+        for trigram in _get_trigrams(query):
+            trigram_counter.update(index.trigram_dict.get(trigram, ()))
+
+    # 3) rank the candidates by edit distance, then by number of shared trigrams, keeping the closest entry of each song
+    song_score_dict = {}
+    for entry_idx, num_of_shared in trigram_counter.most_common(NUM_OF_CANDIDATES):
+        distance = min(_get_substring_distance(query, index.entry_keys[entry_idx]) for query in query_list)
+        song_idx = index.entry_song_idx[entry_idx]
+        score = (distance, -num_of_shared, len(index.titles[song_idx]))
+        if song_idx not in song_score_dict or score < song_score_dict[song_idx]:
+            song_score_dict[song_idx] = score
+
+    # suggestions too far from the keywords are not helpful
+    max_distance = max(1, min(len(query) for query in query_list) // 2)
+    ranked_song_idx_list = sorted((song_idx for song_idx, score in song_score_dict.items() if score[0] <= max_distance),
+                                  key=lambda song_idx: song_score_dict[song_idx])
+
+    return [index.titles[song_idx] for song_idx in ranked_song_idx_list[:num_of_suggestions]]
+
+
+def get_index() -> _SuggestionIndex:
+    # return the built index, or build it again if the catalog DB file has changed
+    generation = iidxme_conn.get_generation()
+    index = _index_state['index']
+    if index is None or index.generation != generation:
+        with _index_lock:
+            index = _index_state['index']
+            if index is None or index.generation != generation:
+                index = _build_index(generation)
+                _index_state['index'] = index
+
+    return index
+
+
+def _build_index(generation: int) -> _SuggestionIndex:
+    logger = logging.getLogger(__name__)
+
+    start_time = time.perf_counter()
+
+    dbconn = iidxme_conn.get_connection()
+    with closing(dbconn.cursor()) as cursor:
+        song_rows = cursor.execute("SELECT title, title_alias, title_romaji FROM iidxme_song").fetchall()
+
+    index = _SuggestionIndex(generation)
+    index.titles = []
+    index.entry_keys = []
+    index.entry_song_idx = []
+    index.trigram_dict = {}
+
+    for song_idx, (title, title_alias, title_romaji) in enumerate(song_rows):
+        index.titles.append(sys.intern(title))
+        # one entry per distinct normalized title/alias/romaji of the song
+        for key in dict.fromkeys(normalize_util.normalize_search_key(value) for value in (title, title_alias, title_romaji)):
+            if not key:
+                continue
+            entry_idx = len(index.entry_keys)
+            index.entry_keys.append(key)
+            index.entry_song_idx.append(song_idx)
+            for trigram in _get_trigrams(key):
+                index.trigram_dict.setdefault(trigram, []).append(entry_idx)
+
+    logger.info(f"Built suggestion index of {len(index.entry_keys)} titles with {len(index.trigram_dict)} trigrams "
+                f"in {time.perf_counter() - start_time:.3f}s")
+
+    return index
+
+
+def _to_plain_words(keywords: str) -> str:
+    # wildcards (%) stand for whitespaces in the keywords, while \% is a literal %
+    return "%".join(part.replace("%", " ") for part in keywords.split("\\%")).strip()
+
+
+def _get_trigrams(string: str) -> set[str]:
+    # pad the string so that short keywords and the start/end of words also form trigrams
+    padded = f"  {string} "
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+
+def _get_substring_distance(query: str, target: str) -> int:
+    # edit distance between the query and the closest substring of the target,
+    # so that a partial title with a typo still matches the full title
+    previous_row = [0] * (len(target) + 1)
+    for i, query_char in enumerate(query, 1):
+        current_row = [i]
+        for j, target_char in enumerate(target, 1):
+            current_row.append(min(previous_row[j] + 1,
+                                   current_row[j-1] + 1,
+                                   previous_row[j-1] + (query_char != target_char)))
+        previous_row = current_row
+
+    return min(previous_row)
@@ -0,0 +1,149 @@
+import sys
+import time
+import threading
+from contextlib import closing
+import logging
+import db.iidxme_conn as iidxme_conn
+import utils.string_util as string_util
+import utils.normalize_util as normalize_util
+
+
+'''
+    prefix trie of song titles, for autocompletion of song title keywords in slash commands
+
+    the normalized title, alias and romaji of each song are inserted into the trie, each from the start of every word
+    (e.g. "infinity mirror" is inserted as "infinity mirror" and "mirror"), up to MAX_KEY_LENGTH characters.
+    each node keeps the first MAX_COMPLETIONS songs under it in the order of search results (length of title, title),
+    so a lookup only walks down the characters of the prefix.
+
+    chinese characters in the prefix are converted to kanji (string_util.convert_chi_to_kanji) and looked up as well.
+
+    the trie is built by get_trie(), when the catalog DB is preloaded and whenever the DB file has changed.
+    complete_titles() only reads the last built trie, so it never reads the DB or the file system
+'''
+
+# number of completions kept in each node, which is the maximum number of choices of Discord autocomplete
+MAX_COMPLETIONS = 25
+# characters of each key inserted into the trie, longer prefixes are matched on their first MAX_KEY_LENGTH characters
+MAX_KEY_LENGTH = 32
+
+
+class _TrieNode:
+    __slots__ = ('children', 'song_idx_list')
+
+    def __init__(self):
+        self.children = {}
+        self.song_idx_list = []
+
+
+class _TitleTrie:
+    __slots__ = ('generation', 'titles', 'root', 'num_of_nodes', 'kanji_table')
+
+    def __init__(self, generation: int):
+        self.generation = generation
+
+
+_trie_state = {'trie': None}
+_trie_lock = threading.Lock()
+
+
+def complete_titles(prefix: str, limit: int = MAX_COMPLETIONS) -> list[str]:
+    # return the titles of the songs with any word of title/alias/romaji starting with the prefix, in the order of search results
+    # the last built trie is used, no titles are returned before the trie is built by get_trie()
+    trie = _trie_state['trie']
+    if trie is None:
+        return []
+
+    prefix = normalize_util.normalize_search_key(prefix)[:MAX_KEY_LENGTH]
+    if not prefix:
+        return []
+
+    prefix_list = [prefix]
+    converted_prefix = normalize_util.normalize_search_key(prefix.translate(trie.kanji_table))[:MAX_KEY_LENGTH]
+    if converted_prefix != prefix:
+        prefix_list.append(converted_prefix)
+
+    song_idx_list = []
+    for prefix in prefix_list:
+        node = _find_node(trie.root, prefix)
+        if node is not None:
+            song_idx_list += node.song_idx_list
+
+    # merge the completions of both prefixes, which are song indexes in the order of search results
+    song_idx_list = sorted(set(song_idx_list)) if len(prefix_list) > 1 else song_idx_list
+
+    return [trie.titles[song_idx] for song_idx in song_idx_list[:limit]]
+
+
+def get_trie() -> _TitleTrie:
+    # return the built trie, or build it again if the catalog DB file has changed
+    generation = iidxme_conn.get_generation()
+    trie = _trie_state['trie']
+    if trie is None or trie.generation != generation:
+        with _trie_lock:
+            trie = _trie_state['trie']
+            if trie is None or trie.generation != generation:
+                trie = _build_trie(generation)
+                _trie_state['trie'] = trie
+
+    return trie
+
+
+def _build_trie(generation: int) -> _TitleTrie:
+    logger = logging.getLogger(__name__)
+
+    start_time = time.perf_counter()
+
+    dbconn = iidxme_conn.get_connection()
+    with closing(dbconn.cursor()) as cursor:
+        song_rows = cursor.execute("SELECT song_id, title, title_alias, title_romaji FROM iidxme_song").fetchall()
+
+    # insert the songs in the order of search results, so that the first songs kept in each node are the top completions
+    song_rows.sort(key=lambda row: (len(row[1]), row[1], row[0]))
+
+    trie = _TitleTrie(generation)
+    trie.titles = [sys.intern(row[1]) for row in song_rows]
+    trie.root = _TrieNode()
+    trie.num_of_nodes = 1
+    trie.kanji_table = string_util.get_kanji_table()
+
+    for song_idx, (_, title, title_alias, title_romaji) in enumerate(song_rows):
+        for key in {normalize_util.normalize_search_key(value) for value in (title, title_alias, title_romaji)}:
+            for word_start in _get_word_starts(key):
+                trie.num_of_nodes += _insert(trie.root, key[word_start:word_start+MAX_KEY_LENGTH], song_idx)
+
+    logger.info(f"Built title trie of {len(trie.titles)} songs with {trie.num_of_nodes} nodes "
+                f"in {time.perf_counter() - start_time:.3f}s")
+
+    return trie
+
+
+def _insert(root: _TrieNode, key: str, song_idx: int) -> int:
+    # add the song to every node along the key, and return the number of new nodes
+    num_of_new_nodes = 0
+    node = root
+    for char in key:
+        child = node.children.get(char)
+        if child is None:
+            child = node.children[char] = _TrieNode()
+            num_of_new_nodes += 1
+        node = child
+        # songs are inserted in the order of search results, so the song is either the last one kept or a new one
+        if len(node.song_idx_list) < MAX_COMPLETIONS and (not node.song_idx_list or node.song_idx_list[-1] != song_idx):
+            node.song_idx_list.append(song_idx)
+
+    return num_of_new_nodes
+
+
+def _find_node(root: _TrieNode, prefix: str) -> _TrieNode | None:
+    node = root
+    for char in prefix:
+        node = node.children.get(char)
+        if node is None:
+            return None
+
+    return node
+
+
+def _get_word_starts(key: str) -> list[int]:
+    return [0] + [i + 1 for i, char in enumerate(key) if char == ' ']
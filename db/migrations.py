@@ -0,0 +1,236 @@
+import sqlite3
+import sys
+from pathlib import Path
+from contextlib import closing
+import logging
+import db.iidxme_fts as iidxme_fts
+import config.config_reader as config
+import utils.normalize_util as normalize_util
+
+
+'''
+    versioned schema migrations of the SQLite DBs
+
+    the schema version of each DB is stored in PRAGMA user_version.
+    migrations newer than the current version are applied in order. each migration and its update of user_version
+    run in one transaction, so a migration interrupted halfway is rolled back and applied again on next run.
+    migrations execute one statement at a time (executescript would commit in the middle) and never commit by themselves.
+
+    usage:
+        python -m db.migrations             (migrate both DBs defined in config file)
+'''
+
+
+def _iidxme_v1_base_tables(dbconn: sqlite3.Connection) -> None:
+    _execute_statements(dbconn, [
+        "CREATE TABLE IF NOT EXISTS iidxme_song ( " +
+        "   song_id TEXT PRIMARY KEY, title TEXT NOT NULL, title_alias TEXT, title_romaji TEXT ) ",
+        "CREATE TABLE IF NOT EXISTS iidxme_chart ( " +
+        "   chart_id TEXT PRIMARY KEY, song_id TEXT NOT NULL, mode TEXT NOT NULL, difficulty TEXT NOT NULL, " +
+        "   level INTEGER, notes INTEGER ) ",
+        "CREATE TABLE IF NOT EXISTS mapping_kanji ( " +
+        "   zh_hk TEXT PRIMARY KEY, jp TEXT ) "
+    ])
+
+
+def _iidxme_v2_song_fts(dbconn: sqlite3.Connection) -> None:
+    iidxme_fts.create_song_fts(dbconn)
+
+
+def _iidxme_v3_sort_keys(dbconn: sqlite3.Connection) -> None:
+    # precompute the sort keys of search results, kept up to date by triggers
+    #   iidxme_song.title_length       = LENGTH(title)
+    #   iidxme_chart.difficulty_order  = B: 0, N: 1, H: 2, A: 3, L: 4
+    # and add covering indexes for the chart filters (mode/difficulty/level) and the sort order
+    difficulty_order = "CASE {0} WHEN 'B' THEN 0 WHEN 'N' THEN 1 WHEN 'H' THEN 2 WHEN 'A' THEN 3 WHEN 'L' THEN 4 END"
+
+    _execute_statements(dbconn, [
+        "ALTER TABLE iidxme_song ADD COLUMN title_length INTEGER",
+        "UPDATE iidxme_song SET title_length = LENGTH(title)",
+        "ALTER TABLE iidxme_chart ADD COLUMN difficulty_order INTEGER",
+        f"UPDATE iidxme_chart SET difficulty_order = {difficulty_order.format('difficulty')}",
+
+        "CREATE TRIGGER IF NOT EXISTS iidxme_song_title_length_ai AFTER INSERT ON iidxme_song BEGIN " +
+        "  UPDATE iidxme_song SET title_length = LENGTH(new.title) WHERE rowid = new.rowid; " +
+        " END ",
+        "CREATE TRIGGER IF NOT EXISTS iidxme_song_title_length_au AFTER UPDATE OF title ON iidxme_song BEGIN " +
+        "  UPDATE iidxme_song SET title_length = LENGTH(new.title) WHERE rowid = new.rowid; " +
+        " END ",
+        "CREATE TRIGGER IF NOT EXISTS iidxme_chart_difficulty_order_ai AFTER INSERT ON iidxme_chart BEGIN " +
+        f"  UPDATE iidxme_chart SET difficulty_order = {difficulty_order.format('new.difficulty')} WHERE rowid = new.rowid; " +
+        " END ",
+        "CREATE TRIGGER IF NOT EXISTS iidxme_chart_difficulty_order_au AFTER UPDATE OF difficulty ON iidxme_chart BEGIN " +
+        f"  UPDATE iidxme_chart SET difficulty_order = {difficulty_order.format('new.difficulty')} WHERE rowid = new.rowid; " +
+        " END ",
+
+        "CREATE INDEX IF NOT EXISTS idx_iidxme_chart_filter ON iidxme_chart (mode, difficulty, level, song_id)",
+        "CREATE INDEX IF NOT EXISTS idx_iidxme_chart_song " +
+        "   ON iidxme_chart (song_id, mode, difficulty_order, difficulty, level, chart_id, notes)",
+        "CREATE INDEX IF NOT EXISTS idx_iidxme_song_sort ON iidxme_song (title_length, title, song_id)"
+    ])
+
+
+def _iidxme_v4_search_keys(dbconn: sqlite3.Connection) -> None:
+    # store the normalized search keys of each song (see utils/normalize_util), and index the FTS5 table on them
+    #   title_key   = normalized title, for exact match
+    #   search_key  = normalized title + ' ' + title_alias
+    #   romaji_key  = normalized title_romaji
+    _execute_statements(dbconn, [
+        "ALTER TABLE iidxme_song ADD COLUMN title_key TEXT",
+        "ALTER TABLE iidxme_song ADD COLUMN search_key TEXT",
+        "ALTER TABLE iidxme_song ADD COLUMN romaji_key TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_iidxme_song_title_key ON iidxme_song (title_key)"
+    ])
+
+    iidxme_fts.create_song_fts(dbconn)
+    refresh_search_keys(dbconn)
+
+
+def _iidxme_v5_song_fts_by_song_id(dbconn: sqlite3.Connection) -> None:
+    # recreate the FTS5 index linked to iidxme_song by song_id instead of the implicit rowid
+    iidxme_fts.create_song_fts(dbconn)
+
+
+def refresh_search_keys(dbconn: sqlite3.Connection, song_id_list: list[str] | None = None) -> None:
+    # compute the search keys of the given songs (all songs if not specified) and store them in the catalog DB.
+    # the FTS5 index is updated by triggers. the caller commits the changes
+    with closing(dbconn.cursor()) as cursor:
+        if song_id_list is None:
+            song_rows = cursor.execute("SELECT song_id, title, title_alias, title_romaji FROM iidxme_song").fetchall()
+        else:
+            song_rows = []
+            for i in range(0, len(song_id_list), 500):
+                song_id_batch = song_id_list[i:i+500]
+                song_rows += cursor.execute(
+                                "SELECT song_id, title, title_alias, title_romaji FROM iidxme_song " +
+                                f"WHERE song_id IN ({', '.join('?' * len(song_id_batch))})",
+                                song_id_batch
+                            ).fetchall()
+
+        cursor.executemany(
+            "UPDATE iidxme_song SET title_key = ?, search_key = ?, romaji_key = ? WHERE song_id = ?",
+            [(normalize_util.normalize_search_key(title),
+              normalize_util.normalize_search_key(f"{title} {title_alias or ''}"),
+              normalize_util.normalize_search_key(title_romaji or ""),
+              song_id)
+             for song_id, title, title_alias, title_romaji in song_rows]
+        )
+
+
+def _bot_v1_bot_param(dbconn: sqlite3.Connection) -> None:
+    _execute_statements(dbconn, [
+        "CREATE TABLE IF NOT EXISTS bot_param (module TEXT NOT NULL, key TEXT NOT NULL, value TEXT)",
+        "CREATE INDEX IF NOT EXISTS idx_bot_param ON bot_param (module, key)",
+        "INSERT INTO bot_param (module, key, value) " +
+        "   SELECT 'on_message', 'iidx_result_comment_volume', '100' " +
+        "   WHERE NOT EXISTS (SELECT 1 FROM bot_param WHERE module = 'on_message' AND key = 'iidx_result_comment_volume')"
+    ])
+
+
+def _bot_v2_last_play_version(dbconn: sqlite3.Connection) -> None:
+    _execute_statements(dbconn, [
+        "CREATE TABLE IF NOT EXISTS iidxme_last_play_version ( " +
+        "   username TEXT PRIMARY KEY, version TEXT NOT NULL, current_version TEXT NOT NULL, fetched_at REAL NOT NULL )"
+    ])
+
+
+def _bot_v3_pb_record(dbconn: sqlite3.Connection) -> None:
+    _execute_statements(dbconn, [
+        "CREATE TABLE IF NOT EXISTS iidxme_pb_record ( " +
+        "   username TEXT NOT NULL, version TEXT NOT NULL, chart_id TEXT NOT NULL, " +
+        "   lamp TEXT, score INTEGER, score_attained_version TEXT, rank TEXT, rank_diff TEXT, rate TEXT, misscount INTEGER, " +
+        "   fetched_at REAL NOT NULL, " +
+        "   PRIMARY KEY (username, version, chart_id) )"
+    ])
+
+
+def _bot_v4_drop_follow_suit_param(dbconn: sqlite3.Connection) -> None:
+    # the last sent message of follow suit is kept in memory per channel (see events/on_message)
+    _execute_statements(dbconn, [
+        "DELETE FROM bot_param WHERE module = 'on_message' AND key = 'follow_suit_last_sent_msg'"
+    ])
+
+
+# (schema version, description, migration function) of each DB, in ascending order of version
+MIGRATIONS = {
+    'iidxme': [
+        (1, "base tables", _iidxme_v1_base_tables),
+        (2, "song title FTS5 index", _iidxme_v2_song_fts),
+        (3, "precomputed sort keys and covering indexes", _iidxme_v3_sort_keys),
+        (4, "normalized search keys", _iidxme_v4_search_keys),
+        (5, "song title FTS5 index linked by song_id", _iidxme_v5_song_fts_by_song_id),
+    ],
+    'bot': [
+        (1, "bot_param table", _bot_v1_bot_param),
+        (2, "last play version of iidx.me users", _bot_v2_last_play_version),
+        (3, "PB records of iidx.me users", _bot_v3_pb_record),
+        (4, "drop the follow suit bot param", _bot_v4_drop_follow_suit_param),
+    ],
+}
+
+# schema version of the catalog DB required by search queries, which use the precomputed sort keys and normalized search keys
+IIDXME_SEARCH_KEYS_VERSION = 4
+
+
+def get_schema_version(dbconn: sqlite3.Connection) -> int:
+    return dbconn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate_db(dbconn: sqlite3.Connection, db_name: str) -> int:
+    logger = logging.getLogger(__name__)
+
+    current_version = get_schema_version(dbconn)
+    migrated = False
+
+    for version, desc, migration_func in MIGRATIONS[db_name]:
+        if version > current_version:
+            logger.info(f"Migrating {db_name} DB to version {version}: {desc}")
+            # apply the migration and update user_version atomically
+            dbconn.commit()
+            dbconn.execute("BEGIN")
+            try:
+                migration_func(dbconn)
+                dbconn.execute(f"PRAGMA user_version = {version}")
+                dbconn.commit()
+            except BaseException:
+                dbconn.rollback()
+                raise
+            current_version = version
+            migrated = True
+
+    # refresh the statistics for the query planner after the schema has changed
+    if migrated:
+        dbconn.execute("ANALYZE")
+        dbconn.commit()
+
+    return current_version
+
+
+def _execute_statements(dbconn: sqlite3.Connection, statement_list: list[str]) -> None:
+    with closing(dbconn.cursor()) as cursor:
+        for statement in statement_list:
+            cursor.execute(statement)
+
+
+def migrate_all() -> None:
+    logger = logging.getLogger(__name__)
+
+    for db_name, config_key in (('bot', 'bot_db_file'), ('iidxme', 'iidxme_db_file')):
+        db_file = Path(config.get('BOT', config_key))
+        try:
+            with closing(sqlite3.connect(db_file)) as dbconn:
+                migrate_db(dbconn, db_name)
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Failed to migrate {db_file}: {repr(e)}")
+            raise
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) > 2:
+        # python -m db.migrations <iidxme|bot> <DB file>
+        with closing(sqlite3.connect(Path(sys.argv[2]))) as dbconn:
+            migrate_db(dbconn, sys.argv[1])
+    else:
+        migrate_all()
@@ -2,8 +2,8 @@ from dataclasses import dataclass
 from db.models.Chart import Chart
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Song:
     song_id: str
     title: str
-    charts: list[Chart]
\ No newline at end of file
+    charts: tuple[Chart, ...]
\ No newline at end of file
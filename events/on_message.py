@@ -1,29 +1,52 @@
 import discord
 import random
+from collections import deque
 import logging
-import db.bot_db as db
+import db.async_db as async_db
 import config.config_reader as config
 
 
+# follow suit state of each channel, {channel_id: {'recent_msgs': deque of (author_id, content_hash), 'last_sent_hash': ...}}
+# messages are recorded as they arrive, so the latest N messages of a channel are known without reading its history
+_follow_suit_state = {}
+
+
+def record_message(message: discord.Message) -> None:
+    # record every message received, including those sent by the bot itself, in the recent messages of the channel
+    num_of_same_msg = config.get('ON_MESSAGE_FOLLOW_SUIT', 'num_of_same_msg')
+
+    channel_state = _follow_suit_state.get(message.channel.id)
+    if channel_state is None or channel_state['recent_msgs'].maxlen != num_of_same_msg:
+        recent_msgs = channel_state['recent_msgs'] if channel_state else ()
+        channel_state = {'recent_msgs': deque(recent_msgs, maxlen=num_of_same_msg),
+                         'last_sent_hash': channel_state['last_sent_hash'] if channel_state else None}
+        _follow_suit_state[message.channel.id] = channel_state
+
+    channel_state['recent_msgs'].append((message.author.id, hash(message.content)))
+
+
 async def follow_suit(bot_user_id: discord.ClientUser, message: discord.Message) -> str:
     logger = logging.getLogger(__name__)
 
     ping_msg = ""
-    last_follow_msg = db.get_bot_param('on_message', 'follow_suit_last_sent_msg')
-    
-    # if the message is different from what the bot posted when it last followed suit,
-    # reset the last sent message in database
-    if last_follow_msg and (last_follow_msg != message.content):
-        last_follow_msg = ""
-        db.update_bot_param('on_message', 'follow_suit_last_sent_msg', "")
+    channel_state = _follow_suit_state.get(message.channel.id)
+    if channel_state is None:
+        return ping_msg
+
+    content_hash = hash(message.content)
+
+    # if the message is different from what the bot posted when it last followed suit in the channel,
+    # reset the last sent message of the channel
+    if (channel_state['last_sent_hash'] is not None) and (channel_state['last_sent_hash'] != content_hash):
+        channel_state['last_sent_hash'] = None
 
     # follow suit to send the same text message if all of below conditions are met:
     # a) the text message is not a command
     if message.content and (message.content[0] not in config.get('SERVER', 'cmd_prefixes')):
         # get the latest N messages in the channel, where N is the "number of same message" defined in config file
         num_of_same_msg = config.get('ON_MESSAGE_FOLLOW_SUIT', 'num_of_same_msg')
-        past_msg_list = [(msg.author.id, msg.content) async for msg in message.channel.history(limit=num_of_same_msg)]
-        
+        past_msg_list = list(channel_state['recent_msgs'])[-num_of_same_msg:]
+
         # b) there are at least N messages in the channel, where N is the "number of same message" defined in config file
         if len(past_msg_list) >= num_of_same_msg:
             # c) all messages have different authors
@@ -31,21 +54,21 @@ async def follow_suit(bot_user_id: discord.ClientUser, message: discord.Message)
             is_diff_authors = len(set(author_list)) == len(author_list)
 
             # d) the exact same text message is sent in a row
-            content_list = [item[1] for item in past_msg_list]
-            is_same_content = all(item == content_list[0] for item in content_list)
-            
-            logger.debug(f"content_list = {content_list}")
+            content_hash_list = [item[1] for item in past_msg_list]
+            is_same_content = all(item == content_hash for item in content_hash_list)
+
+            logger.debug(f"content_hash_list = {content_hash_list}")
             logger.debug(f"is_same_content = {is_same_content}")
             logger.debug(f"author_list = {author_list}")
             logger.debug(f"is_diff_authors = {is_diff_authors}")
 
             # e) the text messages are sent by different users/bots, excluding the bot itself
             if is_same_content and is_diff_authors and (bot_user_id not in author_list):
-                # f) the text message is different from what the bot sent when it last followed suit
-                if last_follow_msg != content_list[0]:
-                    # follow suit to send the message and update the database
-                    ping_msg = content_list[0]
-                    db.update_bot_param('on_message', 'follow_suit_last_sent_msg', ping_msg)
+                # f) the text message is different from what the bot sent when it last followed suit in the channel
+                if channel_state['last_sent_hash'] != content_hash:
+                    # follow suit to send the message and remember it for the channel
+                    ping_msg = message.content
+                    channel_state['last_sent_hash'] = content_hash
 
     return ping_msg
 
@@ -68,7 +91,7 @@ async def iidx_result_comment(message: discord.Message) -> str:
             ):
         
         # fetch the volume value from database and calculate the probability to comment
-        comment_chance = int(db.get_bot_param('on_message', 'iidx_result_comment_volume'))
+        comment_chance = int(await async_db.get_bot_param('on_message', 'iidx_result_comment_volume'))
 
         if random.randrange(0, config.get('VOLUME', 'vol_upper_bound')) < comment_chance:
             # retrieve comments from config file
@@ -1,13 +1,21 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 import logging.config
 from pathlib import Path
 import commands.iidxme.pb_main as iidxpb_main
 import commands.iidxme.sr_main as iidxsr_main
+import commands.iidxme.vs_main as iidxvs_main
+import commands.iidxme.autocomplete as iidx_autocomplete
 import commands.wordcloud.wc_main as wordcloud_main
 import commands.volume.vl_main as volume_main
 import events.on_message as ping_functions
+import db.iidxme_db as iidxme_db
+import db.bot_db as bot_db
+import db.async_db as async_db
+import db.migrations as migrations
 import config.config_reader as config
+import utils.http_client as http_client
 
 
 def main():
@@ -33,6 +41,13 @@ def main():
 
 
     # BOT EVENTS - start
+    async def setup_hook():
+        # register the slash commands to Discord
+        await bot.tree.sync()
+
+    bot.setup_hook = setup_hook
+
+
     @bot.event
     async def on_ready():
         logger = logging.getLogger(__name__)
@@ -52,6 +67,9 @@ def main():
 
     @bot.event
     async def on_message(message):
+        # keep track of the recent messages of each channel for follow suit, including those sent by the bot itself
+        ping_functions.record_message(message)
+
         # ignore messages sent by the bot itself
         bot_user = bot.user
         if message.author != bot_user:
@@ -80,14 +98,47 @@ def main():
     async def iidxpb(ctx, *, arg_str: str = ""):
         # reply with a loading message
         bot_message = await ctx.reply(embed=iidxpb_main.prompt_loading_message(), mention_author=False)
-        # get personal best records from iidx.me and update the reply
-        await bot_message.edit(embed=iidxpb_main.get_result_embed(arg_str))
+        # get personal best records from iidx.me in background and update the reply
+        await bot_message.edit(embed=await iidxpb_main.get_result_embed_async(arg_str))
+
+
+    @bot.command(brief=config.get('IIDXME_VS', 'title'), help=config.get('IIDXME_VS', 'usage'))
+    async def iidxvs(ctx, *, arg_str: str = ""):
+        # reply with a loading message
+        bot_message = await ctx.reply(embed=iidxvs_main.prompt_loading_message(), mention_author=False)
+        # compare personal best records of the players from iidx.me in background and update the reply
+        await bot_message.edit(embed=await iidxvs_main.get_result_embed_async(arg_str))
 
 
     @bot.command(brief=config.get('IIDXME_SR', 'title'), help=config.get('IIDXME_SR', 'usage'))
     async def iidxsr(ctx, *, arg_str: str = ""):
         # get the calculated scores needed for different ranks and reply
-        await ctx.reply(embed=iidxsr_main.get_result_embed(arg_str), mention_author=False)
+        # the search runs in a catalog DB reader thread, so that the event loop is not blocked
+        await ctx.reply(embed=await async_db.run_in_reader(iidxsr_main.get_result_embed, arg_str), mention_author=False)
+
+
+    # slash command variants of $iidxpb and $iidxsr, with autocompletion of song title keywords
+    @bot.tree.command(name="iidxpb", description=config.get('IIDXME_PB', 'title'))
+    @app_commands.describe(username=config.get('IIDX', 'slash_desc_username'),
+                           keywords=config.get('IIDX', 'slash_desc_keywords'),
+                           filters=config.get('IIDX', 'slash_desc_filters'))
+    @app_commands.autocomplete(keywords=iidx_autocomplete.song_title_autocomplete)
+    async def slash_iidxpb(interaction: discord.Interaction, username: str, keywords: str, filters: str = ""):
+        # reply with a loading message
+        await interaction.response.send_message(embed=iidxpb_main.prompt_loading_message())
+        # get personal best records from iidx.me in background and update the reply
+        arg_str = " ".join(arg for arg in (username, filters, keywords) if arg)
+        await interaction.edit_original_response(embed=await iidxpb_main.get_result_embed_async(arg_str))
+
+
+    @bot.tree.command(name="iidxsr", description=config.get('IIDXME_SR', 'title'))
+    @app_commands.describe(keywords=config.get('IIDX', 'slash_desc_keywords'),
+                           filters=config.get('IIDX', 'slash_desc_filters'))
+    @app_commands.autocomplete(keywords=iidx_autocomplete.song_title_autocomplete)
+    async def slash_iidxsr(interaction: discord.Interaction, keywords: str, filters: str = ""):
+        # get the calculated scores needed for different ranks and reply
+        arg_str = " ".join(arg for arg in (filters, keywords) if arg)
+        await interaction.response.send_message(embed=await async_db.run_in_reader(iidxsr_main.get_result_embed, arg_str))
 
 
     @bot.command(brief=config.get('WORD_CLOUD', 'title'), help=config.get('WORD_CLOUD', 'usage'))
@@ -114,17 +165,39 @@ def main():
     async def volume(ctx, *args: str):
         arg_str = " ".join(args)
         # get the result of "bot volume" adjustment and reply
-        await ctx.reply(embed=volume_main.get_result_embed(arg_str, ctx.message.channel.id), mention_author=False)
-    
+        # the bot param is read/updated in the bot DB writer thread, so that the event loop is not blocked
+        await ctx.reply(embed=await async_db.run_in_writer(volume_main.get_result_embed, arg_str, ctx.message.channel.id),
+                        mention_author=False)
+
+
+    @bot.command(hidden=True)
+    @commands.is_owner()
+    async def reloadconfig(ctx):
+        # parse the config files again without restarting the bot
+        config.reload()
+        await ctx.message.add_reaction("✅")
+
     # BOT COMMANDS - end
 
 
     # START THE BOT
+    # bring the DB schemas up to date, then open the catalog DB connection of the event loop thread
+    # (and build the in-memory search indexes) before handling any command
+    migrations.migrate_all()
+    iidxme_db.preload()
+
     bot.run(bot_token,
             log_handler=logger_handler,
             log_level=log_level_dict.get(log_level),
             root_logger=True)
 
+    # cancel PB lookups and comparisons in progress and wait for pending DB access, then write the pending changes of bot params before exit
+    iidxvs_main.shutdown()
+    iidxpb_main.shutdown()
+    async_db.shutdown()
+    http_client.close()
+    bot_db.close()
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
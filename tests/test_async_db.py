@@ -0,0 +1,80 @@
+import time
+import asyncio
+import unittest
+import db.async_db as async_db
+import db.bot_db as bot_db
+import db.iidxme_db as iidxme_db
+from tests.util import temp_bot_db, temp_catalog
+
+
+async def _count_loop_ticks(stop_event: asyncio.Event, interval: float = 0.01) -> int:
+    # return the number of times a coroutine sleeping for the interval is woken up until the stop event is set
+    tick_count = 0
+    while not stop_event.is_set():
+        await asyncio.sleep(interval)
+        tick_count += 1
+
+    return tick_count
+
+
+class AsyncDbTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bot_db_context = temp_bot_db()
+        self.bot_db_context.__enter__()
+        self.catalog_context = temp_catalog()
+        self.catalog_context.__enter__()
+
+    def tearDown(self):
+        async_db.shutdown()
+        self.catalog_context.__exit__(None, None, None)
+        self.bot_db_context.__exit__(None, None, None)
+
+    def test_results(self):
+        bot_db.update_bot_param('on_message', 'iidx_result_comment_volume', "30")
+
+        async def run() -> tuple:
+            return (await async_db.get_bot_param('on_message', 'iidx_result_comment_volume'),
+                    await async_db.run_in_reader(iidxme_db.search_charts, "SP", "ALL", "ALL", "mirror", False, 5))
+
+        param_value, (num_of_matches, song_list) = asyncio.run(run())
+
+        self.assertEqual(param_value, "30")
+        self.assertEqual((num_of_matches, [song.song_id for song in song_list]), (1, ["1001"]))
+
+    def test_event_loop_not_blocked(self):
+        # the event loop keeps waking up coroutines while blocking jobs run in the reader and writer threads
+        block_sec = 0.3
+
+        async def run() -> int:
+            stop_event = asyncio.Event()
+            tick_task = asyncio.create_task(_count_loop_ticks(stop_event))
+            await asyncio.gather(async_db.run_in_reader(time.sleep, block_sec),
+                                 async_db.run_in_writer(time.sleep, block_sec))
+            stop_event.set()
+            return await tick_task
+
+        # had the jobs run on the event loop, the coroutine would be woken up only once
+        self.assertGreater(asyncio.run(run()), 3)
+
+    def test_concurrent_requests(self):
+        # catalog searches and bot param reads from many coroutines at the same time
+        keywords_list = ["a", "the", "mirror", "love", "%", "sp", "ま", "de"]
+
+        async def request(i: int) -> int:
+            num_of_matches, _ = await async_db.run_in_reader(iidxme_db._search_charts_in_db, "SP", "ALL", "ALL",
+                                                             keywords_list[i % len(keywords_list)], False, 5)
+            self.assertEqual(await async_db.get_bot_param('on_message', 'iidx_result_comment_volume'), "30")
+            return num_of_matches
+
+        async def run() -> list[int]:
+            return await asyncio.gather(*(request(i) for i in range(200)))
+
+        bot_db.update_bot_param('on_message', 'iidx_result_comment_volume', "30")
+        expected_list = [iidxme_db._search_charts_in_db("SP", "ALL", "ALL", keywords_list[i % len(keywords_list)], False, 5)[0]
+                         for i in range(200)]
+        self.assertEqual(asyncio.run(run()), expected_list)
+
+
+if __name__ == '__main__':
+    unittest.main()
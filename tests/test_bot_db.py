@@ -0,0 +1,61 @@
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import db.bot_db as bot_db
+from tests.util import temp_bot_db
+
+
+class BotDbTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bot_db_context = temp_bot_db()
+        self.bot_db_context.__enter__()
+
+    def tearDown(self):
+        self.bot_db_context.__exit__(None, None, None)
+
+    def test_last_play_version(self):
+        bot_db.update_last_play_version("userA", "31", "32", 1000.0)
+        bot_db.update_last_play_version("userB", "32", "32", 2000.0)
+        bot_db.update_last_play_version("userA", "32", "32", 3000.0)
+        self.assertEqual(bot_db.fetch_last_play_versions(), {"userA": ("32", "32", 3000.0), "userB": ("32", "32", 2000.0)})
+
+        bot_db.delete_last_play_version("userA")
+        self.assertEqual(list(bot_db.fetch_last_play_versions()), ["userB"])
+
+    def test_pb_records_from_concurrent_threads(self):
+        def update_and_fetch(i: int) -> dict:
+            chart_id = f"100{i % 7 + 1}SPA"
+            bot_db.update_pb_records(f"user{i}", "32", {chart_id: ("FC", 2000 + i, "32", "AAA", "MAX-10", "95.00%", 0, float(i))})
+            return bot_db.fetch_pb_records(f"user{i}", "32", [chart_id, "9999SPA"])
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            result_list = list(executor.map(update_and_fetch, range(40)))
+
+        for i, pb_record_dict in enumerate(result_list):
+            self.assertEqual(pb_record_dict, {f"100{i % 7 + 1}SPA": ("FC", 2000 + i, "32", "AAA", "MAX-10", "95.00%", 0, float(i))})
+
+    def test_shared_connection(self):
+        bot_db.update_bot_param('on_message', 'iidx_result_comment_volume', "30")
+        dbconn = bot_db._conn_state['dbconn']
+        bot_db.flush()
+        bot_db.fetch_pb_records("userA", "32", ["1001SPA"])
+
+        # every call uses the connection opened once in WAL mode
+        self.assertIs(bot_db._conn_state['dbconn'], dbconn)
+        self.assertEqual(dbconn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(bot_db.get_bot_param('on_message', 'iidx_result_comment_volume'), "30")
+
+    def test_close_registered_once(self):
+        # the flusher is started again after every close(), but close() runs once at exit
+        with mock.patch.object(bot_db.atexit, 'register') as register_mock, \
+                mock.patch.dict(bot_db._flusher_state, {'atexit_registered': False}):
+            for i in range(3):
+                bot_db.update_bot_param('on_message', 'iidx_result_comment_volume', str(i))
+                bot_db.close()
+
+        register_mock.assert_called_once_with(bot_db.close)
+
+
+if __name__ == '__main__':
+    unittest.main()
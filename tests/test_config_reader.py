@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+import config.config_reader as config
+
+
+class ConfigReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.config_file = Path(self.temp_dir.name) / "config.yaml"
+        self._write("v1", 1_000_000_000)
+        self.config_file_patch = mock.patch.object(config, 'CONFIG_FILE', self.config_file)
+        self.config_file_patch.start()
+
+    def tearDown(self):
+        self.config_file_patch.stop()
+        config._snapshot_dict.pop(self.config_file, None)
+        self.temp_dir.cleanup()
+
+    def _write(self, value: str, mtime_ns: int) -> None:
+        self.config_file.write_text(f"BOT:\n    name: {value}\n", encoding='utf8')
+        os.utime(self.config_file, ns=(mtime_ns, mtime_ns))
+
+    def test_mtime_checked_once_per_interval(self):
+        self.assertEqual(config.get('BOT', 'name'), "v1")
+        self._write("v2", 2_000_000_000)
+
+        with mock.patch.object(config.os, 'stat', wraps=os.stat) as stat:
+            self.assertEqual(config.get('BOT', 'name'), "v1")
+            stat.assert_not_called()
+
+        with mock.patch.object(config, 'MTIME_CHECK_INTERVAL_SEC', 0):
+            self.assertEqual(config.get('BOT', 'name'), "v2")
+
+    def test_reload(self):
+        self.assertEqual(config.get('BOT', 'name'), "v1")
+        self._write("v2", 2_000_000_000)
+
+        config.reload()
+        self.assertEqual(config.get('BOT', 'name'), "v2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import utils.http_client as http_client
+from tests.util import override_config
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    # counts the requests received, and responds after the server's delay
+    def do_GET(self):
+        self.server.request_count += 1
+        time.sleep(self.server.delay_sec)
+        self.send_response(503 if self.path == "/unavailable" else 200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+        self.server.request_count = 0
+        self.server.delay_sec = 0.0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+        self.config_patcher = override_config({('BOT', 'http_max_retries'): "2", ('BOT', 'http_retry_backoff_factor'): "0"})
+        self.config_patcher.start()
+        http_client.close()
+
+    def tearDown(self):
+        http_client.close()
+        self.config_patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_read_timeout_not_retried(self):
+        self.server.delay_sec = 0.3
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            http_client.get(self.base_url + "/slow", timeout=(1.0, 0.1))
+
+        time.sleep(0.3)
+        self.assertEqual(self.server.request_count, 1)
+
+    def test_unavailable_retried(self):
+        response = http_client.get(self.base_url + "/unavailable", timeout=(1.0, 1.0))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.request_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import sqlite3
+import unittest
+from contextlib import closing
+import db.iidxme_catalog_engine as catalog_engine
+import db.iidxme_db as iidxme_db
+from tests.util import temp_catalog
+
+
+class CatalogEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog_context = temp_catalog()
+        self.db_file = self.catalog_context.__enter__()
+        catalog_engine._catalog_state['catalog'] = None
+
+    def tearDown(self):
+        catalog_engine._catalog_state['catalog'] = None
+        self.catalog_context.__exit__(None, None, None)
+
+    def test_same_as_sqlite(self):
+        for mode, difficulty, level, keywords, flag_exact_match in (
+            ("SP", "ALL", "ALL", "mirror", False), ("SP", "A", "ALL", "a", False), ("DP", "ALL", "ALL", "%", False),
+            ("SP", "ALL", "12", "mei", False), ("SP", "ALL", "ALL", "純真可憐", False), ("DP", "N", "2", "gambol", True),
+            ("SP", "ALL", "ALL", "junshin karen", False), ("SP", "ALL", "ALL", "nothing matched", False)
+        ):
+            with self.subTest(keywords=keywords):
+                self.assertEqual(catalog_engine.search_charts(mode, difficulty, level, keywords, flag_exact_match, 3),
+                                 iidxme_db._search_charts_in_db(mode, difficulty, level, keywords, flag_exact_match, 3))
+
+    def test_stored_search_keys(self):
+        # the keys stored in the catalog DB are used as they are, not computed again from the titles
+        with closing(sqlite3.connect(self.db_file)) as dbconn:
+            with dbconn:
+                dbconn.execute("UPDATE iidxme_song SET search_key = 'stored key' WHERE song_id = '1006'")
+
+        num_of_matches, song_list = catalog_engine.search_charts("SP", "ALL", "ALL", "stored key", False, 3)
+        self.assertEqual((num_of_matches, [song.song_id for song in song_list]), (1, ["1006"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
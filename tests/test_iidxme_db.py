@@ -0,0 +1,42 @@
+import sqlite3
+import unittest
+from contextlib import closing
+import db.iidxme_db as iidxme_db
+from tests.util import temp_catalog
+
+
+class SearchChartsQueryTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.catalog_context = temp_catalog()
+        cls.db_file = cls.catalog_context.__enter__()
+        cls.dbconn = sqlite3.connect(cls.db_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dbconn.close()
+        cls.catalog_context.__exit__(None, None, None)
+
+    def _query(self, keywords: str, flag_exact_match: bool, use_fts: bool, prefix: str = "") -> list:
+        pstmt_dict = iidxme_db._get_chart_conditions_pstmt("SP", "ALL", "ALL", keywords, flag_exact_match, use_fts)
+        sql, value_list = iidxme_db._get_search_charts_query(pstmt_dict, 5)
+        with closing(self.dbconn.cursor()) as cursor:
+            return cursor.execute(prefix + sql, value_list).fetchall()
+
+    def test_fts_path_does_not_scan_songs(self):
+        plan_list = [row[3] for row in self._query("mirror", False, True, prefix="EXPLAIN QUERY PLAN ")]
+
+        self.assertTrue(any(plan.startswith("SCAN iidxme_song_fts VIRTUAL TABLE") for plan in plan_list), plan_list)
+        # songs are looked up by the song_id of the index hits
+        self.assertIn("SEARCH s USING INDEX sqlite_autoindex_iidxme_song_1 (song_id=?)", plan_list)
+        self.assertFalse(any(plan.startswith("SCAN s") for plan in plan_list), plan_list)
+
+    def test_fts_path_same_as_search_keys(self):
+        for keywords in ("mirror", "luv can", "desire", "junshin karen", "純真可憐", "ride", "gam"):
+            with self.subTest(keywords=keywords):
+                self.assertEqual(self._query(keywords, False, True), self._query(keywords, False, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+import commands.iidxme.iidxme_http_cache as http_cache
+from tests.util import override_config
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    # serves /<page> with an ETag, /modified/<page> with a Last-Modified header, and 404 for /missing/<page>
+    ETAG = '"v1"'
+    LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+    def do_GET(self):
+        self.server.request_list.append((self.path, self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')))
+
+        if self.path.startswith("/missing/"):
+            self._send(404, b"not found", {})
+        elif self.path.startswith("/modified/"):
+            if self.headers.get('If-Modified-Since') == self.LAST_MODIFIED:
+                self._send(304, b"", {})
+            else:
+                self._send(200, self.path.encode(), {'Last-Modified': self.LAST_MODIFIED})
+        elif self.headers.get('If-None-Match') == self.ETAG:
+            self._send(304, b"", {})
+        else:
+            self._send(200, self.path.encode(), {'ETag': self.ETAG})
+
+    def _send(self, status_code: int, body: bytes, header_dict: dict):
+        self.send_response(status_code)
+        for name, value in header_dict.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        cls.server.request_list = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.request_list.clear()
+        self.request_session = requests.Session()
+        self.config_patch = override_config({('IIDX', 'http_cache_ttl_sec'): 60, ('IIDX', 'http_cache_size'): 2})
+        self.config_patch.start()
+        # start each test with an empty cache and zero stats
+        http_cache._cache_state['cache'] = None
+        for stat_name in http_cache._stats:
+            http_cache._stats[stat_name] = 0
+
+    def tearDown(self):
+        self.config_patch.stop()
+        self.request_session.close()
+        http_cache._cache_state['cache'] = None
+
+    def _get(self, path: str, ttl: float | None = None):
+        return http_cache.get(self.request_session, self.base_url + path, params='content', timeout=5, ttl=ttl)
+
+    def test_fresh_hit(self):
+        for _ in range(3):
+            response = self._get("/c/user1")
+            self.assertEqual((response.status_code, response.content), (200, b"/c/user1?content"))
+
+        self.assertEqual(len(self.server.request_list), 1)
+        self.assertEqual(http_cache.get_stats()['fresh_hits'], 2)
+
+    def test_revalidation_with_etag(self):
+        self._get("/c/user1")
+        response = self._get("/c/user1", ttl=0)
+
+        self.assertEqual((response.status_code, response.content), (200, b"/c/user1?content"))
+        self.assertEqual(self.server.request_list[-1][1], _StandInHandler.ETAG)
+        self.assertEqual(http_cache.get_stats()['revalidated_hits'], 1)
+
+    def test_revalidation_with_last_modified(self):
+        self._get("/modified/user1")
+        response = self._get("/modified/user1", ttl=0)
+
+        self.assertEqual(response.content, b"/modified/user1?content")
+        self.assertEqual(self.server.request_list[-1][2], _StandInHandler.LAST_MODIFIED)
+        self.assertEqual(http_cache.get_stats()['revalidated_hits'], 1)
+
+    def test_error_response_not_cached(self):
+        self.assertEqual(self._get("/missing/user1").status_code, 404)
+        self.assertEqual(self._get("/missing/user1").status_code, 404)
+        self.assertEqual(len(self.server.request_list), 2)
+
+    def test_lru_eviction(self):
+        for path in ("/c/user1", "/c/user2", "/c/user1", "/c/user3", "/c/user1", "/c/user2"):
+            self._get(path)
+
+        # user2 was the least recently used page when user3 was cached, and is fetched again
+        self.assertEqual([request[0] for request in self.server.request_list],
+                         ["/c/user1?content", "/c/user2?content", "/c/user3?content", "/c/user2?content"])
+        self.assertEqual(http_cache.get_stats()['cache_evictions'], 2)
+
+    def test_invalidate(self):
+        self._get("/c/user1")
+        http_cache.invalidate(self.base_url + "/c/user1", params='content')
+        self._get("/c/user1")
+
+        self.assertEqual(len(self.server.request_list), 2)
+        # the invalidated page is fetched without validators
+        self.assertIsNone(self.server.request_list[-1][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from contextlib import closing
+import db.iidxme_importer as iidxme_importer
+
+
+RECORD = {'song_id': "1001", 'title': "Infinity Mirror", 'title_alias': "", 'title_romaji': "",
+          'chart_id': "1001SPA", 'mode': "SP", 'difficulty': "A", 'level': 11, 'notes': 1590}
+
+
+class IidxmeImporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_file = Path(self.temp_dir.name) / "iidxme.db"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write_dump(self, record_list: list[dict]) -> Path:
+        dump_file = Path(self.temp_dir.name) / "dump.jsonl"
+        dump_file.write_text("".join(json.dumps(record) + "\n" for record in record_list), encoding='utf8')
+        return dump_file
+
+    def test_import(self):
+        result = iidxme_importer.import_catalog(self._write_dump([RECORD]), self.db_file)
+
+        self.assertEqual((result['songs_inserted'], result['charts_inserted']), (1, 1))
+        with closing(sqlite3.connect(self.db_file)) as dbconn:
+            self.assertEqual(dbconn.execute("SELECT song_id, title FROM iidxme_song").fetchall(), [("1001", "Infinity Mirror")])
+
+    def test_missing_title(self):
+        iidxme_importer.import_catalog(self._write_dump([RECORD]), self.db_file)
+
+        for title in (None, "", " "):
+            with self.subTest(title=title):
+                with self.assertRaisesRegex(ValueError, "song 1002"):
+                    iidxme_importer.import_catalog(self._write_dump([RECORD, dict(RECORD, song_id="1002", chart_id="1002SPA", title=title)]),
+                                                   self.db_file)
+
+                # the catalog is left as it was, and the temp copy is discarded
+                with closing(sqlite3.connect(self.db_file)) as dbconn:
+                    self.assertEqual(dbconn.execute("SELECT COUNT(*) FROM iidxme_song").fetchone()[0], 1)
+                self.assertFalse(self.db_file.with_name(self.db_file.name + ".importing").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+import commands.iidxme.iidxme_util as iidx_util
+import db.iidxme_suggester as suggester
+from tests.util import temp_catalog
+
+
+class SuggestTitlesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._catalog = temp_catalog()
+        cls._catalog.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._catalog.__exit__(None, None, None)
+
+    def _suggest(self, arg_str: str, num_of_suggestions: int = 3) -> list[str]:
+        keywords = iidx_util.parse_arguments(num_of_usernames=0, arg_str=arg_str)[4]
+        return suggester.suggest_titles(keywords, num_of_suggestions)
+
+    def test_typo_in_title(self):
+        self.assertEqual(self._suggest("infinty mirorr")[0], "Infinity Mirror")
+        self.assertEqual(self._suggest("overide")[0], "Override")
+
+    def test_partial_title_with_typo(self):
+        self.assertEqual(self._suggest("luv cam")[0], "LUV CAN SAVE U")
+
+    def test_romaji_and_katakana(self):
+        self.assertEqual(self._suggest("junshin karan")[0], "純真可憐デザイア")
+        self.assertEqual(self._suggest("でざいあ")[0], "純真可憐デザイア")
+
+    def test_number_of_suggestions(self):
+        self.assertLessEqual(len(self._suggest("mirror", 2)), 2)
+        self.assertEqual(self._suggest("%"), [])
+
+    def test_index_built_once(self):
+        # suggestions are served from the index built for the catalog DB generation, without reading the DB per query
+        self._suggest("mirror")
+        index = suggester.get_index()
+        with mock.patch.object(suggester, '_build_index', side_effect=AssertionError("index built again")), \
+                mock.patch.object(suggester.iidxme_conn, 'get_connection', side_effect=AssertionError("DB read")):
+            for _ in range(3):
+                self.assertEqual(self._suggest("infinty mirorr")[0], "Infinity Mirror")
+
+        self.assertIs(suggester.get_index(), index)
+
+
+class ResultNotFoundMessageTest(unittest.TestCase):
+
+    def test_suggestions_in_message(self):
+        with temp_catalog():
+            msg = iidx_util.get_result_not_found_msg(iidx_util.parse_arguments(0, "gambool")[4], False)
+        self.assertIn("GAMBOL", msg)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+from types import SimpleNamespace
+import commands.iidxme.autocomplete as autocomplete
+import db.async_db as async_db
+import db.iidxme_title_trie as title_trie
+from tests.util import temp_catalog
+
+
+class CompleteTitlesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._catalog = temp_catalog()
+        cls._catalog.__enter__()
+        title_trie.get_trie()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._catalog.__exit__(None, None, None)
+
+    def test_prefix_of_any_word(self):
+        self.assertEqual(title_trie.complete_titles("infin"), ["Infinity Mirror"])
+        self.assertEqual(title_trie.complete_titles("MIRR"), ["Infinity Mirror"])
+        self.assertEqual(title_trie.complete_titles("india"), ["Fly Away To India"])
+
+    def test_alias_romaji_and_katakana(self):
+        self.assertEqual(title_trie.complete_titles("mei"), ["冥"])
+        self.assertEqual(title_trie.complete_titles("junshin"), ["純真可憐デザイア"])
+        self.assertEqual(title_trie.complete_titles("ＧＡＭ"), ["GAMBOL"])
+        self.assertEqual(title_trie.complete_titles("純真"), ["純真可憐デザイア"])
+
+    def test_order_and_limit(self):
+        # completions are in the order of search results: length of title, then title
+        self.assertEqual(title_trie.complete_titles("o"), ["Override"])
+        self.assertEqual(title_trie.complete_titles("", 25), [])
+        self.assertEqual(len(title_trie.complete_titles("l", 1)), 1)
+
+
+class SongTitleAutocompleteTest(unittest.TestCase):
+
+    def setUp(self):
+        autocomplete._trie_check_state.update({'task': None, 'started_at': None})
+
+    def tearDown(self):
+        async_db.shutdown()
+
+    def test_fake_interaction(self):
+        fake_interaction = SimpleNamespace(namespace=SimpleNamespace(), user=None)
+
+        with temp_catalog():
+            title_trie.get_trie()
+            choice_list = asyncio.run(autocomplete.song_title_autocomplete(fake_interaction, "gam"))
+
+        self.assertEqual([(choice.name, choice.value) for choice in choice_list], [("GAMBOL", '"GAMBOL"')])
+
+    def test_trie_built_off_loop(self):
+        # the callback serves the last built trie, and the trie is built for a changed catalog DB in a reader thread
+        generation_thread_set = set()
+        get_generation = title_trie.iidxme_conn.get_generation
+
+        def record_thread() -> int:
+            generation_thread_set.add(threading.current_thread())
+            return get_generation()
+
+        async def run() -> list:
+            await autocomplete.song_title_autocomplete(None, "gam")
+            await autocomplete._trie_check_state['task']
+            return await autocomplete.song_title_autocomplete(None, "gam")
+
+        with temp_catalog():
+            stale_trie = title_trie.get_trie()
+        with temp_catalog(), mock.patch.object(title_trie.iidxme_conn, 'get_generation', side_effect=record_thread):
+            choice_list = asyncio.run(run())
+            self.assertIsNot(title_trie._trie_state['trie'], stale_trie)
+
+        self.assertEqual([choice.name for choice in choice_list], ["GAMBOL"])
+        self.assertNotIn(threading.current_thread(), generation_thread_set)
+
+    def test_long_title_not_quoted(self):
+        title = "x" * 120
+        self.assertEqual(autocomplete._to_keywords(title), title[:autocomplete.MAX_CHOICE_LENGTH])
+
+
+if __name__ == '__main__':
+    unittest.main()
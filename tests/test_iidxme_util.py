@@ -0,0 +1,17 @@
+import unittest
+from commands.iidxme.models.PbInfo import PbInfo
+import commands.iidxme.iidxme_util as iidx_util
+
+
+class PbStrTest(unittest.TestCase):
+
+    def test_pb_str(self):
+        pb = PbInfo("FC", 2123, "32", "AAA", "MAX-109", "92.51%", 0)
+
+        self.assertEqual(iidx_util.get_pb_str(pb, False, True), "FC／__32__ [AAA] 2123 _(MAX-109)_／BP 0")
+        self.assertEqual(iidx_util.get_pb_str(pb, True, False), "FC／[AAA] 2123 _(92.51%)_／BP 0")
+        self.assertEqual(iidx_util.get_pb_str(PbInfo("--", -1, "", "?", "", "?", 9999), False, True), "--／--／--")
+
+
+if __name__ == '__main__':
+    unittest.main()
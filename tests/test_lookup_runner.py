@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import unittest
+import commands.iidxme.lookup_runner as lookup_runner
+import commands.iidxme.vs_main as vs_main
+import config.config_reader as config
+from tests.util import override_config
+
+
+class LookupRunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config_patch = override_config({('IIDXME_PB', 'timeout_sec'): 0.2, ('IIDXME_VS', 'timeout_sec'): 0.2})
+        self.config_patch.start()
+
+    def tearDown(self):
+        lookup_runner.shutdown('IIDXME_PB')
+        lookup_runner.shutdown('IIDXME_VS')
+        self.config_patch.stop()
+
+    def test_result(self):
+        embed = asyncio.run(lookup_runner.run_async('IIDXME_PB', lambda arg_str, cancel_event: arg_str.upper(), "mirror"))
+        self.assertEqual(embed, "MIRROR")
+
+    def test_timeout_cancels_lookup(self):
+        cancel_event_list = []
+
+        def slow_lookup(arg_str: str, cancel_event: threading.Event) -> str:
+            cancel_event_list.append(cancel_event)
+            cancel_event.wait(timeout=5)
+            return arg_str
+
+        embed = asyncio.run(lookup_runner.run_async('IIDXME_VS', slow_lookup, "userA,userB mirror"))
+
+        self.assertEqual(embed.title, config.get('IIDXME_VS', 'title'))
+        self.assertEqual(embed.description, config.get('IIDXME_PB', 'msg_timeout'))
+        self.assertTrue(cancel_event_list[0].is_set())
+
+    def test_pool_per_command(self):
+        thread_name_list = []
+
+        def lookup(arg_str: str, cancel_event: threading.Event) -> None:
+            thread_name_list.append(threading.current_thread().name)
+
+        async def run() -> None:
+            await lookup_runner.run_async('IIDXME_PB', lookup, "")
+            await lookup_runner.run_async('IIDXME_VS', lookup, "")
+
+        asyncio.run(run())
+
+        self.assertTrue(thread_name_list[0].startswith("iidxme_pb"))
+        self.assertTrue(thread_name_list[1].startswith("iidxme_vs"))
+
+
+if __name__ == '__main__':
+    unittest.main()
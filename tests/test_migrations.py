@@ -0,0 +1,23 @@
+import sqlite3
+import unittest
+from contextlib import closing
+import db.migrations as migrations
+
+
+class BotMigrationTest(unittest.TestCase):
+
+    def test_follow_suit_param_dropped(self):
+        with closing(sqlite3.connect(":memory:")) as dbconn:
+            # a bot DB created before version 4, which seeded the follow suit param
+            migrations.migrate_db(dbconn, 'bot')
+            dbconn.execute("PRAGMA user_version = 3")
+            dbconn.execute("INSERT INTO bot_param (module, key, value) VALUES ('on_message', 'follow_suit_last_sent_msg', '')")
+            dbconn.commit()
+
+            self.assertEqual(migrations.migrate_db(dbconn, 'bot'), 4)
+            self.assertEqual(dbconn.execute("SELECT module, key, value FROM bot_param").fetchall(),
+                             [('on_message', 'iidx_result_comment_volume', '100')])
+
+
+if __name__ == '__main__':
+    unittest.main()
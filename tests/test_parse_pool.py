@@ -0,0 +1,36 @@
+import unittest
+import commands.iidxme.parse_pool as parse_pool
+import commands.iidxme.song_page_parser as song_page_parser
+from tests.test_song_page_parser import SONG_PAGE_DIR, get_chart_id_list
+from tests.util import override_config
+
+
+class ParsePoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.page_list = [page_file.read_bytes() for page_file in sorted(SONG_PAGE_DIR.glob("*.html"))]
+
+    def tearDown(self):
+        parse_pool.shutdown()
+
+    def test_pool_same_as_in_process(self):
+        with override_config({('IIDXME_PB', 'parse_pool_size'): 2}):
+            self.assertIsNotNone(parse_pool._get_executor())
+
+            for page_content in self.page_list:
+                chart_id_list = get_chart_id_list(page_content)
+                self.assertEqual(parse_pool.parse_song_page(page_content, chart_id_list),
+                                 song_page_parser.parse_song_page(page_content, chart_id_list))
+
+    def test_in_process_without_pool(self):
+        with override_config({('IIDXME_PB', 'parse_pool_size'): 0}):
+            self.assertIsNone(parse_pool._get_executor())
+
+            page_content = self.page_list[0]
+            chart_id_list = get_chart_id_list(page_content)
+            self.assertEqual(parse_pool.parse_song_page(page_content, chart_id_list),
+                             song_page_parser.parse_song_page(page_content, chart_id_list))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from db.models.Chart import Chart
+from db.models.Song import Song
+import commands.iidxme.iidxme_http_cache as http_cache
+import commands.iidxme.last_play_version_cache as version_cache
+import commands.iidxme.pb_scraper as scraper
+import commands.iidxme.song_page_parser as song_page_parser
+import config.config_reader as config
+from tests.test_song_page_parser import SONG_PAGE_DIR
+from tests.util import override_config, temp_bot_db
+
+
+SONG_LIST = [
+    Song("1001", "Infinity Mirror", (Chart("1001SPN", "N", 4, 513), Chart("1001SPA", "A", 11, 1590))),
+    Song("1002", "LUV CAN SAVE U", (Chart("1002SPH", "H", 7, 802), Chart("1002DPA", "A", 10, 1250))),
+    Song("1003", "純真可憐デザイア", (Chart("1003SPA", "A", 12, 1888), )),
+]
+
+
+class _IidxmeHandler(BaseHTTPRequestHandler):
+    # serves /c/<username> and the fixture song pages as /<version>/<username>/music/<song_id>
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        self.server.path_list.append(path)
+        path_list = path.strip("/").split("/")
+        page_file = SONG_PAGE_DIR / f"{path_list[-1]}.html"
+
+        if path_list[2:3] == ["music"] and page_file.exists():
+            self._send(200, page_file.read_bytes())
+        elif path_list == ["c", "userA"]:
+            self._send(200, b"<html><body><h2>userA</h2></body></html>")
+        else:
+            self._send(404, b"not found")
+
+    def _send(self, status_code: int, body: bytes):
+        self.send_response(status_code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PbScraperTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _IidxmeHandler)
+        cls.server.path_list = []
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.path_list.clear()
+        self.request_session = requests.Session()
+        self.bot_db_context = temp_bot_db()
+        self.bot_db_context.__enter__()
+        self.config_patch = override_config({('IIDX', 'iidxme_base_url'): f"http://127.0.0.1:{self.server.server_address[1]}",
+                                             ('IIDXME_PB', 'max_concurrent_fetches'): 2})
+        self.config_patch.start()
+        http_cache._cache_state['cache'] = None
+        version_cache._version_state['loaded'] = False
+
+    def tearDown(self):
+        scraper.shutdown()
+        self.config_patch.stop()
+        self.bot_db_context.__exit__(None, None, None)
+        self.request_session.close()
+        http_cache._cache_state['cache'] = None
+        version_cache._version_state['loaded'] = False
+
+    def test_fetch_pb_records(self):
+        last_play_ver = scraper.resolve_last_play_version(self.request_session, "userA")
+        chart_pb_dict, song_error_dict = scraper.fetch_pb_records(self.request_session, "userA", last_play_ver, SONG_LIST)
+
+        self.assertEqual(last_play_ver, 'c')
+        self.assertEqual(song_error_dict, {})
+        for song in SONG_LIST:
+            chart_id_list = [chart.chart_id for chart in song.charts]
+            expected_pb_dict = song_page_parser.parse_song_page((SONG_PAGE_DIR / f"{song.song_id}.html").read_bytes(), chart_id_list)
+            self.assertEqual({chart_id: chart_pb_dict[chart_id] for chart_id in chart_id_list}, expected_pb_dict)
+
+    def test_fetch_pool_shared_by_lookups(self):
+        scraper.fetch_pb_records(self.request_session, "userA", 'c', SONG_LIST[:1])
+        executor = scraper._fetch_executor_state['executor']
+        scraper.fetch_pb_records(self.request_session, "userA", 'c', SONG_LIST[1:])
+
+        self.assertIs(scraper._fetch_executor_state['executor'], executor)
+        self.assertEqual(executor._max_workers, 2)
+
+    def test_song_page_not_found(self):
+        scraper.resolve_last_play_version(self.request_session, "userA")
+        song = Song("9999", "not on iidx.me", (Chart("9999SPA", "A", 12, 2000), ))
+
+        _, song_error_dict = scraper.fetch_pb_records(self.request_session, "userA", 'c', [song])
+        self.assertEqual(song_error_dict, {"9999": config.get('IIDX', 'msg_song_page_not_found')})
+
+        # the last play version is resolved again from the version page, not from the caches
+        scraper.resolve_last_play_version(self.request_session, "userA")
+        self.assertEqual(self.server.path_list.count("/c/userA"), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import time
+import threading
+import unittest
+from dataclasses import astuple
+from unittest import mock
+from db.models.Chart import Chart
+from db.models.Song import Song
+from commands.iidxme.models.PbInfo import PbInfo
+import commands.iidxme.pb_scraper as scraper
+import commands.iidxme.pb_store as pb_store
+import db.bot_db as bot_db
+from tests.util import override_config, temp_bot_db
+
+
+SONG = Song("1001", "Infinity Mirror", (Chart("1001SPH", "H", 8, 1021), Chart("1001SPA", "A", 11, 1590)))
+STORED_PB = PbInfo("HC", 1800, "31", "AA", "AAA-20", "88.15%", 10)
+NEW_SONG = Song("1002", "GAMBOL", (Chart("1002SPA", "A", 5, 500), ))
+LIVE_PB = PbInfo("EX", 1900, "32", "AAA", "MAX-180", "93.05%", 3)
+
+
+class PbStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bot_db_context = temp_bot_db()
+        self.bot_db_context.__enter__()
+        self.config_patch = override_config({('IIDX', 'iidxme_current_version'): 32, ('IIDXME_PB', 'pb_store_ttl_sec'): 60,
+                                             ('IIDXME_PB', 'pb_store_live_timeout_sec'): 0.5})
+        self.config_patch.start()
+
+    def tearDown(self):
+        self.config_patch.stop()
+        pb_store.shutdown()
+        self.bot_db_context.__exit__(None, None, None)
+
+    def _store(self, version: str, fetched_at: float) -> None:
+        bot_db.update_pb_records("userA", version, {chart.chart_id: astuple(STORED_PB) + (fetched_at, )
+                                                    for chart in SONG.charts})
+
+    def _fetch(self, last_play_ver: str = "31") -> tuple:
+        return pb_store.fetch_pb_records(None, "userA", last_play_ver, [SONG])
+
+    def test_not_stored(self):
+        with mock.patch.object(scraper, 'fetch_pb_records', return_value=({"1001SPH": LIVE_PB, "1001SPA": LIVE_PB}, {})):
+            pb_dict, song_error_dict, cached_as_of = self._fetch()
+
+        self.assertEqual(pb_dict, {"1001SPH": LIVE_PB, "1001SPA": LIVE_PB})
+        self.assertIsNone(cached_as_of)
+        self.assertEqual(set(bot_db.fetch_pb_records("userA", "31", ["1001SPH", "1001SPA"])), {"1001SPH", "1001SPA"})
+
+    def test_stored_within_ttl_labelled(self):
+        fetched_at = time.time() - 10
+        self._store("31", fetched_at)
+
+        with mock.patch.object(scraper, 'fetch_pb_records') as fetch:
+            pb_dict, _, cached_as_of = self._fetch()
+
+        fetch.assert_not_called()
+        self.assertEqual(pb_dict, {"1001SPH": STORED_PB, "1001SPA": STORED_PB})
+        self.assertEqual(cached_as_of, fetched_at)
+
+    def test_stale_fetched_in_time(self):
+        self._store("31", time.time() - 120)
+
+        with mock.patch.object(scraper, 'fetch_pb_records', return_value=({"1001SPH": LIVE_PB, "1001SPA": LIVE_PB}, {})):
+            pb_dict, _, cached_as_of = self._fetch()
+
+        self.assertEqual(pb_dict, {"1001SPH": LIVE_PB, "1001SPA": LIVE_PB})
+        self.assertIsNone(cached_as_of)
+
+    def test_stale_served_when_iidxme_slow(self):
+        fetched_at = time.time() - 120
+        self._store("31", fetched_at)
+        release_event = threading.Event()
+
+        def slow_fetch(*args):
+            release_event.wait(timeout=5)
+            return {"1001SPH": LIVE_PB, "1001SPA": LIVE_PB}, {}
+
+        with mock.patch.object(scraper, 'fetch_pb_records', side_effect=slow_fetch):
+            pb_dict, _, cached_as_of = self._fetch()
+            self.assertEqual(pb_dict, {"1001SPH": STORED_PB, "1001SPA": STORED_PB})
+            self.assertEqual(cached_as_of, fetched_at)
+
+            # the fetch completes in background and stores the records
+            release_event.set()
+            future_list = list(pb_store._refresh_state['in_progress'].values())
+            for future in future_list:
+                future.result(timeout=5)
+
+        self.assertEqual(bot_db.fetch_pb_records("userA", "31", ["1001SPA"])["1001SPA"][:-1], astuple(LIVE_PB))
+
+    def test_stale_fetched_with_not_stored(self):
+        # the stale song is fetched again while the song not stored is being fetched, within one live timeout
+        self._store("31", time.time() - 120)
+        refresh_started_event = threading.Event()
+
+        def fetch(request_session, username, last_play_ver, song_list, cancel_event=None):
+            if song_list == [SONG]:
+                refresh_started_event.set()
+                return {"1001SPH": LIVE_PB, "1001SPA": LIVE_PB}, {}
+            self.assertTrue(refresh_started_event.wait(timeout=5))
+            time.sleep(0.6)
+            return {"1002SPA": LIVE_PB}, {}
+
+        with mock.patch.object(scraper, 'fetch_pb_records', side_effect=fetch):
+            pb_dict, _, cached_as_of = pb_store.fetch_pb_records(None, "userA", "31", [SONG, NEW_SONG])
+
+        self.assertEqual(pb_dict, {"1001SPH": LIVE_PB, "1001SPA": LIVE_PB, "1002SPA": LIVE_PB})
+        self.assertIsNone(cached_as_of)
+
+    def test_stale_served_when_iidxme_down(self):
+        self._store("31", time.time() - 120)
+
+        with mock.patch.object(scraper, 'fetch_pb_records', side_effect=Exception("iidx.me down")):
+            pb_dict, _, cached_as_of = self._fetch()
+
+        self.assertEqual(pb_dict, {"1001SPH": STORED_PB, "1001SPA": STORED_PB})
+        self.assertIsNotNone(cached_as_of)
+
+    def test_current_version_stored_by_number(self):
+        fetched_at = time.time() - 10
+        self._store("32", fetched_at)
+
+        with mock.patch.object(scraper, 'fetch_pb_records') as fetch:
+            pb_dict, _, cached_as_of = self._fetch(last_play_ver='c')
+
+        fetch.assert_not_called()
+        self.assertEqual(cached_as_of, fetched_at)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import time
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import utils.single_flight as single_flight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        single_flight._flight_state['calls'] = 0
+        single_flight._flight_state['coalesced'] = 0
+
+    def _run_concurrently(self, num_of_threads: int, key, func) -> list:
+        # call single_flight.do from all threads once the first call is running, and collect the results or exceptions
+        def call():
+            try:
+                return single_flight.do(key, func)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=num_of_threads) as executor:
+            leader_future = executor.submit(call)
+            self.started_event.wait(timeout=5)
+            follower_future_list = [executor.submit(call) for _ in range(num_of_threads - 1)]
+            # wait until all followers wait for the call in flight
+            while single_flight.get_stats()['coalesced'] < num_of_threads - 1:
+                time.sleep(0.001)
+            self.release_event.set()
+
+            return [leader_future.result()] + [future.result() for future in follower_future_list]
+
+    def _blocking_func(self, result=None, exception=None):
+        self.started_event = threading.Event()
+        self.release_event = threading.Event()
+        num_of_runs = [0]
+
+        def func():
+            num_of_runs[0] += 1
+            self.started_event.set()
+            self.release_event.wait(timeout=5)
+            if exception is not None:
+                raise exception
+            return result
+
+        return func, num_of_runs
+
+    def test_concurrent_calls_coalesced(self):
+        func, num_of_runs = self._blocking_func(result="page of 1001")
+        result_list = self._run_concurrently(8, ("user", "32", "1001"), func)
+
+        self.assertEqual(num_of_runs[0], 1)
+        self.assertEqual(result_list[0], ("page of 1001", False))
+        self.assertEqual(result_list[1:], [("page of 1001", True)] * 7)
+        self.assertEqual(single_flight.get_stats(), {'calls': 8, 'coalesced': 7, 'in_flight': 0})
+
+    def test_exception_shared(self):
+        error = ValueError("user not found")
+        func, num_of_runs = self._blocking_func(exception=error)
+        result_list = self._run_concurrently(4, ("user", "32", "1002"), func)
+
+        self.assertEqual(num_of_runs[0], 1)
+        self.assertTrue(all(result is error for result in result_list))
+        self.assertEqual(single_flight.get_stats()['in_flight'], 0)
+
+    def test_sequential_calls_run_again(self):
+        num_of_runs = [0]
+
+        def func(song_id: str) -> str:
+            num_of_runs[0] += 1
+            return f"page of {song_id}"
+
+        self.assertEqual(single_flight.do("key", func, "1001"), ("page of 1001", False))
+        self.assertEqual(single_flight.do("key", func, "1001"), ("page of 1001", False))
+        self.assertEqual(num_of_runs[0], 2)
+        self.assertEqual(single_flight.get_stats()['coalesced'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
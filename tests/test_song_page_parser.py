@@ -0,0 +1,124 @@
+import re
+import unittest
+from pathlib import Path
+from bs4 import BeautifulSoup
+from commands.iidxme.models.PbInfo import PbInfo
+import commands.iidxme.song_page_parser as song_page_parser
+import config.config_reader as config
+
+
+# song pages in the markup of iidx.me, saved as <song_id>.html
+SONG_PAGE_DIR = Path(__file__).parent / "fixtures" / "song_pages"
+
+
+def get_chart_id_list(page_content: bytes) -> list[str]:
+    # all charts in the page, in the order of their first tabview
+    return list(dict.fromkeys(re.findall(r"name=[\"']tabview_([^\"']+)", page_content.decode('utf-8'))))
+
+
+def extract_pb_info_of_chart(chart_id: str, page_content: BeautifulSoup) -> PbInfo:
+    # per-chart extraction over the whole page, which song_page_parser replaced, kept as the reference to verify it against
+
+    # PB info to be returned
+    pb_lamp = "--"
+    pb_score = -1
+    pb_score_attained_version = ""
+    pb_rank = "?"
+    pb_rank_diff = ""
+    pb_rate = "?"
+    pb_misscount = 9999
+
+    # get the div object of the chart and extract PB info
+    div_chart_data = page_content.find('div', attrs={'name': f"tabview_{chart_id}"})
+
+    # 1) find all div objects containing the clear lamp info
+    div_td_clear = div_chart_data.find_all('div', class_="div_td clear")
+    for td in div_td_clear:
+        # get the best clear lamp, which can be found in the most recent record
+        if td.get_text() != "":
+            pb_lamp = config.get('IIDX', f"abbr_{td.get_text()}")
+            break
+
+    # 2) find all div objects containing the score info
+    # loop through the table containing score history
+    div_tr_hist = div_chart_data.find('div', class_="table_scrollcol music").find_all('div', class_="div_tr")
+    pb_row = -1
+    for idx, div_row in enumerate(div_tr_hist):
+        p_score = div_row.find('p', class_="score")
+
+        if p_score and re.search("^[0-9]+$", p_score.get_text()):
+            # get the best score, rank and score rate
+            if int(p_score.get_text()) > pb_score:
+                pb_row = idx
+                pb_score = int(p_score.get_text())
+                pb_rank = p_score.find_previous('p', class_="rank").get_text()
+                span_rank_diff = p_score.find_next("span", "pri_border")
+                if span_rank_diff:
+                    pb_rank_diff = f"{span_rank_diff.get_text().lstrip()}"
+                pb_rate = p_score.find_next('div', class_="rate_wrapper").get_text()
+            # if there is a tie for best score, update pb_row index to display earlier release version title
+            elif int(p_score.get_text()) == pb_score:
+                pb_row = idx
+
+    if pb_row != -1:
+        # from the table containing release version titles,
+        div_tr_ver = div_chart_data.find('div', class_="table_fixcol music").find_all('div', class_="div_tr")
+        # get the version in which the best score was attained
+        span_ver = div_tr_ver[pb_row].find('span', class_="short")
+        if span_ver and span_ver.get_text():
+            pb_score_attained_version = span_ver.get_text().split(" ")[-1]
+
+    # 3) find all div objects containing the miss count
+    span_miss = div_chart_data.find_all('span', class_="miss")
+    for span in span_miss:
+        # get the lowest miss count
+        if re.search("^[0-9]+$", span.get_text()) and (int(span.get_text()) < pb_misscount):
+            pb_misscount = int(span.get_text())
+
+    return PbInfo(pb_lamp, pb_score, pb_score_attained_version, pb_rank, pb_rank_diff, pb_rate, pb_misscount)
+
+
+class SongPageParserTest(unittest.TestCase):
+
+    def test_same_as_per_chart_extraction(self):
+        page_file_list = sorted(SONG_PAGE_DIR.glob("*.html"))
+        self.assertTrue(page_file_list)
+
+        for page_file in page_file_list:
+            page_content = page_file.read_bytes()
+            chart_id_list = get_chart_id_list(page_content)
+            soup = BeautifulSoup(page_content, 'lxml', from_encoding='utf-8')
+
+            pb_dict = song_page_parser.parse_song_page(page_content, chart_id_list)
+
+            self.assertEqual(list(pb_dict), chart_id_list)
+            for chart_id in chart_id_list:
+                with self.subTest(page=page_file.name, chart_id=chart_id):
+                    self.assertEqual(pb_dict[chart_id], extract_pb_info_of_chart(chart_id, soup))
+
+    def test_pb_info(self):
+        pb_dict = song_page_parser.parse_song_page((SONG_PAGE_DIR / "1001.html").read_bytes(), ["1001SPN", "1001SPH", "1001SPA"])
+
+        self.assertEqual(pb_dict["1001SPN"], PbInfo("FC", 940, "31", "AAA", "MAX-86", "91.62%", 0))
+        # tie for the best score: the earlier record
+        self.assertEqual(pb_dict["1001SPH"], PbInfo("EX", 1850, "28", "AAA", "MAX-192", "90.60%", 2))
+        # record without score skipped, best score without rank diff
+        self.assertEqual(pb_dict["1001SPA"], PbInfo("FA", 2460, "30", "AA", "", "77.36%", 38))
+
+    def test_no_play_and_duplicate_tabview(self):
+        pb_dict = song_page_parser.parse_song_page((SONG_PAGE_DIR / "1002.html").read_bytes(), ["1002DPA", "1002SPH"])
+
+        # the charts are returned in the requested order
+        self.assertEqual(list(pb_dict), ["1002DPA", "1002SPH"])
+        self.assertEqual(pb_dict["1002SPH"], PbInfo("--", -1, "", "?", "", "?", 9999))
+        self.assertEqual(pb_dict["1002DPA"], PbInfo("NC", 1300, "30", "B", "A-200", "52.00%", 60))
+
+    def test_chart_not_found(self):
+        with self.assertRaises(Exception) as cm:
+            song_page_parser.parse_song_page((SONG_PAGE_DIR / "1003.html").read_bytes(), ["1003SPA", "1003SPN"])
+
+        self.assertEqual(str(cm.exception), config.get('IIDX', 'msg_parse_page_error'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import threading
+import unittest
+from unittest import mock
+import commands.iidxme.vs_main as vs_main
+import config.config_reader as config
+from tests.util import temp_catalog
+
+
+class VsArgumentsTest(unittest.TestCase):
+
+    def test_duplicate_players_counted_once(self):
+        self.assertEqual(vs_main._split_usernames("-% userA,userB,userA spa mirror", 4), (2, "-% userA userB spa mirror"))
+
+        embed = vs_main.get_result_embed("userA,userA mirror")
+        self.assertEqual(embed.description,
+                         config.get('IIDXME_VS', 'msg_invalid_num_of_players') + str(config.get('IIDXME_VS', 'max_players')))
+
+    def test_usernames_collected_up_to_limit(self):
+        username_str = ",".join(f"user{i}" for i in range(10000))
+
+        self.assertEqual(vs_main._split_usernames(username_str + " mirror", 4),
+                         (5, "user0 user1 user2 user3 user4 mirror"))
+
+
+class PlayerExecutorTest(unittest.TestCase):
+
+    def tearDown(self):
+        vs_main.shutdown()
+
+    def test_shared_player_threads(self):
+        # the players of every comparison are fetched in the same bounded thread pool
+        thread_name_set = set()
+
+        def fetch_player_records(request_session, username, song_list, cancel_event):
+            thread_name_set.add(threading.current_thread().name)
+            raise ValueError(f"{username} not found")
+
+        with temp_catalog(), mock.patch.object(vs_main, '_fetch_player_records', side_effect=fetch_player_records):
+            for _ in range(5):
+                embed = vs_main.get_result_embed("userA,userB,userC,userD mirror")
+                self.assertIn("userD: userD not found", embed.description)
+
+        max_workers = int(config.get('IIDXME_VS', 'max_concurrent_lookups')) * int(config.get('IIDXME_VS', 'max_players'))
+        self.assertTrue(all(thread_name.startswith("iidxvs_player") for thread_name in thread_name_set))
+        self.assertLessEqual(len(thread_name_set), max_workers)
+        self.assertEqual(vs_main._get_player_executor()._max_workers, max_workers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import csv
+import sqlite3
+import tempfile
+from pathlib import Path
+from contextlib import contextmanager, closing
+from unittest import mock
+import config.config_reader as config
+import db.bot_db as bot_db
+import db.iidxme_importer as iidxme_importer
+import db.migrations as migrations
+
+
+'''
+    helpers shared by the tests, which are run from the repository root:
+        python -m pytest tests
+'''
+
+# songs of the test catalog: (song_id, title, title_alias, title_romaji, [(chart_id suffix, mode, difficulty, level, notes), ...])
+CATALOG_SONGS = [
+    ("1001", "Infinity Mirror", "", "", [("SPN", "SP", "N", 4, 513), ("SPH", "SP", "H", 8, 1021), ("SPA", "SP", "A", 11, 1590)]),
+    ("1002", "LUV CAN SAVE U", "", "", [("SPH", "SP", "H", 7, 802), ("SPA", "SP", "A", 10, 1203), ("DPA", "DP", "A", 10, 1250)]),
+    ("1003", "純真可憐デザイア", "", "junshin karen desire", [("SPA", "SP", "A", 12, 1888), ("DPH", "DP", "H", 9, 1100)]),
+    ("1004", "Fly Away To India", "", "", [("SPA", "SP", "A", 9, 990), ("DPN", "DP", "N", 4, 450)]),
+    ("1005", "GAMBOL", "", "", [("SPB", "SP", "B", 1, 120), ("DPN", "DP", "N", 2, 200)]),
+    ("1006", "Override", "", "", [("SPL", "SP", "L", 12, 2100)]),
+    ("1007", "冥", "mei", "mei", [("SPA", "SP", "A", 12, 1999)]),
+]
+
+
+def override_config(override_dict: dict):
+    # patch config.get so that the given values, {(section, key): value, ...}, override config.yaml
+    config_get = config.get
+
+    def get(section: str, key: str):
+        if (section, key) in override_dict:
+            return override_dict[(section, key)]
+        return config_get(section, key)
+
+    return mock.patch.object(config, 'get', side_effect=get)
+
+
+@contextmanager
+def temp_catalog():
+    # build the test catalog DB in a temp directory with the importer, and use it as the catalog DB
+    with tempfile.TemporaryDirectory() as temp_dir:
+        dump_file = Path(temp_dir) / "dump.csv"
+        with open(dump_file, 'w', encoding='utf8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(('song_id', 'title', 'title_alias', 'title_romaji', 'chart_id', 'mode', 'difficulty', 'level', 'notes'))
+            for song_id, title, title_alias, title_romaji, chart_list in CATALOG_SONGS:
+                for chart_suffix, mode, difficulty, level, notes in chart_list:
+                    writer.writerow((song_id, title, title_alias, title_romaji, song_id + chart_suffix, mode, difficulty, level, notes))
+
+        db_file = Path(temp_dir) / "iidxme.db"
+        iidxme_importer.import_catalog(dump_file, db_file)
+
+        with override_config({('BOT', 'iidxme_db_file'): str(db_file)}):
+            yield db_file
+
+
+@contextmanager
+def temp_bot_db():
+    # create an empty bot DB in a temp directory, and use it as the bot DB
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = Path(temp_dir) / "bot.db"
+        with closing(sqlite3.connect(db_file)) as dbconn:
+            migrations.migrate_db(dbconn, 'bot')
+
+        with override_config({('BOT', 'bot_db_file'): str(db_file)}):
+            try:
+                yield db_file
+            finally:
+                # close the shared connection and forget the bot params loaded from this DB
+                bot_db.close()
+                bot_db._param_state['loaded'] = False
@@ -0,0 +1,97 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+import config.config_reader as config
+
+
+'''
+    process-wide HTTP session shared by all outbound requests, so that TCP/TLS connections are kept alive and reused
+
+    connection pools : http_pool_connections hosts, up to http_pool_maxsize connections per host
+    retries          : up to http_max_retries retries of GET/HEAD requests on connection errors and 429/5xx responses,
+                       with exponential backoff (http_retry_backoff_factor), honouring Retry-After.
+                       read timeouts are not retried, so a slow page fails within one read timeout
+    timeouts         : (http_connect_timeout_sec, http_read_timeout_sec) unless specified per request
+'''
+
+RETRY_STATUS_LIST = (429, 500, 502, 503, 504)
+
+_session_state = {'session': None}
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    if _session_state['session'] is None:
+        with _session_lock:
+            if _session_state['session'] is None:
+                _session_state['session'] = _create_session()
+
+    return _session_state['session']
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault('timeout', get_default_timeout())
+    return get_session().get(url, **kwargs)
+
+
+def get_default_timeout() -> tuple[float, float]:
+    return (float(config.get('BOT', 'http_connect_timeout_sec')), float(config.get('BOT', 'http_read_timeout_sec')))
+
+
+def get_stats() -> dict:
+    # return the number of requests sent and connections opened per host, {host: {...}, ...}
+    # reuse_rate = share of requests sent over a kept-alive connection
+    stats = {}
+
+    session = _session_state['session']
+    if session is None:
+        return stats
+
+    # the same adapter is mounted for both http:// and https://
+    for adapter in {id(adapter): adapter for adapter in session.adapters.values()}.values():
+        for pool_key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(pool_key)
+            if pool is None:
+                continue
+            host_stats = stats.setdefault(f"{pool.scheme}://{pool.host}:{pool.port}", {'requests': 0, 'connections': 0})
+            host_stats['requests'] += pool.num_requests
+            host_stats['connections'] += pool.num_connections
+
+    for host_stats in stats.values():
+        host_stats['reuse_rate'] = (1 - host_stats['connections'] / host_stats['requests']) if host_stats['requests'] else 0.0
+
+    return stats
+
+
+def close() -> None:
+    with _session_lock:
+        if _session_state['session'] is not None:
+            _session_state['session'].close()
+            _session_state['session'] = None
+
+
+def _create_session() -> requests.Session:
+    logger = logging.getLogger(__name__)
+
+    # read=0: a request timed out while reading is not sent again, as the server is likely still busy with the first one
+    retry = Retry(total=int(config.get('BOT', 'http_max_retries')),
+                  read=0,
+                  backoff_factor=float(config.get('BOT', 'http_retry_backoff_factor')),
+                  status_forcelist=RETRY_STATUS_LIST,
+                  allowed_methods=frozenset(['GET', 'HEAD']),
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+
+    adapter = HTTPAdapter(pool_connections=int(config.get('BOT', 'http_pool_connections')),
+                          pool_maxsize=int(config.get('BOT', 'http_pool_maxsize')),
+                          max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    logger.debug("Created shared HTTP session")
+
+    return session
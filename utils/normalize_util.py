@@ -0,0 +1,36 @@
+import re
+import unicodedata
+
+
+# punctuation variants which are typed differently by users and in song titles, mapped to one form
+_PUNCTUATION_TABLE = str.maketrans({
+    '’': "'", '‘': "'", '`': "'", '´': "'", '′': "'",
+    '“': '"', '”': '"', '″': '"', '〝': '"', '〟': '"',
+    '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-', '―': '-', '−': '-',
+    '〜': '~', '～': '~',
+    '・': ' ', '･': ' ', '　': ' ',
+})
+
+# katakana (ァ-ヶ) to hiragana (ぁ-ゖ), the code points of which differ by 0x60
+_KATAKANA_TO_HIRAGANA_TABLE = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+
+def normalize_search_key(string: str) -> str:
+    '''
+        normalize a song title or search keyword so that variants typed by users match the title:
+        1) full-width/half-width forms are unified (NFKC), e.g. ＡＢＣ -> abc, ｶﾀｶﾅ -> カタカナ
+        2) letters are case-folded
+        3) katakana is converted to hiragana
+        4) punctuation variants are unified, e.g. ’ -> '
+        5) consecutive whitespaces are collapsed into one space
+    '''
+    if not string:
+        return ""
+
+    string = unicodedata.normalize('NFKC', string)
+    string = string.casefold()
+    string = string.translate(_KATAKANA_TO_HIRAGANA_TABLE)
+    string = string.translate(_PUNCTUATION_TABLE)
+    string = re.sub(r"\s+", " ", string).strip()
+
+    return string
@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+
+'''
+    in-flight deduplication of identical calls: while a call with a key is running, other calls with the same key
+    wait for it and share its result (or its exception) instead of running again
+
+    stats : calls = calls made, coalesced = calls that waited for a call in flight instead of running, in_flight = keys running now
+'''
+
+_flight_state = {'in_flight': {}, 'calls': 0, 'coalesced': 0}
+_flight_lock = threading.Lock()
+
+
+def do(key: Hashable, func: Callable, *args) -> tuple[Any, bool]:
+    # return (1) the result of func(*args), run once for all concurrent calls with the same key
+    # and (2) whether the result is shared from a call in flight
+    with _flight_lock:
+        _flight_state['calls'] += 1
+        future = _flight_state['in_flight'].get(key)
+        if future is not None:
+            _flight_state['coalesced'] += 1
+            is_leader = False
+        else:
+            future = Future()
+            _flight_state['in_flight'][key] = future
+            is_leader = True
+
+    if not is_leader:
+        return future.result(), True
+
+    try:
+        result = func(*args)
+        future.set_result(result)
+        return result, False
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _flight_lock:
+            _flight_state['in_flight'].pop(key, None)
+
+
+def get_stats() -> dict:
+    with _flight_lock:
+        return {'calls': _flight_state['calls'], 'coalesced': _flight_state['coalesced'],
+                'in_flight': len(_flight_state['in_flight'])}
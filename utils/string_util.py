@@ -1,9 +1,16 @@
 import re
 import logging
+import threading
 from discord import Guild
+import db.iidxme_conn as iidxme_conn
 import db.iidxme_db as iidxme_db
 
 
+# translation table of traditional chinese characters to kanji, loaded once per catalog DB generation
+_kanji_table = {'generation': -1, 'table': {}}
+_kanji_table_lock = threading.Lock()
+
+
 def escape_special_formatting_characters(string: str) -> str:
     string = string.replace("_", "\_")
     string = string.replace("*", "\*")
@@ -12,9 +19,19 @@ def escape_special_formatting_characters(string: str) -> str:
 
 # convert traditional chinese characters in input string to kanji
 def convert_chi_to_kanji(string: str) -> str:
-    for char in string:
-        converted_char = iidxme_db.get_kanji_by_char(char)
-        if converted_char:
-            string = string.replace(char, converted_char)
+    return string.translate(get_kanji_table())
+
+
+def get_kanji_table() -> dict[int, str]:
+    # translation table of str.translate, loaded again if the catalog DB file has changed
+    generation = iidxme_conn.get_generation()
+    if _kanji_table['generation'] != generation:
+        with _kanji_table_lock:
+            if _kanji_table['generation'] != generation:
+                # only single characters with a non-empty kanji can be mapped
+                kanji_mapping = {zh_hk: jp for zh_hk, jp in iidxme_db.fetch_kanji_mapping().items()
+                                 if len(zh_hk) == 1 and jp}
+                _kanji_table['table'] = str.maketrans(kanji_mapping)
+                _kanji_table['generation'] = generation
 
-    return string
\ No newline at end of file
+    return _kanji_table['table']